@@ -0,0 +1,255 @@
+# 情绪数据分析
+# 将公开情绪加载为NumPy列式数组并持久化为可内存映射的快照文件，所有统计查询均为向量化计算
+# 快照由后台任务构建，各进程只从磁盘加载最新快照；NumPy在首次构建/加载快照时才导入，不影响应用启动时间
+import json
+import os
+import shutil
+import threading
+import time
+from array import array
+
+from heatmap import parse_timestamp
+
+# 快照列定义：列名 -> (dtype, array类型码)
+COLUMNS = {
+    'latitude': ('float32', 'f'),
+    'longitude': ('float32', 'f'),
+    'type_code': ('uint8', 'B'),
+    'intensity': ('uint8', 'B'),
+    'created_at': ('int64', 'q')
+}
+
+# 未知情绪类型的编码
+UNKNOWN_TYPE_CODE = 255
+
+
+class EmotionSnapshot:
+    """情绪列式快照"""
+
+    def __init__(self, columns, type_names, built_at):
+        self.columns = columns
+        self.type_names = list(type_names)
+        self.built_at = built_at
+
+    def __len__(self):
+        return len(self.columns['created_at'])
+
+    @classmethod
+    def build(cls, rows, type_names):
+        """由情绪记录构建快照"""
+        import numpy as np
+
+        codes = {name: code for code, name in enumerate(type_names) if name is not None}
+        buffers = {name: array(typecode) for name, (_, typecode) in COLUMNS.items()}
+        for row in rows:
+            if row.get('latitude') is None or row.get('longitude') is None:
+                continue
+            buffers['latitude'].append(float(row['latitude']))
+            buffers['longitude'].append(float(row['longitude']))
+            buffers['type_code'].append(codes.get(row['emotion_type'], UNKNOWN_TYPE_CODE))
+            buffers['intensity'].append(min(max(int(row.get('intensity') or 5), 0), 255))
+            buffers['created_at'].append(int(parse_timestamp(row['created_at'])))
+        columns = {
+            name: np.frombuffer(buffers[name], dtype=dtype)
+            for name, (dtype, _) in COLUMNS.items()
+        }
+        return cls(columns, type_names, time.time())
+
+    def save(self, directory):
+        """写入快照目录：各列写入新的版本子目录（每列一个.npy文件），再原子替换meta.json指向它
+        读取方始终看到完整的某个版本；保留上一个版本供正在加载的进程使用"""
+        import numpy as np
+
+        version = f'v{int(self.built_at * 1000)}'
+        version_dir = os.path.join(directory, version)
+        os.makedirs(version_dir, exist_ok=True)
+        for name in COLUMNS:
+            with open(os.path.join(version_dir, f'{name}.npy'), 'wb') as f:
+                np.save(f, self.columns[name])
+        meta = {'type_names': self.type_names, 'built_at': self.built_at, 'rows': len(self), 'version': version}
+        tmp_path = os.path.join(directory, f'meta.json.{os.getpid()}.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False)
+        os.replace(tmp_path, os.path.join(directory, 'meta.json'))
+        # 清理更早的版本（已内存映射的文件删除后仍然可用）
+        versions = sorted(
+            (entry for entry in os.listdir(directory) if entry.startswith('v') and entry[1:].isdigit()),
+            key=lambda entry: int(entry[1:])
+        )
+        for entry in versions[:-2]:
+            shutil.rmtree(os.path.join(directory, entry), ignore_errors=True)
+
+    @staticmethod
+    def read_meta(directory):
+        """读取快照元数据，不存在时返回None"""
+        try:
+            with open(os.path.join(directory, 'meta.json'), encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    @classmethod
+    def load(cls, directory, meta=None):
+        """以内存映射方式加载快照，不存在或不完整时返回None"""
+        import numpy as np
+
+        meta = meta or cls.read_meta(directory)
+        if meta is None or 'version' not in meta:
+            return None
+        version_dir = os.path.join(directory, meta['version'])
+        try:
+            columns = {
+                name: np.load(os.path.join(version_dir, f'{name}.npy'), mmap_mode='r')
+                for name in COLUMNS
+            }
+        except FileNotFoundError:
+            return None
+        if any(len(column) != meta['rows'] for column in columns.values()):
+            return None
+        return cls(columns, meta['type_names'], meta['built_at'])
+
+
+class AnalyticsEngine:
+    """基于列式快照的向量化统计"""
+
+    def __init__(self, directory, type_names, ttl=600, reload_interval=5):
+        self.directory = directory
+        self.type_names = list(type_names)
+        # 快照构建间隔（由后台任务按此间隔重建）
+        self.ttl = ttl
+        # 每隔reload_interval秒检查一次磁盘上是否有更新的快照
+        self.reload_interval = reload_interval
+        self._snapshot = None
+        self._checked_at = None
+        self._lock = threading.Lock()
+
+    # ==================== 快照管理 ====================
+
+    def snapshot(self):
+        """获取当前快照（重建期间继续使用旧快照），尚无可用快照时返回None
+        请求线程从不构建快照，只在磁盘上出现更新的快照时重新加载"""
+        now = time.monotonic()
+        if self._checked_at is not None and now - self._checked_at < self.reload_interval:
+            return self._snapshot
+        if not self._lock.acquire(blocking=False):
+            return self._snapshot
+        try:
+            self._checked_at = now
+            meta = EmotionSnapshot.read_meta(self.directory)
+            if (meta is not None and meta.get('type_names') == self.type_names and
+                    (self._snapshot is None or meta['built_at'] > self._snapshot.built_at)):
+                snapshot = EmotionSnapshot.load(self.directory, meta)
+                if snapshot is not None:
+                    self._snapshot = snapshot
+        finally:
+            self._lock.release()
+        return self._snapshot
+
+    def is_stale(self, snapshot):
+        """快照是否已超过重建间隔（后台任务未按时完成）"""
+        return snapshot is None or time.time() - snapshot.built_at > self.ttl * 2
+
+    def refresh(self, loader):
+        """重建快照并写入磁盘（由后台任务调用）"""
+        snapshot = EmotionSnapshot.build(loader(), self.type_names)
+        snapshot.save(self.directory)
+        # 重新以内存映射方式打开，释放构建时的内存
+        self._snapshot = EmotionSnapshot.load(self.directory) or snapshot
+        self._checked_at = time.monotonic()
+        return self._snapshot
+
+    # ==================== 查询 ====================
+
+    @staticmethod
+    def mask(snapshot, bbox=None, since=None, until=None):
+        """按经纬度范围和时间范围生成布尔掩码"""
+        import numpy as np
+
+        mask = np.ones(len(snapshot), dtype=bool)
+        if bbox is not None:
+            west, south, east, north = bbox
+            lat = snapshot.columns['latitude']
+            lng = snapshot.columns['longitude']
+            mask &= (lat >= south) & (lat <= north)
+            if west <= east:
+                mask &= (lng >= west) & (lng <= east)
+            else:
+                # 跨越180度经线
+                mask &= (lng >= west) | (lng <= east)
+        if since is not None:
+            mask &= snapshot.columns['created_at'] >= int(since)
+        if until is not None:
+            mask &= snapshot.columns['created_at'] < int(until)
+        return mask
+
+    def type_mix(self, snapshot, mask):
+        """各情绪类型的数量、占比和平均强度"""
+        import numpy as np
+
+        codes = snapshot.columns['type_code'][mask]
+        intensity = snapshot.columns['intensity'][mask].astype(np.float64)
+        counts = np.bincount(codes, minlength=256)
+        intensity_sums = np.bincount(codes, weights=intensity, minlength=256)
+        total = int(counts.sum())
+        result = []
+        for code in np.flatnonzero(counts):
+            name = (snapshot.type_names[code] if code < len(snapshot.type_names) else None) or 'unknown'
+            result.append({
+                'emotion_type': name,
+                'count': int(counts[code]),
+                'ratio': round(counts[code] / total, 4),
+                'avg_intensity': round(intensity_sums[code] / counts[code], 2)
+            })
+        result.sort(key=lambda item: item['count'], reverse=True)
+        return {'total': total, 'types': result}
+
+    def intensity_trend(self, snapshot, mask, interval, since, until):
+        """按固定时间间隔统计情绪数量和平均强度"""
+        import numpy as np
+
+        created_at = snapshot.columns['created_at'][mask]
+        intensity = snapshot.columns['intensity'][mask].astype(np.float64)
+        start = int(since) // interval * interval
+        bins = max(int((until - start + interval - 1) // interval), 1)
+        index = ((created_at - start) // interval).astype(np.int64)
+        valid = (index >= 0) & (index < bins)
+        counts = np.bincount(index[valid], minlength=bins)
+        sums = np.bincount(index[valid], weights=intensity[valid], minlength=bins)
+        averages = np.divide(sums, counts, out=np.zeros(bins), where=counts > 0)
+        return [
+            {
+                'start': start + i * interval,
+                'count': int(counts[i]),
+                'avg_intensity': round(float(averages[i]), 2)
+            }
+            for i in range(bins)
+        ]
+
+    def hotspots(self, snapshot, mask, cell_size, top):
+        """按经纬度网格统计情绪最密集的区域"""
+        import numpy as np
+
+        lat = snapshot.columns['latitude'][mask].astype(np.float64)
+        lng = snapshot.columns['longitude'][mask].astype(np.float64)
+        intensity = snapshot.columns['intensity'][mask].astype(np.float64)
+        if len(lat) == 0:
+            return []
+        columns = int(np.ceil(360.0 / cell_size))
+        ix = np.clip(np.floor((lng + 180.0) / cell_size), 0, columns - 1).astype(np.int64)
+        iy = np.floor((lat + 90.0) / cell_size).astype(np.int64)
+        keys = iy * columns + ix
+        unique_keys, inverse, counts = np.unique(keys, return_inverse=True, return_counts=True)
+        intensity_sums = np.bincount(inverse, weights=intensity)
+        top = min(top, len(unique_keys))
+        order = np.argpartition(-counts, top - 1)[:top]
+        order = order[np.argsort(-counts[order], kind='stable')]
+        result = []
+        for i in order:
+            cell_y, cell_x = divmod(int(unique_keys[i]), columns)
+            result.append({
+                'latitude': round(-90.0 + (cell_y + 0.5) * cell_size, 6),
+                'longitude': round(-180.0 + (cell_x + 0.5) * cell_size, 6),
+                'count': int(counts[i]),
+                'avg_intensity': round(float(intensity_sums[i] / counts[i]), 2)
+            })
+        return result
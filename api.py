@@ -1,46 +1,475 @@
 # Flask API路由和业务逻辑
-from flask import Blueprint, request, jsonify, session
-from datetime import datetime, timedelta
+from flask import Blueprint, request, jsonify, session, make_response, g
+from datetime import datetime, timedelta, timezone
 import json
-from supabase import create_client, Client
 from config import Config
+from db import supabase
 from auth import GitHubAuth
+from cache import TTLCache, SingleFlight
+from heatmap import HeatmapAggregator, GRANULARITIES
+from analytics import AnalyticsEngine
+from emotion_types import emotion_types
+from spatial import NearbyIndex
+from search import SearchIndex, document_meta, document_payload
+from trending import TrendingIndex
+from indexsync import IndexSync
+from geocode import ReverseGeocoder, UpstreamBusy
+from ratelimit import RateLimiter, MemoryBucketStore, SQLiteBucketStore
+from writebehind import WriteBehindBuffer
+from jobs import job_runner
+import atexit
+import math
+import requests
 
 # 创建API蓝图
 api_bp = Blueprint('api', __name__, url_prefix='/api')
 
-# 初始化Supabase客户端
-supabase = create_client(Config.SUPABASE_URL, Config.SUPABASE_SERVICE_ROLE_KEY)
-
-# 情绪类型映射
-EMOTION_TYPES = {
-    'happy': '开心',
-    'sad': '难过',
-    'angry': '愤怒',
-    'excited': '兴奋',
-    'anxious': '焦虑',
-    'peaceful': '平静',
-    'confused': '困惑',
-    'grateful': '感激',
-    'lonely': '孤独',
-    'hopeful': '希望',
-    'frustrated': '沮丧',
-    'content': '满足',
-    'custom': '自定义'
-}
+# 用户情绪时间线首页缓存（按用户ID）
+user_timeline_cache = TTLCache(ttl=Config.USER_TIMELINE_CACHE_TTL)
+
+# 情绪详情缓存：公共部分按情绪ID缓存，点赞/收藏状态按(情绪ID, 用户ID)缓存
+emotion_detail_cache = TTLCache(ttl=Config.EMOTION_DETAIL_CACHE_TTL)
+emotion_viewer_cache = TTLCache(ttl=Config.EMOTION_DETAIL_CACHE_TTL, max_size=8192)
+emotion_detail_flight = SingleFlight()
+
+# 情绪热力图聚合器（首次请求时加载历史数据，之后随写入增量更新）
+heatmap = HeatmapAggregator(
+    max_zoom=Config.HEATMAP_MAX_ZOOM,
+    cell_bits=Config.HEATMAP_CELL_BITS,
+    retention=Config.HEATMAP_RETENTION
+)
+
+# 附近情绪空间索引
+nearby_index = NearbyIndex(cell_degrees=Config.NEARBY_CELL_DEGREES)
+
+# 情绪内容全文索引（包含私密情绪，查询时按权限过滤）
+search_index = SearchIndex()
+
+# 热门情绪排行（按时间衰减热度增量维护）
+trending = TrendingIndex(
+    half_life_hours=Config.TRENDING_HALF_LIFE_HOURS,
+    horizon_seconds=max(Config.TRENDING_WINDOWS.values()),
+    weights=Config.TRENDING_WEIGHTS
+)
+
+# 逆地理编码（geohash网格 + SQLite持久化缓存）
+geocoder = ReverseGeocoder(
+    Config.GEOCODE_CACHE_PATH,
+    Config.GEOCODE_UPSTREAM_URL,
+    precision=Config.GEOCODE_GEOHASH_PRECISION,
+    zoom=Config.GEOCODE_UPSTREAM_ZOOM,
+    timeout=Config.GEOCODE_TIMEOUT,
+    user_agent=Config.GEOCODE_USER_AGENT,
+    ttl_days=Config.GEOCODE_CACHE_TTL_DAYS,
+    min_interval=Config.GEOCODE_MIN_INTERVAL,
+    max_wait=Config.GEOCODE_MAX_WAIT
+)
+
+# 写操作限流（按用户ID和IP）
+rate_limiter = RateLimiter(
+    SQLiteBucketStore(Config.RATE_LIMIT_SQLITE_PATH) if Config.RATE_LIMIT_BACKEND == 'sqlite' else MemoryBucketStore(),
+    Config.RATE_LIMITS
+)
+
+# 情绪统计分析引擎（列式快照，类型编码为注册表中的类型ID）
+analytics = AnalyticsEngine(
+    Config.ANALYTICS_SNAPSHOT_DIR,
+    emotion_types.codes_by_id(),
+    ttl=Config.ANALYTICS_SNAPSHOT_TTL
+)
 
 def require_auth(f):
     """装饰器：要求用户登录"""
     def decorated_function(*args, **kwargs):
-        if not session.get('is_authenticated'):
+        if not g.get('current_user'):
             return jsonify({'error': '需要登录'}), 401
         return f(*args, **kwargs)
     decorated_function.__name__ = f.__name__
     return decorated_function
 
+def rate_limit(route):
+    """装饰器：按路由预算限流，超出时在访问数据库之前返回429"""
+    def decorator(f):
+        def decorated_function(*args, **kwargs):
+            if Config.RATE_LIMIT_ENABLED:
+                user_id = get_current_user_id()
+                # 部署在反向代理之后时由ProxyFix把remote_addr替换为代理记录的客户端IP
+                identities = [f'user:{user_id}' if user_id else None, f'ip:{request.remote_addr}']
+                retry_after = rate_limiter.hit(route, identities)
+                if retry_after:
+                    response = make_response(jsonify({
+                        'error': '操作过于频繁，请稍后再试',
+                        'retry_after': math.ceil(retry_after)
+                    }), 429)
+                    response.headers['Retry-After'] = str(math.ceil(retry_after))
+                    return response
+            return f(*args, **kwargs)
+        decorated_function.__name__ = f.__name__
+        return decorated_function
+    return decorator
+
 def get_current_user_id():
-    """获取当前用户ID"""
-    return session.get('user_id')
+    """获取当前用户ID（由签名会话令牌解析，不查询数据库）"""
+    user = g.get('current_user')
+    return user['id'] if user else None
+
+def invalidate_user_timeline(user_id):
+    """用户情绪发生写入后清除其时间线缓存"""
+    if user_id:
+        user_timeline_cache.delete(user_id)
+
+def invalidate_emotion_detail(emotion_id, viewer_id=None):
+    """情绪或其社交数据发生写入后清除详情缓存"""
+    emotion_detail_cache.delete(emotion_id)
+    if viewer_id:
+        emotion_viewer_cache.delete((emotion_id, viewer_id))
+
+def emotion_write_miss(emotion_id, forbidden_message):
+    """条件写入没有匹配任何行时，再查询一次区分情绪不存在（404）和无权操作（403）"""
+    result = supabase.table('emotions').select('id').eq('id', emotion_id).eq('is_deleted', False).execute()
+    if not result.data:
+        return jsonify({'error': '情绪不存在'}), 404
+    return jsonify({'error': forbidden_message}), 403
+
+def load_emotion_detail(emotion_id):
+    """一次调用读取情绪详情的公共部分（情绪、作者和计数）并写入缓存，情绪不存在时返回None"""
+    result = supabase.rpc('emotion_detail', {
+        'p_emotion_id': emotion_id,
+        'p_viewer_id': None
+    }).execute()
+    
+    if not result.data:
+        return None
+    
+    emotion = result.data[0]
+    detail = {
+        'id': emotion['id'],
+        'user_id': emotion['user_id'],
+        'emotion_type': emotion['emotion_type'],
+        'content': emotion['content'],
+        'custom_emoji': emotion.get('custom_emoji'),
+        'intensity': emotion.get('intensity', 5),
+        'latitude': emotion['latitude'],
+        'longitude': emotion['longitude'],
+        'privacy_setting': emotion['privacy_setting'],
+        'created_at': emotion['created_at'],
+        'updated_at': emotion['updated_at'],
+        'user': {
+            'username': emotion['username'],
+            'display_name': emotion['display_name'],
+            'avatar_url': emotion['avatar_url']
+        },
+        'stats': {
+            'likes_count': emotion['likes_count'] or 0,
+            'collections_count': emotion['collections_count'] or 0,
+            'comments_count': emotion['comments_count'] or 0
+        }
+    }
+    emotion_detail_cache.set(emotion_id, detail)
+    return detail
+
+def load_viewer_flags(emotion_id, viewer_id):
+    """查询当前用户对情绪的点赞/收藏状态并写入缓存（按唯一索引的存在性查询，不重新计算公共部分）"""
+    liked = supabase.table('likes').select('emotion_id').eq('emotion_id', emotion_id).eq('user_id', viewer_id).limit(1).execute()
+    collected = supabase.table('collections').select('emotion_id').eq('emotion_id', emotion_id).eq('user_id', viewer_id).limit(1).execute()
+    flags = {'is_liked': bool(liked.data), 'is_collected': bool(collected.data)}
+    emotion_viewer_cache.set((emotion_id, viewer_id), flags)
+    return flags
+
+def fetch_live_emotions(since=None, page_size=1000, public_only=True):
+    """按ID分页读取未删除的情绪（默认只读取公开情绪），用于构建内存索引"""
+    last_id = None
+    while True:
+        query = supabase.table('emotions').select(
+            'id, user_id, emotion_type, content, custom_emoji, intensity, latitude, longitude, '
+            'privacy_setting, created_at'
+        ).eq('is_deleted', False)
+        if public_only:
+            query = query.eq('privacy_setting', 'public')
+        if since is not None:
+            query = query.gte('created_at', datetime.utcfromtimestamp(since).isoformat())
+        if last_id is not None:
+            query = query.gt('id', last_id)
+        result = query.order('id').limit(page_size).execute()
+        rows = result.data or []
+        yield from rows
+        if len(rows) < page_size:
+            break
+        last_id = rows[-1]['id']
+
+def fetch_changed_emotions(since, page_size=1000):
+    """读取updated_at不早于since的情绪（含已删除和私密情绪），用于同步其他进程的写入"""
+    since_iso = datetime.fromtimestamp(since, timezone.utc).isoformat()
+    offset = 0
+    while True:
+        result = supabase.table('emotions').select(
+            'id, user_id, emotion_type, content, custom_emoji, intensity, latitude, longitude, '
+            'privacy_setting, is_deleted, created_at, updated_at'
+        ).gte('updated_at', since_iso).order('updated_at').order('id').range(offset, offset + page_size - 1).execute()
+        rows = result.data or []
+        yield from rows
+        if len(rows) < page_size:
+            break
+        offset += page_size
+
+def fetch_current_emotions(emotion_ids):
+    """按ID读取情绪的当前状态（含已删除情绪），返回{情绪ID: 情绪}"""
+    if not emotion_ids:
+        return {}
+    result = supabase.table('emotions').select(
+        'id, user_id, emotion_type, content, custom_emoji, intensity, latitude, longitude, '
+        'privacy_setting, is_deleted, created_at'
+    ).in_('id', list(emotion_ids)).execute()
+    return {row['id']: row for row in result.data or []}
+
+def fetch_trending_data(since, chunk_size=200, page_size=1000):
+    """读取时间范围内的公开情绪及其点赞、收藏和评论事件，用于构建热门排行"""
+    emotions = list(fetch_live_emotions(since=since))
+    events = []
+    # (事件类型, 表名, 事件键字段)；点赞/收藏以用户ID为键，取消时可精确扣除
+    sources = [
+        ('like', 'likes', 'user_id'),
+        ('collection', 'collections', 'user_id'),
+        ('comment', 'comments', 'id')
+    ]
+    emotion_ids = [emotion['id'] for emotion in emotions]
+    for start in range(0, len(emotion_ids), chunk_size):
+        chunk = emotion_ids[start:start + chunk_size]
+        for kind, table, key_field in sources:
+            offset = 0
+            while True:
+                query = supabase.table(table).select('id, emotion_id, user_id, created_at').in_('emotion_id', chunk)
+                if table == 'comments':
+                    query = query.eq('is_deleted', False)
+                rows = query.order('id').range(offset, offset + page_size - 1).execute().data or []
+                events.extend((kind, row['emotion_id'], row[key_field], row['created_at']) for row in rows)
+                if len(rows) < page_size:
+                    break
+                offset += page_size
+    return emotions, events
+
+def cached_place_name(lat, lng):
+    """只从缓存读取坐标的粗粒度地名，未命中或失败时返回None"""
+    if lat is None or lng is None:
+        return None
+    try:
+        place = geocoder.reverse(float(lat), float(lng), cached_only=True)
+        return place['place_name'] if place else None
+    except Exception as e:
+        print(f"读取地名缓存失败: {e}")
+        return None
+
+# 时间筛选取值 -> 回溯时长（地图、列表、搜索和分析接口共用）
+TIME_FILTER_WINDOWS = {
+    '1h': timedelta(hours=1),
+    '6h': timedelta(hours=6),
+    '24h': timedelta(hours=24),
+    '7d': timedelta(days=7),
+    '30d': timedelta(days=30),
+    'week': timedelta(days=7),
+    'month': timedelta(days=30)
+}
+
+def get_time_filter_start(time_filter):
+    """将时间筛选参数转换为起始时间，all或未知取值返回None"""
+    now = datetime.utcnow()
+    if time_filter == 'today':
+        return now.replace(hour=0, minute=0, second=0, microsecond=0)
+    window = TIME_FILTER_WINDOWS.get(time_filter)
+    return now - window if window else None
+
+def parse_bbox(value):
+    """解析bbox参数（west,south,east,north），未提供时返回None"""
+    if not value:
+        return None
+    west, south, east, north = [float(part) for part in value.split(',')]
+    if not (-90 <= south <= north <= 90 and -180 <= west <= 180 and -180 <= east <= 180):
+        raise ValueError('bbox超出范围')
+    return west, south, east, north
+
+def index_emotion(emotion):
+    """新建或更新的情绪写入各内存索引，非公开情绪从公开索引中移除"""
+    try:
+        search_index.add(emotion)
+        if emotion.get('privacy_setting') == 'public':
+            heatmap.add(emotion)
+            nearby_index.add(emotion)
+            trending.add(emotion)
+        else:
+            heatmap.remove(emotion['id'])
+            nearby_index.remove(emotion['id'])
+            trending.remove(emotion['id'])
+    except Exception as e:
+        print(f"更新情绪索引失败: {e}")
+
+def unindex_emotion(emotion_id):
+    """情绪被删除时从各内存索引移除"""
+    try:
+        search_index.remove(emotion_id)
+        heatmap.remove(emotion_id)
+        nearby_index.remove(emotion_id)
+        trending.remove(emotion_id)
+    except Exception as e:
+        print(f"移除情绪索引失败: {e}")
+
+def apply_emotion_change(emotion):
+    """把其他进程写入的一条情绪变化应用到本进程的内存索引"""
+    if emotion.get('is_deleted'):
+        unindex_emotion(emotion['id'])
+    else:
+        index_emotion(emotion)
+
+# 内存索引同步：定期读取所有进程写入的情绪变化，并在后台定期完整重建
+index_sync = IndexSync(
+    fetch_changed_emotions,
+    apply_emotion_change,
+    interval=Config.INDEX_SYNC_INTERVAL,
+    rebuild_interval=Config.INDEX_REBUILD_INTERVAL
+)
+index_sync.register(lambda: heatmap.rebuild(fetch_live_emotions))
+index_sync.register(lambda: nearby_index.rebuild(fetch_live_emotions))
+index_sync.register(lambda: search_index.rebuild(lambda: fetch_live_emotions(public_only=False)))
+index_sync.register(lambda: trending.rebuild(fetch_trending_data))
+
+def load_toggle_state(table, emotion_id, user_id):
+    """读取数据库中用户是否已点赞/收藏以及总数，供写回缓冲建立预测状态"""
+    member_result = supabase.table(table).select('emotion_id').eq('emotion_id', emotion_id).eq('user_id', user_id).execute()
+    count = supabase.table(table).select('emotion_id', count='exact').eq('emotion_id', emotion_id).execute().count or 0
+    return bool(member_result.data), count
+
+def flush_toggles(table, inserts, deletes):
+    """把合并后的切换批量写入数据库（插入忽略重复，删除按情绪分组）"""
+    if inserts:
+        rows = [
+            {
+                'emotion_id': emotion_id,
+                'user_id': user_id,
+                'created_at': datetime.utcfromtimestamp(at).isoformat()
+            }
+            for emotion_id, user_id, at in inserts
+        ]
+        supabase.table(table).upsert(rows, on_conflict='emotion_id,user_id', ignore_duplicates=True).execute()
+    
+    users_by_emotion = {}
+    for emotion_id, user_id, _ in deletes:
+        users_by_emotion.setdefault(emotion_id, []).append(user_id)
+    for emotion_id, user_ids in users_by_emotion.items():
+        supabase.table(table).delete().eq('emotion_id', emotion_id).in_('user_id', user_ids).execute()
+
+def apply_pending_toggles(emotion_data, viewer_id):
+    """情绪详情叠加尚未写入数据库的点赞/收藏"""
+    stats = emotion_data['stats']
+    for table, count_field, flag_field in [('likes', 'likes_count', 'is_liked'), ('collections', 'collections_count', 'is_collected')]:
+        stats[count_field] = max(stats[count_field] + toggle_buffer.pending_delta(table, emotion_data['id']), 0)
+        if viewer_id:
+            pending = toggle_buffer.pending_state(table, emotion_data['id'], viewer_id)
+            if pending is not None:
+                stats[flag_field] = pending
+
+# 点赞/收藏写回缓冲（可选）；由app在处理请求的进程中启动，启动时重放上次未写入数据库的日志
+toggle_buffer = None
+if Config.WRITE_BEHIND_ENABLED:
+    toggle_buffer = WriteBehindBuffer(
+        Config.WRITE_BEHIND_JOURNAL_PATH,
+        flush_toggles,
+        interval_ms=Config.WRITE_BEHIND_FLUSH_INTERVAL_MS
+    )
+
+def start_background_workers():
+    """启动后台任务队列和点赞/收藏写回缓冲"""
+    job_runner.start()
+    if toggle_buffer is not None:
+        toggle_buffer.start()
+        atexit.register(toggle_buffer.stop)
+
+def purge_deleted_emotions(payload):
+    """后台任务：分批归档并物理删除超过保留期的软删除情绪及其点赞、收藏、评论"""
+    retention_days = payload.get('retention_days', Config.PURGE_RETENTION_DAYS)
+    batch_size = payload.get('batch_size', Config.PURGE_BATCH_SIZE)
+    if retention_days < Config.PURGE_MIN_RETENTION_DAYS:
+        raise ValueError(f"软删除保留天数不能少于{Config.PURGE_MIN_RETENTION_DAYS}天: {retention_days}")
+    total = 0
+    # 每批一个短事务，避免长时间持锁；批数有上限，剩余部分留给下次执行
+    for _ in range(Config.PURGE_MAX_BATCHES):
+        result = supabase.rpc('purge_deleted_emotions', {
+            'p_retention_days': retention_days,
+            'p_batch_size': batch_size
+        }).execute()
+        purged = result.data or 0
+        total += purged
+        if purged < batch_size:
+            break
+    if total:
+        print(f"已归档并删除{total}条软删除情绪")
+    return total
+
+job_runner.register('purge_deleted_emotions', purge_deleted_emotions)
+job_runner.schedule('purge_deleted_emotions', Config.PURGE_INTERVAL_HOURS * 3600)
+
+def maintain_emotion_partitions(payload):
+    """后台任务：预建未来月份的情绪分区，配置了保留月数时分离过期分区"""
+    result = supabase.rpc('maintain_emotion_partitions', {
+        'p_months_ahead': Config.EMOTION_PARTITION_MONTHS_AHEAD,
+        'p_keep_months': Config.EMOTION_PARTITION_KEEP_MONTHS
+    }).execute()
+    changes = result.data or {}
+    if changes.get('created') or changes.get('detached'):
+        print(f"情绪分区维护: 新建{changes.get('created')}，分离{changes.get('detached')}")
+    return changes
+
+job_runner.register('maintain_emotion_partitions', maintain_emotion_partitions)
+job_runner.schedule('maintain_emotion_partitions', Config.EMOTION_PARTITION_MAINTENANCE_HOURS * 3600)
+
+def fill_emotion_place(payload):
+    """后台任务：逆地理编码新情绪的坐标并保存地名（上游失败或排队已满时由任务队列退避重试）"""
+    result = supabase.table('emotions').select('id, user_id, latitude, longitude, place_name').eq('id', payload['emotion_id']).execute()
+    if not result.data:
+        return None
+    emotion = result.data[0]
+    if emotion['place_name'] or emotion['latitude'] is None or emotion['longitude'] is None:
+        return emotion['place_name']
+    place = geocoder.reverse(float(emotion['latitude']), float(emotion['longitude']))
+    if place['place_name']:
+        supabase.table('emotions').update({'place_name': place['place_name']}).eq('id', emotion['id']).execute()
+        invalidate_user_timeline(emotion['user_id'])
+        invalidate_emotion_detail(emotion['id'])
+    return place['place_name']
+
+job_runner.register('fill_emotion_place', fill_emotion_place)
+
+# ==================== 地理编码API ====================
+
+@api_bp.route('/geocode/reverse', methods=['GET'])
+@rate_limit('geocode_reverse')
+def reverse_geocode():
+    """逆地理编码：返回坐标所在网格的地名"""
+    try:
+        lat = float(request.args['lat'])
+        lng = float(request.args['lng'])
+        
+        if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+            return jsonify({'error': '无效的坐标'}), 400
+        
+    except (KeyError, ValueError):
+        return jsonify({'error': '缺少或无效的坐标参数'}), 400
+    
+    try:
+        place = geocoder.reverse(lat, lng)
+        
+        response = make_response(jsonify(place))
+        response.headers['Cache-Control'] = 'public, max-age=86400'
+        return response
+        
+    except UpstreamBusy as e:
+        response = make_response(jsonify({'error': '地址服务繁忙，请稍后再试'}), 503)
+        response.headers['Retry-After'] = str(math.ceil(e.retry_after))
+        return response
+    except requests.RequestException as e:
+        print(f"请求地址服务失败: {e}")
+        return jsonify({'error': '地址服务暂时不可用'}), 502
+    except Exception as e:
+        print(f"逆地理编码失败: {e}")
+        return jsonify({'error': '获取地址信息失败'}), 500
 
 # ==================== 情绪相关API ====================
 
@@ -59,7 +488,7 @@ def get_emotions():
         # 构建查询
         query = supabase.table('emotions').select(
             'id, user_id, emotion_type, content, custom_emoji, intensity, latitude, longitude, '
-            'privacy_setting, created_at, updated_at, '
+            'place_name, privacy_setting, created_at, updated_at, '
             'users(username, display_name, avatar_url)'
         )
         
@@ -84,19 +513,9 @@ def get_emotions():
             query = query.eq('user_id', user_id)
         
         # 时间过滤
-        if time_filter != 'all':
-            now = datetime.utcnow()
-            if time_filter == 'today':
-                start_time = now.replace(hour=0, minute=0, second=0, microsecond=0)
-            elif time_filter == 'week':
-                start_time = now - timedelta(days=7)
-            elif time_filter == 'month':
-                start_time = now - timedelta(days=30)
-            else:
-                start_time = None
-            
-            if start_time:
-                query = query.gte('created_at', start_time.isoformat())
+        start_time = get_time_filter_start(time_filter)
+        if start_time:
+            query = query.gte('created_at', start_time.isoformat())
         
         # 分页
         offset = (page - 1) * limit
@@ -116,6 +535,7 @@ def get_emotions():
                 'intensity': emotion.get('intensity', 5),
                 'latitude': emotion['latitude'],
                 'longitude': emotion['longitude'],
+                'place_name': emotion.get('place_name'),
                 'privacy_setting': emotion['privacy_setting'],
                 'created_at': emotion['created_at'],
                 'updated_at': emotion['updated_at'],
@@ -136,6 +556,7 @@ def get_emotions():
 
 @api_bp.route('/emotions', methods=['POST'])
 @require_auth
+@rate_limit('create_emotion')
 def create_emotion():
     """创建新情绪"""
     try:
@@ -148,7 +569,7 @@ def create_emotion():
                 return jsonify({'error': f'缺少必需字段: {field}'}), 400
         
         # 验证情绪类型
-        if data['emotion_type'] not in EMOTION_TYPES:
+        if data['emotion_type'] not in emotion_types:
             return jsonify({'error': '无效的情绪类型'}), 400
         
         # 如果是自定义类型，验证custom_emoji字段
@@ -174,6 +595,11 @@ def create_emotion():
             'updated_at': datetime.utcnow().isoformat()
         }
         
+        # 保存粗粒度地名，列表接口无需再逆地理编码（选点时已查询过，通常命中缓存；未命中时由后台任务补全）
+        place_name = cached_place_name(emotion_data['latitude'], emotion_data['longitude'])
+        if place_name:
+            emotion_data['place_name'] = place_name
+        
         # 如果是自定义类型，添加custom_emoji字段
         if data['emotion_type'] == 'custom':
             emotion_data['custom_emoji'] = data['custom_emoji']
@@ -182,6 +608,10 @@ def create_emotion():
         result = supabase.table('emotions').insert(emotion_data).execute()
         
         if result.data:
+            invalidate_user_timeline(emotion_data['user_id'])
+            index_emotion(result.data[0])
+            if not place_name and emotion_data['latitude'] is not None and emotion_data['longitude'] is not None:
+                job_runner.enqueue('fill_emotion_place', {'emotion_id': result.data[0]['id']})
             return jsonify({
                 'message': '情绪创建成功',
                 'emotion': result.data[0]
@@ -193,66 +623,169 @@ def create_emotion():
         print(f"创建情绪失败: {e}")
         return jsonify({'error': '创建情绪失败'}), 500
 
+@api_bp.route('/emotions/nearby', methods=['GET'])
+def get_nearby_emotions():
+    """获取附近的公开情绪"""
+    try:
+        lat = float(request.args['lat'])
+        lng = float(request.args['lng'])
+        k = min(max(int(request.args.get('k', 20)), 1), Config.NEARBY_MAX_K)
+        radius_km = float(request.args.get('radius_km', Config.NEARBY_DEFAULT_RADIUS_KM))
+        radius_km = min(max(radius_km, 0.0), Config.NEARBY_MAX_RADIUS_KM)
+        
+        if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+            return jsonify({'error': '无效的坐标'}), 400
+        
+    except (KeyError, ValueError):
+        return jsonify({'error': '缺少或无效的坐标参数'}), 400
+    
+    try:
+        nearby_index.ensure_loaded(fetch_live_emotions)
+        index_sync.maybe_sync()
+        emotions = nearby_index.query(lat, lng, k=k, radius_km=radius_km)
+        
+        return jsonify({
+            'emotions': emotions,
+            'k': k,
+            'radius_km': radius_km,
+            'total': len(emotions)
+        })
+        
+    except Exception as e:
+        print(f"获取附近情绪失败: {e}")
+        return jsonify({'error': '获取附近情绪失败'}), 500
+
+@api_bp.route('/emotions/trending', methods=['GET'])
+def get_trending_emotions():
+    """获取热门公开情绪"""
+    try:
+        window = request.args.get('window', Config.TRENDING_DEFAULT_WINDOW)
+        limit = min(max(int(request.args.get('limit', 20)), 1), Config.TRENDING_MAX_LIMIT)
+        bbox = parse_bbox(request.args.get('bbox'))
+        
+        if window not in Config.TRENDING_WINDOWS:
+            return jsonify({'error': f'window参数只支持{"/".join(Config.TRENDING_WINDOWS)}'}), 400
+        
+    except ValueError:
+        return jsonify({'error': '无效的查询参数'}), 400
+    
+    try:
+        trending.ensure_loaded(fetch_trending_data)
+        index_sync.maybe_sync()
+        since = datetime.now(timezone.utc).timestamp() - Config.TRENDING_WINDOWS[window]
+        emotions = trending.top(k=limit, bbox=bbox, since=since)
+        
+        return jsonify({
+            'emotions': emotions,
+            'window': window,
+            'total': len(emotions)
+        })
+        
+    except Exception as e:
+        print(f"获取热门情绪失败: {e}")
+        return jsonify({'error': '获取热门情绪失败'}), 500
+
+@api_bp.route('/emotions/search', methods=['GET'])
+def search_emotions():
+    """全文搜索情绪内容"""
+    try:
+        keyword = request.args.get('q', '').strip()
+        emotion_type = request.args.get('type')
+        time_filter = request.args.get('time_filter', 'all')
+        privacy = request.args.get('privacy', 'public')
+        page = max(int(request.args.get('page', 1)), 1)
+        limit = min(max(int(request.args.get('limit', 20)), 1), 100)
+        
+        if not keyword:
+            return jsonify({'error': '缺少搜索关键词'}), 400
+        
+        current_user_id = get_current_user_id()
+        if privacy == 'private' and not current_user_id:
+            return jsonify({'error': '需要登录查看私密情绪'}), 401
+        
+        start_time = get_time_filter_start(time_filter)
+        since = start_time.replace(tzinfo=timezone.utc).timestamp() if start_time else None
+        
+        def accept(meta):
+            # 情绪类型过滤
+            if emotion_type and emotion_type != 'all' and meta['emotion_type'] != emotion_type:
+                return False
+            # 时间过滤
+            if since is not None and meta['created_at'] < since:
+                return False
+            # 隐私设置过滤：public只看公开，private只看自己的，all为公开和自己的
+            is_own = current_user_id is not None and meta['user_id'] == current_user_id
+            if privacy == 'private':
+                return is_own
+            if privacy == 'all':
+                return meta['privacy_setting'] == 'public' or is_own
+            return meta['privacy_setting'] == 'public'
+        
+        search_index.ensure_loaded(lambda: fetch_live_emotions(public_only=False))
+        index_sync.maybe_sync()
+        results, total = search_index.search(keyword, accept=accept, page=page, limit=limit)
+        
+        # 以数据库中的当前状态核对本页结果：已删除或不再满足条件（如改为私密）的情绪不返回，并修正索引
+        current = fetch_current_emotions([emotion['id'] for emotion in results])
+        emotions = []
+        for emotion in results:
+            row = current.get(emotion['id'])
+            if row is None or row['is_deleted']:
+                unindex_emotion(emotion['id'])
+                total -= 1
+                continue
+            payload = document_payload(row)
+            if any(payload[key] != emotion[key] for key in payload):
+                index_emotion(row)
+            if not accept(document_meta(row)):
+                total -= 1
+                continue
+            emotions.append(dict(payload, score=emotion['score']))
+        
+        return jsonify({
+            'emotions': emotions,
+            'page': page,
+            'limit': limit,
+            'total': total,
+            'total_pages': (total + limit - 1) // limit
+        })
+    
+    except ValueError:
+        return jsonify({'error': '无效的查询参数'}), 400
+    except Exception as e:
+        print(f"搜索情绪失败: {e}")
+        return jsonify({'error': '搜索情绪失败'}), 500
+
 @api_bp.route('/emotions/<int:emotion_id>', methods=['GET'])
 def get_emotion_detail(emotion_id):
     """获取情绪详情"""
     try:
-        # 获取情绪详情
-        result = supabase.table('emotions').select(
-            'id, user_id, emotion_type, content, custom_emoji, intensity, latitude, longitude, '
-            'privacy_setting, created_at, updated_at, '
-            'users(username, display_name, avatar_url)'
-        ).eq('id', emotion_id).eq('is_deleted', False).execute()
+        current_user_id = get_current_user_id()
         
-        if not result.data:
-            return jsonify({'error': '情绪不存在'}), 404
+        # 公共部分与查看者无关：先读缓存，未命中时同一情绪的并发请求只触发一次数据库调用
+        emotion = emotion_detail_cache.get(emotion_id)
+        if emotion is None:
+            emotion = emotion_detail_flight.do(emotion_id, lambda: load_emotion_detail(emotion_id))
         
-        emotion = result.data[0]
+        if emotion is None:
+            return jsonify({'error': '情绪不存在'}), 404
         
         # 检查隐私权限
         if emotion['privacy_setting'] == 'private':
-            current_user_id = get_current_user_id()
             if not current_user_id or current_user_id != emotion['user_id']:
                 return jsonify({'error': '无权查看此情绪'}), 403
         
-        # 获取社交统计
-        likes_count = supabase.table('likes').select('id', count='exact').eq('emotion_id', emotion_id).execute().count or 0
-        collections_count = supabase.table('collections').select('id', count='exact').eq('emotion_id', emotion_id).execute().count or 0
-        comments_count = supabase.table('comments').select('id', count='exact').eq('emotion_id', emotion_id).eq('is_deleted', False).execute().count or 0
-        
-        # 检查当前用户是否已点赞/收藏
-        current_user_id = get_current_user_id()
-        is_liked = False
-        is_collected = False
-        
+        # 当前用户的点赞/收藏状态单独缓存和查询，不会改写公共部分的缓存
+        viewer_flags = {'is_liked': False, 'is_collected': False}
         if current_user_id:
-            like_result = supabase.table('likes').select('id').eq('emotion_id', emotion_id).eq('user_id', current_user_id).execute()
-            is_liked = bool(like_result.data)
-            
-            collection_result = supabase.table('collections').select('id').eq('emotion_id', emotion_id).eq('user_id', current_user_id).execute()
-            is_collected = bool(collection_result.data)
+            viewer_key = (emotion_id, current_user_id)
+            viewer_flags = emotion_viewer_cache.get(viewer_key) or emotion_detail_flight.do(
+                viewer_key, lambda: load_viewer_flags(emotion_id, current_user_id)
+            )
         
-        emotion_data = {
-            'id': emotion['id'],
-            'user_id': emotion['user_id'],
-            'emotion_type': emotion['emotion_type'],
-            'content': emotion['content'],
-            'custom_emoji': emotion.get('custom_emoji'),
-            'intensity': emotion.get('intensity', 5),
-            'latitude': emotion['latitude'],
-            'longitude': emotion['longitude'],
-            'privacy_setting': emotion['privacy_setting'],
-            'created_at': emotion['created_at'],
-            'updated_at': emotion['updated_at'],
-            'user': emotion['users'],
-            'stats': {
-                'likes_count': likes_count,
-                'collections_count': collections_count,
-                'comments_count': comments_count,
-                'is_liked': is_liked,
-                'is_collected': is_collected
-            }
-        }
+        emotion_data = dict(emotion, stats=dict(emotion['stats'], **viewer_flags))
+        if toggle_buffer is not None:
+            apply_pending_toggles(emotion_data, current_user_id)
         
         return jsonify({'emotion': emotion_data})
         
@@ -268,15 +801,6 @@ def update_emotion(emotion_id):
         data = request.get_json()
         current_user_id = get_current_user_id()
         
-        # 检查情绪是否存在且属于当前用户
-        emotion_result = supabase.table('emotions').select('user_id').eq('id', emotion_id).eq('is_deleted', False).execute()
-        
-        if not emotion_result.data:
-            return jsonify({'error': '情绪不存在'}), 404
-        
-        if emotion_result.data[0]['user_id'] != current_user_id:
-            return jsonify({'error': '无权修改此情绪'}), 403
-        
         # 准备更新数据
         update_data = {'updated_at': datetime.utcnow().isoformat()}
         
@@ -291,16 +815,19 @@ def update_emotion(emotion_id):
         if len(update_data) == 1:  # 只有updated_at
             return jsonify({'error': '没有可更新的字段'}), 400
         
-        # 更新数据库
-        result = supabase.table('emotions').update(update_data).eq('id', emotion_id).execute()
+        # 条件更新：归属和删除状态作为WHERE条件，一次请求完成检查和写入
+        result = supabase.table('emotions').update(update_data).eq('id', emotion_id).eq('user_id', current_user_id).eq('is_deleted', False).execute()
         
-        if result.data:
-            return jsonify({
-                'message': '情绪更新成功',
-                'emotion': result.data[0]
-            })
-        else:
-            return jsonify({'error': '更新情绪失败'}), 500
+        if not result.data:
+            return emotion_write_miss(emotion_id, '无权修改此情绪')
+        
+        invalidate_user_timeline(current_user_id)
+        invalidate_emotion_detail(emotion_id)
+        index_emotion(result.data[0])
+        return jsonify({
+            'message': '情绪更新成功',
+            'emotion': result.data[0]
+        })
             
     except Exception as e:
         print(f"更新情绪失败: {e}")
@@ -313,15 +840,6 @@ def delete_emotion(emotion_id):
     try:
         current_user_id = get_current_user_id()
         
-        # 检查情绪是否存在且属于当前用户
-        emotion_result = supabase.table('emotions').select('user_id').eq('id', emotion_id).eq('is_deleted', False).execute()
-        
-        if not emotion_result.data:
-            return jsonify({'error': '情绪不存在'}), 404
-        
-        if emotion_result.data[0]['user_id'] != current_user_id:
-            return jsonify({'error': '无权删除此情绪'}), 403
-        
         # 软删除
         update_data = {
             'is_deleted': True,
@@ -329,12 +847,16 @@ def delete_emotion(emotion_id):
             'updated_at': datetime.utcnow().isoformat()
         }
         
-        result = supabase.table('emotions').update(update_data).eq('id', emotion_id).execute()
+        # 条件更新：归属和删除状态作为WHERE条件，一次请求完成检查和写入
+        result = supabase.table('emotions').update(update_data).eq('id', emotion_id).eq('user_id', current_user_id).eq('is_deleted', False).execute()
         
-        if result.data:
-            return jsonify({'message': '情绪删除成功'})
-        else:
-            return jsonify({'error': '删除情绪失败'}), 500
+        if not result.data:
+            return emotion_write_miss(emotion_id, '无权删除此情绪')
+        
+        invalidate_user_timeline(current_user_id)
+        invalidate_emotion_detail(emotion_id)
+        unindex_emotion(emotion_id)
+        return jsonify({'message': '情绪删除成功'})
             
     except Exception as e:
         print(f"删除情绪失败: {e}")
@@ -344,6 +866,7 @@ def delete_emotion(emotion_id):
 
 @api_bp.route('/emotions/<int:emotion_id>/like', methods=['POST'])
 @require_auth
+@rate_limit('toggle_like')
 def toggle_like(emotion_id):
     """切换点赞状态"""
     try:
@@ -361,12 +884,27 @@ def toggle_like(emotion_id):
         if emotion['privacy_setting'] == 'private' and emotion['user_id'] != current_user_id:
             return jsonify({'error': '无权对此情绪点赞'}), 403
         
+        if toggle_buffer is not None:
+            # 写回模式：记录到日志后立即返回预测的点赞数，由后台批量写入
+            liked, likes_count = toggle_buffer.toggle('likes', emotion_id, current_user_id, load_toggle_state)
+            if liked:
+                trending.engage(emotion_id, 'like', current_user_id)
+            else:
+                trending.disengage(emotion_id, 'like', current_user_id)
+            invalidate_emotion_detail(emotion_id, current_user_id)
+            return jsonify({
+                'message': f'点赞状态已更新',
+                'action': 'liked' if liked else 'unliked',
+                'likes_count': likes_count
+            })
+        
         # 检查是否已点赞
         like_result = supabase.table('likes').select('id').eq('emotion_id', emotion_id).eq('user_id', current_user_id).execute()
         
         if like_result.data:
             # 取消点赞
             supabase.table('likes').delete().eq('emotion_id', emotion_id).eq('user_id', current_user_id).execute()
+            trending.disengage(emotion_id, 'like', current_user_id)
             action = 'unliked'
         else:
             # 添加点赞
@@ -376,8 +914,11 @@ def toggle_like(emotion_id):
                 'created_at': datetime.utcnow().isoformat()
             }
             supabase.table('likes').insert(like_data).execute()
+            trending.engage(emotion_id, 'like', current_user_id)
             action = 'liked'
         
+        invalidate_emotion_detail(emotion_id, current_user_id)
+        
         # 获取最新点赞数
         likes_count = supabase.table('likes').select('id', count='exact').eq('emotion_id', emotion_id).execute().count or 0
         
@@ -395,6 +936,7 @@ def toggle_like(emotion_id):
 
 @api_bp.route('/emotions/<int:emotion_id>/collect', methods=['POST'])
 @require_auth
+@rate_limit('toggle_collection')
 def toggle_collection(emotion_id):
     """切换收藏状态"""
     try:
@@ -412,12 +954,27 @@ def toggle_collection(emotion_id):
         if emotion['privacy_setting'] == 'private' and emotion['user_id'] != current_user_id:
             return jsonify({'error': '无权收藏此情绪'}), 403
         
+        if toggle_buffer is not None:
+            # 写回模式：记录到日志后立即返回预测的收藏数，由后台批量写入
+            collected, collections_count = toggle_buffer.toggle('collections', emotion_id, current_user_id, load_toggle_state)
+            if collected:
+                trending.engage(emotion_id, 'collection', current_user_id)
+            else:
+                trending.disengage(emotion_id, 'collection', current_user_id)
+            invalidate_emotion_detail(emotion_id, current_user_id)
+            return jsonify({
+                'message': f'收藏状态已更新',
+                'action': 'collected' if collected else 'uncollected',
+                'collections_count': collections_count
+            })
+        
         # 检查是否已收藏
         collection_result = supabase.table('collections').select('id').eq('emotion_id', emotion_id).eq('user_id', current_user_id).execute()
         
         if collection_result.data:
             # 取消收藏
             supabase.table('collections').delete().eq('emotion_id', emotion_id).eq('user_id', current_user_id).execute()
+            trending.disengage(emotion_id, 'collection', current_user_id)
             action = 'uncollected'
         else:
             # 添加收藏
@@ -427,8 +984,11 @@ def toggle_collection(emotion_id):
                 'created_at': datetime.utcnow().isoformat()
             }
             supabase.table('collections').insert(collection_data).execute()
+            trending.engage(emotion_id, 'collection', current_user_id)
             action = 'collected'
         
+        invalidate_emotion_detail(emotion_id, current_user_id)
+        
         # 获取最新收藏数
         collections_count = supabase.table('collections').select('id', count='exact').eq('emotion_id', emotion_id).execute().count or 0
         
@@ -442,6 +1002,67 @@ def toggle_collection(emotion_id):
         print(f"切换收藏状态失败: {e}")
         return jsonify({'error': '操作失败'}), 500
 
+@api_bp.route('/user/emotions', methods=['GET'])
+@require_auth
+def get_user_emotions():
+    """获取当前用户的情绪时间线（包含公开和私密情绪）"""
+    try:
+        current_user_id = get_current_user_id()
+        page = max(int(request.args.get('page', 1)), 1)
+        limit = min(max(int(request.args.get('limit', 20)), 1), 100)
+        
+        # 首页命中缓存时直接返回
+        if page == 1:
+            cached = user_timeline_cache.get(current_user_id)
+            if cached and cached['limit'] == limit:
+                return jsonify(cached)
+        
+        # 分页
+        offset = (page - 1) * limit
+        
+        # 按(user_id, is_deleted, created_at DESC)复合索引查询，不关联users表
+        result = supabase.table('emotions').select(
+            'id, user_id, emotion_type, content, custom_emoji, intensity, latitude, longitude, '
+            'place_name, privacy_setting, created_at, updated_at',
+            count='exact'
+        ).eq('user_id', current_user_id).eq('is_deleted', False).order('created_at', desc=True).range(offset, offset + limit - 1).execute()
+        
+        emotions = []
+        for emotion in result.data:
+            emotion_data = {
+                'id': emotion['id'],
+                'user_id': emotion['user_id'],
+                'emotion_type': emotion['emotion_type'],
+                'content': emotion['content'],
+                'custom_emoji': emotion.get('custom_emoji'),
+                'intensity': emotion.get('intensity', 5),
+                'latitude': emotion['latitude'],
+                'longitude': emotion['longitude'],
+                'place_name': emotion.get('place_name'),
+                'privacy_setting': emotion['privacy_setting'],
+                'created_at': emotion['created_at'],
+                'updated_at': emotion['updated_at']
+            }
+            emotions.append(emotion_data)
+        
+        total = result.count or 0
+        response_data = {
+            'emotions': emotions,
+            'page': page,
+            'limit': limit,
+            'total': total,
+            'total_pages': (total + limit - 1) // limit
+        }
+        
+        if page == 1:
+            user_timeline_cache.set(current_user_id, response_data)
+        
+        return jsonify(response_data)
+        
+    except Exception as e:
+        print(f"获取用户情绪列表失败: {e}")
+        return jsonify({'error': '获取用户情绪列表失败'}), 500
+
 @api_bp.route('/user/collections', methods=['GET'])
 @require_auth
 def get_user_collections():
@@ -454,21 +1075,30 @@ def get_user_collections():
         # 分页
         offset = (page - 1) * limit
         
-        # 获取收藏的情绪
+        # 获取收藏记录
         result = supabase.table('collections').select(
-            'id, created_at, '
-            'emotions(id, user_id, emotion_type, content, latitude, longitude, '
-            'privacy_setting, created_at, updated_at, '
-            'users(username, display_name, avatar_url))'
+            'id, emotion_id, created_at'
         ).eq('user_id', current_user_id).order('created_at', desc=True).range(offset, offset + limit - 1).execute()
         
+        # 批量获取收藏的情绪（emotions按月分区后collections不再有指向它的外键，无法嵌入查询）
+        emotion_ids = list({collection['emotion_id'] for collection in result.data})
+        emotions_by_id = {}
+        if emotion_ids:
+            emotions_result = supabase.table('emotions').select(
+                'id, user_id, emotion_type, content, latitude, longitude, '
+                'privacy_setting, created_at, updated_at, '
+                'users(username, display_name, avatar_url)'
+            ).in_('id', emotion_ids).eq('is_deleted', False).execute()
+            emotions_by_id = {emotion['id']: emotion for emotion in emotions_result.data}
+        
         collections = []
         for collection in result.data:
-            if collection['emotions'] and not collection['emotions'].get('is_deleted', False):
+            emotion = emotions_by_id.get(collection['emotion_id'])
+            if emotion:
                 collection_data = {
                     'collection_id': collection['id'],
                     'collected_at': collection['created_at'],
-                    'emotion': collection['emotions']
+                    'emotion': emotion
                 }
                 collections.append(collection_data)
         
@@ -550,8 +1180,86 @@ def get_comments(emotion_id):
         print(f"获取评论列表失败: {e}")
         return jsonify({'error': '获取评论列表失败'}), 500
 
+@api_bp.route('/emotions/<int:emotion_id>/comments/threads', methods=['GET'])
+def get_comment_threads(emotion_id):
+    """获取情绪的评论线程（楼中楼），一次查询加载整页线程"""
+    try:
+        page = max(int(request.args.get('page', 1)), 1)
+        limit = min(max(int(request.args.get('limit', 20)), 1), 50)
+        max_depth = min(max(int(request.args.get('max_depth', Config.COMMENT_THREAD_MAX_DEPTH)), 0), Config.COMMENT_THREAD_MAX_DEPTH)
+        max_replies = min(max(int(request.args.get('max_replies', Config.COMMENT_THREAD_MAX_REPLIES)), 0), Config.COMMENT_THREAD_MAX_REPLIES)
+        
+        # 检查情绪是否存在和权限
+        emotion_result = supabase.table('emotions').select('id, privacy_setting, user_id').eq('id', emotion_id).eq('is_deleted', False).execute()
+        
+        if not emotion_result.data:
+            return jsonify({'error': '情绪不存在'}), 404
+        
+        emotion = emotion_result.data[0]
+        current_user_id = get_current_user_id()
+        
+        # 检查隐私权限
+        if emotion['privacy_setting'] == 'private':
+            if not current_user_id or current_user_id != emotion['user_id']:
+                return jsonify({'error': '无权查看此情绪的评论'}), 403
+        
+        # 递归CTE一次返回按深度优先排序的整页线程
+        result = supabase.rpc('get_comment_threads', {
+            'p_emotion_id': emotion_id,
+            'p_viewer_id': current_user_id,
+            'p_limit': limit,
+            'p_offset': (page - 1) * limit,
+            'p_max_depth': max_depth,
+            'p_max_replies': max_replies
+        }).execute()
+        
+        # 一次遍历组装评论树（父评论总是先于子评论出现）
+        nodes = {}
+        threads = []
+        for row in result.data or []:
+            node = {
+                'id': row['id'],
+                'parent_id': row['parent_id'],
+                'user_id': row['user_id'],
+                'content': row['content'],
+                'created_at': row['created_at'],
+                'updated_at': row['updated_at'],
+                'depth': row['depth'],
+                'user': {
+                    'username': row['username'],
+                    'display_name': row['display_name'],
+                    'avatar_url': row['avatar_url']
+                },
+                'likes_count': row['likes_count'] or 0,
+                'is_liked': bool(row['is_liked']),
+                'replies': []
+            }
+            nodes[row['id']] = node
+            parent = nodes.get(row['parent_id'])
+            if parent is not None:
+                parent['replies'].append(node)
+            elif row['depth'] == 0:
+                # 回复数在每层截断后统计，超过max_replies时表示还有未加载的回复
+                node['reply_count'] = row['thread_size'] or 0
+                node['has_more_replies'] = node['reply_count'] > max_replies
+                threads.append(node)
+        
+        return jsonify({
+            'threads': threads,
+            'page': page,
+            'limit': limit,
+            'total': len(threads)
+        })
+        
+    except ValueError:
+        return jsonify({'error': '无效的查询参数'}), 400
+    except Exception as e:
+        print(f"获取评论线程失败: {e}")
+        return jsonify({'error': '获取评论线程失败'}), 500
+
 @api_bp.route('/emotions/<int:emotion_id>/comments', methods=['POST'])
 @require_auth
+@rate_limit('create_comment')
 def create_comment(emotion_id):
     """创建评论"""
     try:
@@ -563,8 +1271,8 @@ def create_comment(emotion_id):
         if not content:
             return jsonify({'error': '评论内容不能为空'}), 400
         
-        if len(content) > Config.MAX_COMMENT_LENGTH:
-            return jsonify({'error': f'评论内容不能超过{Config.MAX_COMMENT_LENGTH}个字符'}), 400
+        if len(content) > Config.COMMENT_MAX_LENGTH:
+            return jsonify({'error': f'评论内容不能超过{Config.COMMENT_MAX_LENGTH}个字符'}), 400
         
         # 检查情绪是否存在和权限
         emotion_result = supabase.table('emotions').select('id, privacy_setting, user_id').eq('id', emotion_id).eq('is_deleted', False).execute()
@@ -578,34 +1286,45 @@ def create_comment(emotion_id):
         if emotion['privacy_setting'] == 'private' and emotion['user_id'] != current_user_id:
             return jsonify({'error': '无权评论此情绪'}), 403
         
-        # 创建评论
-        comment_data = {
-            'emotion_id': emotion_id,
-            'user_id': current_user_id,
-            'content': content,
-            'created_at': datetime.utcnow().isoformat(),
-            'updated_at': datetime.utcnow().isoformat()
-        }
-        
-        result = supabase.table('comments').insert(comment_data).execute()
+        # 回复评论时检查父评论属于同一情绪
+        parent_id = data.get('parent_id')
+        if parent_id:
+            parent_result = supabase.table('comments').select('id').eq('id', parent_id).eq('emotion_id', emotion_id).eq('is_deleted', False).execute()
+            if not parent_result.data:
+                return jsonify({'error': '回复的评论不存在'}), 404
+        
+        # 插入评论并在同一次调用中返回作者信息
+        result = supabase.rpc('create_comment_with_author', {
+            'p_emotion_id': emotion_id,
+            'p_user_id': current_user_id,
+            'p_content': content,
+            'p_parent_id': parent_id or None
+        }).execute()
         
         if result.data:
-            # 获取完整的评论信息
-            comment_id = result.data[0]['id']
-            comment_result = supabase.table('comments').select(
-                'id, user_id, content, created_at, updated_at, '
-                'users(username, display_name, avatar_url)'
-            ).eq('id', comment_id).execute()
+            invalidate_emotion_detail(emotion_id)
+            row = result.data[0]
+            trending.engage(emotion_id, 'comment', row['id'])
+            comment = {
+                'id': row['id'],
+                'parent_id': row['parent_id'],
+                'user_id': row['user_id'],
+                'content': row['content'],
+                'created_at': row['created_at'],
+                'updated_at': row['updated_at'],
+                'users': {
+                    'username': row['username'],
+                    'display_name': row['display_name'],
+                    'avatar_url': row['avatar_url']
+                },
+                'likes_count': 0,
+                'is_liked': False
+            }
             
-            if comment_result.data:
-                comment = comment_result.data[0]
-                comment['likes_count'] = 0
-                comment['is_liked'] = False
-                
-                return jsonify({
-                    'message': '评论创建成功',
-                    'comment': comment
-                }), 201
+            return jsonify({
+                'message': '评论创建成功',
+                'comment': comment
+            }), 201
         
         return jsonify({'error': '创建评论失败'}), 500
         
@@ -615,6 +1334,7 @@ def create_comment(emotion_id):
 
 @api_bp.route('/comments/<int:comment_id>/like', methods=['POST'])
 @require_auth
+@rate_limit('toggle_comment_like')
 def toggle_comment_like(comment_id):
     """切换评论点赞状态"""
     try:
@@ -699,9 +1419,163 @@ def get_user_stats():
         print(f"获取用户统计失败: {e}")
         return jsonify({'error': '获取统计信息失败'}), 500
 
+# ==================== 热力图API ====================
+
+@api_bp.route('/heatmap/<int:z>/<int:x>/<int:y>', methods=['GET'])
+def get_heatmap_tile(z, x, y):
+    """获取情绪热力图瓦片"""
+    try:
+        granularity = request.args.get('granularity', 'day')
+        if granularity not in GRANULARITIES:
+            return jsonify({'error': '无效的时间粒度'}), 400
+        
+        default_buckets = 24 if granularity == 'hour' else 7
+        buckets = int(request.args.get('buckets', default_buckets))
+        buckets = min(max(buckets, 1), Config.HEATMAP_RETENTION[granularity])
+        
+        # 校验瓦片坐标
+        if z > Config.HEATMAP_MAX_ZOOM:
+            return jsonify({'error': f'缩放级别不能超过{Config.HEATMAP_MAX_ZOOM}'}), 400
+        if x >= (1 << z) or y >= (1 << z):
+            return jsonify({'error': '无效的瓦片坐标'}), 400
+        
+        heatmap.ensure_loaded(fetch_live_emotions)
+        index_sync.maybe_sync()
+        heatmap.maybe_prune()
+        
+        # 先用瓦片版本号比较ETag，未变化时不组装内容
+        bucket_starts = heatmap.bucket_starts(granularity, buckets)
+        etag = heatmap.tile_etag(z, x, y, granularity, bucket_starts)
+        if etag in request.if_none_match:
+            response = make_response('', 304)
+        else:
+            response = jsonify({
+                'z': z,
+                'x': x,
+                'y': y,
+                'granularity': granularity,
+                'buckets': bucket_starts,
+                'cells': heatmap.get_tile(z, x, y, granularity, bucket_starts)
+            })
+        
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = f'public, max-age={Config.HEATMAP_CACHE_MAX_AGE}'
+        return response
+        
+    except Exception as e:
+        print(f"获取热力图瓦片失败: {e}")
+        return jsonify({'error': '获取热力图失败'}), 500
+
+# ==================== 数据分析API ====================
+
+class SnapshotUnavailable(Exception):
+    """分析快照尚未生成"""
+
+def build_analytics_snapshot(payload):
+    """后台任务：重建情绪分析快照，各进程在下次请求时加载新快照"""
+    snapshot = analytics.refresh(fetch_live_emotions)
+    return len(snapshot)
+
+job_runner.register('build_analytics_snapshot', build_analytics_snapshot)
+job_runner.schedule('build_analytics_snapshot', Config.ANALYTICS_SNAPSHOT_TTL)
+
+def get_analytics_scope():
+    """解析分析接口通用的bbox和time_filter参数，返回(快照, 掩码, 起始时间戳)"""
+    bbox = parse_bbox(request.args.get('bbox'))
+    start_time = get_time_filter_start(request.args.get('time_filter', 'all'))
+    since = start_time.replace(tzinfo=timezone.utc).timestamp() if start_time else None
+    snapshot = analytics.snapshot()
+    if analytics.is_stale(snapshot):
+        # 快照缺失或后台任务未按时重建：补充一次构建任务，期间继续使用旧快照
+        job_runner.enqueue_unique('build_analytics_snapshot')
+    if snapshot is None:
+        raise SnapshotUnavailable()
+    return snapshot, analytics.mask(snapshot, bbox=bbox, since=since), since
+
+@api_bp.route('/analytics/type-mix', methods=['GET'])
+def get_analytics_type_mix():
+    """统计区域内的情绪类型分布"""
+    try:
+        snapshot, mask, _ = get_analytics_scope()
+        result = analytics.type_mix(snapshot, mask)
+        result['snapshot_at'] = snapshot.built_at
+        return jsonify(result)
+        
+    except ValueError:
+        return jsonify({'error': '无效的查询参数'}), 400
+    except SnapshotUnavailable:
+        return jsonify({'error': '统计数据生成中，请稍后再试'}), 503
+    except Exception as e:
+        print(f"获取情绪类型分布失败: {e}")
+        return jsonify({'error': '获取统计数据失败'}), 500
+
+@api_bp.route('/analytics/intensity-trend', methods=['GET'])
+def get_analytics_intensity_trend():
+    """按时间统计情绪数量和平均强度"""
+    try:
+        intervals = {'hour': 3600, 'day': 86400, 'week': 7 * 86400}
+        interval = intervals.get(request.args.get('interval', 'day'))
+        if not interval:
+            return jsonify({'error': '无效的时间间隔'}), 400
+        
+        snapshot, mask, since = get_analytics_scope()
+        until = datetime.now(timezone.utc).timestamp()
+        if since is None:
+            since = until - 30 * 86400
+        # 限制返回的时间段数量
+        since = max(since, until - 1000 * interval)
+        
+        return jsonify({
+            'interval': interval,
+            'trend': analytics.intensity_trend(snapshot, mask, interval, since, until),
+            'snapshot_at': snapshot.built_at
+        })
+        
+    except ValueError:
+        return jsonify({'error': '无效的查询参数'}), 400
+    except SnapshotUnavailable:
+        return jsonify({'error': '统计数据生成中，请稍后再试'}), 503
+    except Exception as e:
+        print(f"获取情绪强度趋势失败: {e}")
+        return jsonify({'error': '获取统计数据失败'}), 500
+
+@api_bp.route('/analytics/hotspots', methods=['GET'])
+def get_analytics_hotspots():
+    """统计情绪最密集的区域"""
+    try:
+        cell_size = min(max(float(request.args.get('cell_size', 0.1)), 0.001), 10.0)
+        top = min(max(int(request.args.get('top', 10)), 1), 100)
+        
+        snapshot, mask, _ = get_analytics_scope()
+        return jsonify({
+            'cell_size': cell_size,
+            'hotspots': analytics.hotspots(snapshot, mask, cell_size, top),
+            'snapshot_at': snapshot.built_at
+        })
+        
+    except ValueError:
+        return jsonify({'error': '无效的查询参数'}), 400
+    except SnapshotUnavailable:
+        return jsonify({'error': '统计数据生成中，请稍后再试'}), 503
+    except Exception as e:
+        print(f"获取情绪热点失败: {e}")
+        return jsonify({'error': '获取统计数据失败'}), 500
+
 # ==================== 情绪类型API ====================
 
 @api_bp.route('/emotion-types', methods=['GET'])
 def get_emotion_types():
     """获取所有情绪类型"""
-    return jsonify({'emotion_types': EMOTION_TYPES})
\ No newline at end of file
+    # 响应体在启动时已序列化；带当前版本号(?v=)的URL内容不会变化，可长期缓存
+    if emotion_types.version in request.if_none_match:
+        response = make_response('', 304)
+    else:
+        response = make_response(emotion_types.body)
+        response.mimetype = 'application/json'
+    
+    response.set_etag(emotion_types.version)
+    if request.args.get('v') == emotion_types.version:
+        response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+    else:
+        response.headers['Cache-Control'] = f'public, max-age={Config.EMOTION_TYPES_MAX_AGE}'
+    return response
\ No newline at end of file
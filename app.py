@@ -1,27 +1,39 @@
 from flask import Flask, render_template, request, jsonify, session, redirect, url_for
 from flask_cors import CORS
-from supabase import create_client, Client
+from werkzeug.middleware.proxy_fix import ProxyFix
+from werkzeug.serving import is_running_from_reloader
 from config import Config
+from assets import AssetManifest
 from auth import GitHubAuth
-from api import api_bp
-import requests
-import secrets
-from datetime import datetime, timedelta
+from api import api_bp, start_background_workers
+from emotion_types import emotion_types
 
 # 创建Flask应用
 app = Flask(__name__)
 app.config.from_object(Config)
 
+# 部署在一层反向代理之后时，只信任该代理追加的最后一个X-Forwarded-For地址作为客户端IP
+# （客户端自带的X-Forwarded-For前缀可以伪造，不能用于限流）
+if Config.RATE_LIMIT_TRUST_PROXY:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=1)
+
 # 启用CORS
 CORS(app, origins=Config.CORS_ORIGINS, supports_credentials=True)
 
-# 初始化Supabase客户端
-supabase: Client = create_client(Config.SUPABASE_URL, Config.SUPABASE_ANON_KEY)
-supabase_admin: Client = create_client(Config.SUPABASE_URL, Config.SUPABASE_SERVICE_ROLE_KEY)
+# 静态资源使用构建清单中的文件（python build_assets.py）
+assets = AssetManifest(app)
+
+# 模板中生成带版本号的情绪类型接口地址
+app.add_template_global(emotion_types, 'emotion_types')
 
 # 初始化GitHub认证
 auth = GitHubAuth(app)
 
+# 启动后台任务队列和写回缓冲（继续执行上次未完成的任务）
+# 调试模式的重载器会先在监视进程中执行本模块，再启动实际处理请求的子进程，后台线程只在后者中启动
+if __name__ != '__main__' or is_running_from_reloader():
+    start_background_workers()
+
 # 注册API蓝图
 app.register_blueprint(api_bp)
 
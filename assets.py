@@ -0,0 +1,137 @@
+# 静态资源清单
+# build_assets.py把static下的JS/CSS压缩、合并并按内容哈希命名输出到static/dist，生成manifest.json；
+# 运行时url_for('static', ...)按清单改写为构建后的文件，这些文件内容不会变化，按immutable永久缓存
+import json
+import mimetypes
+import os
+
+from flask import request, send_from_directory, url_for
+from markupsafe import Markup, escape
+from werkzeug.security import safe_join
+
+from config import Config
+
+# 构建输出目录和清单文件（相对static目录）
+DIST_DIR = 'dist'
+MANIFEST_NAME = 'manifest.json'
+
+# 自托管的第三方库：static下的路径 -> (下载地址, SRI摘要)
+# 路径带版本号，构建时保持原文件名（Leaflet按marker-icon.png文件名推断默认图标路径）
+VENDOR_FILES = {
+    'vendor/leaflet-1.9.4/leaflet.js': (
+        'https://unpkg.com/leaflet@1.9.4/dist/leaflet.js',
+        'sha256-20nQCchB9co0qIjJZRGuk2/Z9VM+kNiyxNV1lvTlZBo='
+    ),
+    'vendor/leaflet-1.9.4/leaflet.css': (
+        'https://unpkg.com/leaflet@1.9.4/dist/leaflet.css',
+        'sha256-p4NxAoJBhIIN+hmNHrzRCf9tD/miZyoHS5obTRR9BMY='
+    ),
+    'vendor/leaflet-1.9.4/images/layers.png': ('https://unpkg.com/leaflet@1.9.4/dist/images/layers.png', None),
+    'vendor/leaflet-1.9.4/images/layers-2x.png': ('https://unpkg.com/leaflet@1.9.4/dist/images/layers-2x.png', None),
+    'vendor/leaflet-1.9.4/images/marker-icon.png': ('https://unpkg.com/leaflet@1.9.4/dist/images/marker-icon.png', None),
+    'vendor/leaflet-1.9.4/images/marker-icon-2x.png': ('https://unpkg.com/leaflet@1.9.4/dist/images/marker-icon-2x.png', None),
+    'vendor/leaflet-1.9.4/images/marker-shadow.png': ('https://unpkg.com/leaflet@1.9.4/dist/images/marker-shadow.png', None),
+    'vendor/leaflet.markercluster-1.4.1/leaflet.markercluster.js': (
+        'https://unpkg.com/leaflet.markercluster@1.4.1/dist/leaflet.markercluster.js', None
+    ),
+    'vendor/leaflet.markercluster-1.4.1/MarkerCluster.css': (
+        'https://unpkg.com/leaflet.markercluster@1.4.1/dist/MarkerCluster.css', None
+    ),
+    'vendor/leaflet.markercluster-1.4.1/MarkerCluster.Default.css': (
+        'https://unpkg.com/leaflet.markercluster@1.4.1/dist/MarkerCluster.Default.css', None
+    ),
+}
+
+# CDN地址 -> SRI摘要（未下载第三方库时页面直接引用CDN）
+CDN_INTEGRITY = {url: integrity for url, integrity in VENDOR_FILES.values()}
+
+# 合并打包：打包后的逻辑路径 -> 按顺序合并的源文件（static下的路径）
+BUNDLES = {
+    'css/app.css': [
+        'vendor/leaflet-1.9.4/leaflet.css',
+        'vendor/leaflet.markercluster-1.4.1/MarkerCluster.css',
+        'vendor/leaflet.markercluster-1.4.1/MarkerCluster.Default.css',
+        'css/style.css',
+        'css/emotion-sprite.css'
+    ],
+    'js/vendor.js': [
+        'vendor/leaflet-1.9.4/leaflet.js',
+        'vendor/leaflet.markercluster-1.4.1/leaflet.markercluster.js'
+    ],
+    'js/index.js': ['js/map.js', 'js/emotion.js']
+}
+
+# 可选的生成文件（generate_icon.py生成的地图标记精灵图样式），不存在时从打包中略过
+OPTIONAL_SOURCES = {'css/emotion-sprite.css'}
+
+
+def cdn_attrs(url):
+    """CDN地址的script/link标签属性：有SRI摘要时校验完整性，跨域请求不带凭据"""
+    if url not in CDN_INTEGRITY:
+        return Markup('')
+    integrity = CDN_INTEGRITY[url]
+    attrs = f' integrity="{escape(integrity)}"' if integrity else ''
+    return Markup(attrs + ' crossorigin="anonymous"')
+
+
+class AssetManifest:
+    """构建清单：源文件逻辑路径 -> static/dist下的构建文件"""
+
+    def __init__(self, app=None):
+        self.files = {}
+        self.static_folder = None
+        self._send_static_file = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """加载清单，改写static的URL生成和文件发送"""
+        self.static_folder = app.static_folder
+        manifest_path = os.path.join(self.static_folder, DIST_DIR, MANIFEST_NAME)
+        if Config.ASSET_MANIFEST_ENABLED and os.path.exists(manifest_path):
+            with open(manifest_path, encoding='utf-8') as f:
+                self.files = json.load(f)
+
+        self._send_static_file = app.view_functions['static']
+        app.view_functions['static'] = self.send_static
+        app.url_defaults(self.rewrite_static_url)
+        app.add_template_global(self.asset_urls)
+        app.add_template_global(cdn_attrs)
+
+    def rewrite_static_url(self, endpoint, values):
+        """url_for('static', filename=源文件)指向构建后的文件"""
+        if endpoint == 'static' and values.get('filename') in self.files:
+            values['filename'] = self.files[values['filename']]
+
+    def asset_urls(self, name):
+        """模板中引用打包资源：已构建时为打包文件，否则依次返回各源文件（未下载的第三方库使用CDN地址）"""
+        if name in self.files:
+            return [url_for('static', filename=name)]
+        urls = []
+        for source in BUNDLES.get(name, [name]):
+            if source in OPTIONAL_SOURCES and not os.path.exists(os.path.join(self.static_folder, source)):
+                continue
+            if source in VENDOR_FILES and not os.path.exists(os.path.join(self.static_folder, source)):
+                urls.append(VENDOR_FILES[source][0])
+            else:
+                urls.append(url_for('static', filename=source))
+        return urls
+
+    def send_static(self, filename):
+        """发送静态文件；构建文件按Accept-Encoding优先发送预压缩版本，并允许永久缓存"""
+        if not filename.startswith(DIST_DIR + '/'):
+            return self._send_static_file(filename=filename)
+
+        mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        for encoding, suffix in (('br', '.br'), ('gzip', '.gz')):
+            path = safe_join(self.static_folder, filename + suffix)
+            if request.accept_encodings[encoding] and path and os.path.isfile(path):
+                response = send_from_directory(self.static_folder, filename + suffix, mimetype=mimetype, max_age=31536000)
+                response.headers['Content-Encoding'] = encoding
+                break
+        else:
+            response = send_from_directory(self.static_folder, filename, max_age=31536000)
+
+        response.cache_control.immutable = True
+        response.vary.add('Accept-Encoding')
+        return response
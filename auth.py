@@ -1,34 +1,151 @@
 # GitHub OAuth认证系统
+import threading
+import hashlib
+import base64
+from concurrent.futures import ThreadPoolExecutor
+import jwt
 import requests
-import secrets
-from flask import session, request, redirect, url_for, jsonify
-from datetime import datetime, timedelta
+from requests.adapters import HTTPAdapter
+from flask import session, request, redirect, url_for, jsonify, g
+from datetime import datetime, timedelta, timezone
 from config import Config
-from supabase import create_client, Client
+from db import supabase
+from cache import TTLCache
+from jobs import job_runner
+
+# 会话令牌签名算法
+SESSION_TOKEN_ALGORITHM = 'HS256'
+
+# 并行请求GitHub API的线程池
+github_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix='github-api')
+
+# 加密写入任务队列的访问令牌（首次使用时创建）
+_token_cipher = None
+
+def token_cipher():
+    """由SECRET_KEY派生密钥的Fernet实例（cryptography在首次使用时才导入）"""
+    global _token_cipher
+    if _token_cipher is None:
+        from cryptography.fernet import Fernet
+        key = hashlib.sha256(b'github-access-token:' + Config.SECRET_KEY.encode()).digest()
+        _token_cipher = Fernet(base64.urlsafe_b64encode(key))
+    return _token_cipher
+
+def seal_access_token(access_token):
+    """加密访问令牌，后台任务队列（SQLite）中不保存明文"""
+    return token_cipher().encrypt(access_token.encode()).decode()
+
+def open_access_token(sealed):
+    """解密访问令牌，超过有效期或密钥已更换时抛出cryptography.fernet.InvalidToken"""
+    return token_cipher().decrypt(sealed.encode(), ttl=Config.GITHUB_TOKEN_SEAL_TTL).decode()
+
+def is_transient_github_error(error):
+    """GitHub请求失败是否值得重试：超时、连接失败、5xx和限流可以重试，
+    其他4xx（令牌失效、权限不足、资源不存在）重试也不会成功"""
+    if isinstance(error, (requests.Timeout, requests.ConnectionError)):
+        return True
+    response = getattr(error, 'response', None)
+    if response is None:
+        return False
+    if response.status_code >= 500 or response.status_code == 429:
+        return True
+    # 403既可能是限流也可能是权限不足，限流时剩余配额为0或带Retry-After
+    return response.status_code == 403 and (
+        response.headers.get('X-RateLimit-Remaining') == '0' or 'Retry-After' in response.headers
+    )
+
+def issue_session_token(user, auth_time=None):
+    """签发包含用户基本信息的会话令牌"""
+    now = datetime.now(timezone.utc)
+    claims = {
+        'sub': user['id'],
+        'username': user['username'],
+        'display_name': user.get('display_name') or user['username'],
+        'avatar_url': user.get('avatar_url') or '',
+        'email': user.get('email') or '',
+        'github_url': user.get('github_url') or '',
+        'created_at': user.get('created_at'),
+        # 首次登录时间，决定令牌最多能续期到什么时候
+        'auth_time': int(auth_time if auth_time is not None else now.timestamp()),
+        'iat': now,
+        'exp': now + timedelta(seconds=Config.SESSION_TOKEN_TTL)
+    }
+    return jwt.encode(claims, Config.SECRET_KEY, algorithm=SESSION_TOKEN_ALGORITHM)
+
+def decode_session_token(token, verify_exp=True):
+    """校验并解析会话令牌，签名无效（或verify_exp时已过期）返回None"""
+    try:
+        return jwt.decode(
+            token,
+            Config.SECRET_KEY,
+            algorithms=[SESSION_TOKEN_ALGORITHM],
+            options={'verify_exp': verify_exp}
+        )
+    except jwt.InvalidTokenError:
+        return None
+
+def claims_to_user(claims):
+    """令牌内容转换为标准化的用户数据"""
+    return {
+        'id': claims['sub'],
+        'username': claims['username'],
+        'display_name': claims['display_name'],
+        'email': claims.get('email', ''),
+        'avatar_url': claims.get('avatar_url', ''),
+        'github_url': claims.get('github_url', ''),
+        'created_at': claims.get('created_at'),
+        'last_login': datetime.fromtimestamp(claims['auth_time'], timezone.utc).isoformat()
+    }
 
 class GitHubAuth:
     def __init__(self, app=None):
         self.app = app
         self.supabase = None
+        # 后台刷新得到的最新用户资料：用户ID -> 用户数据（用户已不存在时为False）
+        self._refreshed_profiles = TTLCache(ttl=Config.SESSION_TOKEN_TTL)
+        self._refreshing = set()
+        self._refresh_lock = threading.Lock()
+        # GitHub API连接池（首次请求时创建，保持连接复用）和按令牌哈希缓存的ETag响应
+        self._github_session = None
+        self._github_session_lock = threading.Lock()
+        self._github_etags = TTLCache(ttl=Config.GITHUB_ETAG_CACHE_TTL, max_size=4096)
         if app is not None:
             self.init_app(app)
     
     def init_app(self, app):
         """初始化认证系统"""
         self.app = app
-        self.supabase = create_client(
-            Config.SUPABASE_URL,
-            Config.SUPABASE_SERVICE_ROLE_KEY
-        )
+        self.supabase = supabase
         
         # 注册路由
         app.add_url_rule('/login/github', 'auth_login', self.login)
         app.add_url_rule('/login/github/authorized', 'auth_callback', self.callback)
         app.add_url_rule('/logout', 'auth_logout', self.logout, methods=['POST'])
         app.add_url_rule('/api/user/profile', 'user_profile', self.get_user_profile)
+        
+        # 每个请求开始时从签名令牌解析当前用户
+        app.permanent_session_lifetime = timedelta(days=Config.SESSION_LIFETIME_DAYS)
+        app.before_request(self.load_session_user)
+        
+        # 后台任务：登录后补全GitHub资料
+        job_runner.register('sync_github_profile', self.sync_github_profile)
+    
+    @property
+    def github_session(self):
+        """GitHub API连接池（首次请求GitHub时创建）"""
+        if self._github_session is None:
+            with self._github_session_lock:
+                if self._github_session is None:
+                    github_session = requests.Session()
+                    github_session.mount('https://', HTTPAdapter(pool_connections=4, pool_maxsize=16))
+                    github_session.mount('http://', HTTPAdapter(pool_connections=4, pool_maxsize=16))
+                    self._github_session = github_session
+        return self._github_session
     
     def generate_state(self):
         """生成随机状态码用于防止CSRF攻击"""
+        import secrets
+        
         state = secrets.token_urlsafe(32)
         session['oauth_state'] = state
         return state
@@ -39,7 +156,7 @@ class GitHubAuth:
         
         # GitHub OAuth授权URL
         github_auth_url = (
-            f"https://github.com/login/oauth/authorize?"
+            f"{Config.GITHUB_OAUTH_URL.rstrip('/')}/login/oauth/authorize?"
             f"client_id={Config.GITHUB_CLIENT_ID}&"
             f"redirect_uri={Config.GITHUB_REDIRECT_URI}&"
             f"scope=user:email&"
@@ -91,11 +208,12 @@ class GitHubAuth:
                     'details': '请检查GitHub OAuth应用配置，特别是Client Secret是否正确设置'
                 }), 400
             
-            # 获取用户信息
+            # 并行获取用户基本信息和邮箱（邮箱获取失败时由后台任务补全）
             print("正在获取用户信息...")
-            user_info = self.get_github_user_info(access_token)
-            if not user_info:
-                print("用户信息获取失败")
+            try:
+                user_info = self.get_github_user_info(access_token, require_email=False)
+            except requests.RequestException as e:
+                print(f"用户信息获取失败: {e}")
                 return jsonify({'error': '获取用户信息失败'}), 400
             
             print(f"获取到用户信息: {user_info.get('username')}")
@@ -113,6 +231,13 @@ class GitHubAuth:
             self.set_user_session(user)
             print("用户会话设置成功")
             
+            # 邮箱获取暂时失败时的重试在后台完成，不占用请求线程（任务参数中的令牌已加密）
+            if user_info.get('email_pending'):
+                job_runner.enqueue('sync_github_profile', {
+                    'user_id': user['id'],
+                    'sealed_token': seal_access_token(access_token)
+                })
+            
             # 重定向到首页
             return redirect('/')
             
@@ -127,7 +252,7 @@ class GitHubAuth:
     
     def exchange_code_for_token(self, code):
         """交换授权码获取访问令牌"""
-        token_url = 'https://github.com/login/oauth/access_token'
+        token_url = f"{Config.GITHUB_OAUTH_URL.rstrip('/')}/login/oauth/access_token"
         
         # 检查必要的配置
         if not Config.GITHUB_CLIENT_ID or Config.GITHUB_CLIENT_ID == 'your-github-client-id':
@@ -154,7 +279,7 @@ class GitHubAuth:
         print(f"正在请求访问令牌，Client ID: {Config.GITHUB_CLIENT_ID[:8]}...")
         
         try:
-            response = requests.post(token_url, data=data, headers=headers, timeout=10)
+            response = requests.post(token_url, data=data, headers=headers, timeout=Config.GITHUB_API_TIMEOUT)
             print(f"GitHub API响应状态码: {response.status_code}")
             
             if response.status_code != 200:
@@ -180,169 +305,139 @@ class GitHubAuth:
             print(f"获取访问令牌失败: {e}")
             return None
     
-    def get_github_user_info(self, access_token):
-        """获取GitHub用户信息（带重试机制）"""
-        import time
-        
-        user_url = 'https://api.github.com/user'
-        email_url = 'https://api.github.com/user/emails'
-        
+    def github_get(self, access_token, path):
+        """通过连接池请求GitHub API；同一令牌再次请求时带上ETag，304时直接使用缓存的响应"""
+        cache_key = (hashlib.sha256(access_token.encode()).hexdigest(), path)
+        cached = self._github_etags.get(cache_key)
         headers = {
             'Authorization': f'Bearer {access_token}',
             'Accept': 'application/vnd.github.v3+json',
-            'User-Agent': 'EmotionShare-App',
-            'Connection': 'close'  # 避免连接复用问题
+            'User-Agent': 'EmotionShare-App'
         }
+        if cached:
+            headers['If-None-Match'] = cached[0]
         
-        # 重试配置
-        max_retries = 3
-        retry_delay = 1  # 秒
+        response = self.github_session.get(
+            f"{Config.GITHUB_API_URL.rstrip('/')}{path}",
+            headers=headers,
+            timeout=Config.GITHUB_API_TIMEOUT
+        )
+        if response.status_code == 304 and cached:
+            return cached[1]
+        response.raise_for_status()
+        data = response.json()
         
-        for attempt in range(max_retries):
-            try:
-                print(f"尝试获取GitHub用户信息 (第{attempt + 1}次)...")
-                
-                # 获取用户基本信息
-                print("正在获取用户基本信息...")
-                user_response = requests.get(
-                    user_url, 
-                    headers=headers, 
-                    timeout=15,
-                    verify=True
-                )
-                user_response.raise_for_status()
-                user_data = user_response.json()
-                print(f"成功获取用户基本信息: {user_data.get('login')}")
-                
-                # 获取用户邮箱
-                print("正在获取用户邮箱信息...")
-                email_response = requests.get(
-                    email_url, 
-                    headers=headers, 
-                    timeout=15,
-                    verify=True
-                )
-                email_response.raise_for_status()
-                email_data = email_response.json()
-                print(f"成功获取邮箱信息，共{len(email_data)}个邮箱")
-                
-                # 找到主邮箱
-                primary_email = None
-                for email_info in email_data:
-                    if email_info.get('primary', False):
-                        primary_email = email_info.get('email')
-                        break
-                
-                if not primary_email and email_data:
-                    primary_email = email_data[0].get('email')
-                
-                user_info = {
-                    'github_id': user_data.get('id'),
-                    'username': user_data.get('login'),
-                    'display_name': user_data.get('name') or user_data.get('login'),
-                    'email': primary_email,
-                    'avatar_url': user_data.get('avatar_url'),
-                    'github_url': user_data.get('html_url')
-                }
-                
-                print(f"成功获取完整用户信息: {user_info['username']}")
-                return user_info
-                
-            except requests.exceptions.ConnectionError as e:
-                print(f"连接错误 (第{attempt + 1}次尝试): {e}")
-                if attempt < max_retries - 1:
-                    print(f"等待{retry_delay}秒后重试...")
-                    time.sleep(retry_delay)
-                    retry_delay *= 2  # 指数退避
-                else:
-                    print("所有重试都失败了")
-                    return None
-                    
-            except requests.exceptions.Timeout as e:
-                print(f"请求超时 (第{attempt + 1}次尝试): {e}")
-                if attempt < max_retries - 1:
-                    print(f"等待{retry_delay}秒后重试...")
-                    time.sleep(retry_delay)
-                    retry_delay *= 2
-                else:
-                    print("所有重试都失败了")
-                    return None
-                    
-            except requests.exceptions.HTTPError as e:
-                print(f"HTTP错误: {e}")
-                print(f"响应状态码: {e.response.status_code}")
-                print(f"响应内容: {e.response.text}")
-                return None
-                
-            except requests.RequestException as e:
-                print(f"请求异常 (第{attempt + 1}次尝试): {e}")
-                if attempt < max_retries - 1:
-                    print(f"等待{retry_delay}秒后重试...")
-                    time.sleep(retry_delay)
-                    retry_delay *= 2
-                else:
-                    print("所有重试都失败了")
-                    return None
-                    
-            except Exception as e:
-                print(f"未知错误: {e}")
-                import traceback
-                traceback.print_exc()
-                return None
+        etag = response.headers.get('ETag')
+        if etag:
+            self._github_etags.set(cache_key, (etag, data))
+        return data
+    
+    def fetch_github_user(self, access_token):
+        """获取GitHub用户基本信息（单次请求，失败时抛出requests异常）"""
+        user_data = self.github_get(access_token, '/user')
+        print(f"成功获取用户基本信息: {user_data.get('login')}")
         
-        return None
+        return {
+            'github_id': user_data.get('id'),
+            'username': user_data.get('login'),
+            'display_name': user_data.get('name') or user_data.get('login'),
+            'avatar_url': user_data.get('avatar_url'),
+            'github_url': user_data.get('html_url')
+        }
+    
+    def fetch_github_primary_email(self, access_token):
+        """获取GitHub主邮箱（单次请求，失败时抛出requests异常）"""
+        email_data = self.github_get(access_token, '/user/emails')
+        
+        # 找到主邮箱
+        for email_info in email_data:
+            if email_info.get('primary', False):
+                return email_info.get('email')
+        
+        return email_data[0].get('email') if email_data else None
+    
+    def get_github_user_info(self, access_token, require_email=True):
+        """并行获取GitHub用户信息和主邮箱
+        基本信息失败时抛出异常；require_email为False时邮箱获取失败只记录日志，email为None，
+        失败是暂时性的（值得在后台重试）时email_pending为True"""
+        email_future = github_executor.submit(self.fetch_github_primary_email, access_token)
+        user_info = self.fetch_github_user(access_token)
+        try:
+            user_info['email'] = email_future.result()
+        except requests.RequestException as e:
+            if require_email:
+                raise
+            user_info['email'] = None
+            user_info['email_pending'] = is_transient_github_error(e)
+            if user_info['email_pending']:
+                print(f"获取用户邮箱失败，将在后台重试: {e}")
+            else:
+                print(f"获取用户邮箱失败: {e}")
+        return user_info
+    
+    def sync_github_profile(self, payload):
+        """后台任务：补全GitHub资料并更新用户，结果由该用户的下一个请求用于续签会话令牌
+        只有暂时性的失败才抛出异常由任务队列重试"""
+        from cryptography.fernet import InvalidToken
+        
+        try:
+            access_token = open_access_token(payload['sealed_token'])
+        except (KeyError, InvalidToken):
+            print("补全GitHub资料失败: 访问令牌无效或已过期，不再重试")
+            return
+        
+        try:
+            user_info = self.get_github_user_info(access_token)
+        except requests.RequestException as e:
+            if is_transient_github_error(e):
+                raise
+            print(f"补全GitHub资料失败，不再重试: {e}")
+            return
+        user = self.create_or_update_user(user_info, access_token)
+        if not user:
+            raise RuntimeError('更新用户资料失败')
+        
+        self._refreshed_profiles.set(user['id'], {
+            'username': user['username'],
+            'display_name': user['display_name'],
+            'email': user['email'],
+            'avatar_url': user['avatar_url'],
+            'github_url': user['github_url']
+        })
     
     def create_or_update_user(self, user_info, access_token):
-        """创建或更新用户"""
+        """创建或更新用户（按github_username一次upsert）"""
         try:
             github_username = user_info['username']
-            
-            # 检查用户是否已存在（根据github_username）
-            existing_user = self.supabase.table('users').select('*').eq('github_username', github_username).execute()
+            display_name = user_info.get('display_name') or github_username
             
             # 准备用户数据（匹配数据库字段）
             user_data = {
                 'github_username': github_username,
-                'bio': user_info.get('display_name', ''),  # 使用bio字段存储显示名称
+                'username': github_username,
+                'display_name': display_name,
+                'bio': display_name,  # bio字段沿用为显示名称
                 'updated_at': datetime.utcnow().isoformat()
             }
+            if user_info.get('avatar_url'):
+                user_data['avatar_url'] = user_info['avatar_url']
             
-            if existing_user.data:
-                # 更新现有用户
-                user_id = existing_user.data[0]['user_id']
-                result = self.supabase.table('users').update(user_data).eq('user_id', user_id).execute()
-                if result.data:
-                    # 返回标准化的用户数据
-                    user = result.data[0]
-                    return {
-                        'id': user['user_id'],
-                        'username': user['github_username'],
-                        'display_name': user.get('bio', user['github_username']),
-                        'email': user_info.get('email'),
-                        'avatar_url': user_info.get('avatar_url'),
-                        'github_url': user_info.get('github_url'),
-                        'created_at': user.get('created_at'),
-                        'updated_at': user.get('updated_at')
-                    }
-                return None
-            else:
-                # 创建新用户
-                user_data['created_at'] = datetime.utcnow().isoformat()
-                result = self.supabase.table('users').insert(user_data).execute()
-                if result.data:
-                    # 返回标准化的用户数据
-                    user = result.data[0]
-                    return {
-                        'id': user['user_id'],
-                        'username': user['github_username'],
-                        'display_name': user.get('bio', user['github_username']),
-                        'email': user_info.get('email'),
-                        'avatar_url': user_info.get('avatar_url'),
-                        'github_url': user_info.get('github_url'),
-                        'created_at': user.get('created_at'),
-                        'updated_at': user.get('updated_at')
-                    }
+            result = self.supabase.table('users').upsert(user_data, on_conflict='github_username').execute()
+            if not result.data:
                 return None
+            
+            # 返回标准化的用户数据
+            user = result.data[0]
+            return {
+                'id': user['user_id'],
+                'username': user['github_username'],
+                'display_name': user.get('display_name') or user.get('bio') or user['github_username'],
+                'email': user_info.get('email'),
+                'avatar_url': user.get('avatar_url') or user_info.get('avatar_url'),
+                'github_url': user_info.get('github_url'),
+                'created_at': user.get('created_at'),
+                'updated_at': user.get('updated_at')
+            }
                 
         except Exception as e:
             print(f"创建或更新用户失败: {e}")
@@ -350,17 +445,90 @@ class GitHubAuth:
             traceback.print_exc()
             return None
     
-    def set_user_session(self, user):
-        """设置用户会话"""
-        session['user_id'] = user['id']
-        session['username'] = user['username']
-        session['display_name'] = user['display_name']
-        session['avatar_url'] = user['avatar_url']
-        session['is_authenticated'] = True
+    def set_user_session(self, user, auth_time=None):
+        """设置用户会话（签名令牌保存用户基本信息，后续请求无需查询数据库）"""
+        session.pop('oauth_state', None)
+        session['auth_token'] = issue_session_token(user, auth_time)
+        g.current_user = claims_to_user(decode_session_token(session['auth_token'], verify_exp=False))
         
         # 设置会话过期时间（7天）
         session.permanent = True
-        session.permanent_session_lifetime = timedelta(days=7)
+    
+    def load_session_user(self):
+        """解析会话令牌写入g.current_user；临近过期时后台刷新资料，已过期时在会话有效期内同步续期"""
+        g.current_user = None
+        # 静态文件不读取会话，响应不带Vary: Cookie和Set-Cookie，可被浏览器和CDN缓存
+        if request.endpoint == 'static':
+            return
+        
+        token = session.get('auth_token')
+        if not token:
+            return
+        
+        claims = decode_session_token(token, verify_exp=False)
+        if not claims:
+            session.clear()
+            return
+        
+        now = datetime.now(timezone.utc).timestamp()
+        user_id = claims['sub']
+        
+        # 超过会话最长有效期需要重新登录
+        if now - claims['auth_time'] > Config.SESSION_LIFETIME_DAYS * 86400:
+            session.clear()
+            return
+        
+        # 后台刷新已完成：用最新资料续签
+        refreshed = self._refreshed_profiles.get(user_id)
+        if refreshed is False:
+            session.clear()
+            return
+        if refreshed is not None:
+            self._refreshed_profiles.delete(user_id)
+            self.set_user_session(dict(claims_to_user(claims), **refreshed), claims['auth_time'])
+            return
+        
+        remaining = claims['exp'] - now
+        if remaining > 0:
+            g.current_user = claims_to_user(claims)
+            if remaining < Config.SESSION_TOKEN_REFRESH_BEFORE:
+                self.refresh_profile_async(user_id)
+            return
+        
+        # 长时间未访问导致令牌过期：同步查询一次数据库确认用户仍然存在
+        profile = self.fetch_profile(user_id)
+        if not profile:
+            session.clear()
+            return
+        self.set_user_session(dict(claims_to_user(claims), **profile), claims['auth_time'])
+    
+    def fetch_profile(self, user_id):
+        """读取数据库中可变的用户资料，用于续签令牌"""
+        user = self.get_user_by_id(user_id)
+        if not user:
+            return None
+        return {
+            'username': user['username'],
+            'display_name': user['display_name'],
+            'created_at': user['created_at']
+        }
+    
+    def refresh_profile_async(self, user_id):
+        """在后台线程中刷新用户资料，结果由该用户的下一个请求用于续签令牌"""
+        with self._refresh_lock:
+            if user_id in self._refreshing:
+                return
+            self._refreshing.add(user_id)
+        
+        def refresh():
+            try:
+                profile = self.fetch_profile(user_id)
+                self._refreshed_profiles.set(user_id, profile or False)
+            finally:
+                with self._refresh_lock:
+                    self._refreshing.discard(user_id)
+        
+        threading.Thread(target=refresh, daemon=True).start()
     
     def logout(self):
         """用户登出"""
@@ -369,33 +537,8 @@ class GitHubAuth:
         return redirect('/?logout=success')
     
     def get_current_user(self):
-        """获取当前登录用户"""
-        if not session.get('is_authenticated'):
-            return None
-        
-        user_id = session.get('user_id')
-        if not user_id:
-            return None
-        
-        try:
-            result = self.supabase.table('users').select('*').eq('user_id', user_id).execute()
-            if result.data:
-                user = result.data[0]
-                # 返回标准化的用户数据
-                return {
-                    'id': user['user_id'],
-                    'username': user['github_username'],
-                    'display_name': user.get('bio', user['github_username']),
-                    'email': session.get('email', ''),
-                    'avatar_url': session.get('avatar_url', ''),
-                    'github_url': session.get('github_url', ''),
-                    'created_at': user.get('created_at'),
-                    'updated_at': user.get('updated_at')
-                }
-            return None
-        except Exception as e:
-            print(f"获取当前用户失败: {e}")
-            return None
+        """获取当前登录用户（来自签名令牌，不查询数据库）"""
+        return g.get('current_user')
     
     def get_user_profile(self):
         """获取用户资料API"""
@@ -412,7 +555,7 @@ class GitHubAuth:
             'avatar_url': user['avatar_url'],
             'github_url': user['github_url'],
             'created_at': user['created_at'],
-            'last_login': user['last_login']
+            'last_login': user.get('last_login')
         }
         
         return jsonify({'user': safe_user})
@@ -420,7 +563,7 @@ class GitHubAuth:
     def require_auth(self, f):
         """装饰器：要求用户登录"""
         def decorated_function(*args, **kwargs):
-            if not session.get('is_authenticated'):
+            if not g.get('current_user'):
                 # 检查是否是API请求（通过请求路径或Accept头判断）
                 if request.path.startswith('/api/') or request.headers.get('Accept', '').startswith('application/json'):
                     return jsonify({'error': '需要登录'}), 401
@@ -547,12 +690,14 @@ class GitHubAuth:
     
     def is_user_authenticated(self):
         """检查用户是否已认证"""
-        return session.get('is_authenticated', False)
+        return g.get('current_user') is not None
     
     def get_session_user_id(self):
         """获取会话中的用户ID"""
-        return session.get('user_id')
+        user = g.get('current_user')
+        return user['id'] if user else None
     
     def get_session_username(self):
         """获取会话中的用户名"""
-        return session.get('username')
\ No newline at end of file
+        user = g.get('current_user')
+        return user['username'] if user else None
\ No newline at end of file
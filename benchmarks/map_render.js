@@ -0,0 +1,245 @@
+#!/usr/bin/env node
+/**
+ * 地图标记渲染基准测试（不需要浏览器）
+ *
+ * 在jsdom中加载Leaflet、markercluster和static/js/map.js，对比两种渲染方式的可交互时间：
+ *   - 逐个渲染：主线程解析JSON，每个情绪创建独立的divIcon并逐个addLayer（优化前的做法）
+ *   - 分块渲染：Worker解析（用worker_threads运行static/js/map-worker.js）、共享图标、分帧addLayers
+ *
+ * 依赖不随项目安装，运行前在benchmarks目录下安装：
+ *   cd benchmarks && npm install --no-save jsdom leaflet@1.9.4 leaflet.markercluster@1.4.1
+ *   node benchmarks/map_render.js 10000 50000
+ *
+ * 可交互时间为主线程最后一个长任务（>50ms）结束的时刻，没有长任务时为0；
+ * 分块渲染在可交互之后仍会继续添加标记，直到渲染完成。
+ *
+ * jsdom没有布局和绘制，结果只反映脚本执行时间，不代表浏览器中的帧耗时；
+ * 输出开头打印实际加载的Leaflet和markercluster版本，用于确认不是替身模块。
+ */
+
+const fs = require('fs');
+const path = require('path');
+const vm = require('vm');
+const { Worker } = require('worker_threads');
+const { performance } = require('perf_hooks');
+const { JSDOM } = require('jsdom');
+
+const ROOT = path.resolve(__dirname, '..');
+const LONG_TASK_MS = 50;
+const EMOTION_TYPES = ['happy', 'sad', 'angry', 'excited', 'calm', 'anxious', 'grateful', 'lonely', 'custom'];
+
+const sources = {
+    leaflet: fs.readFileSync(require.resolve('leaflet/dist/leaflet-src.js'), 'utf8'),
+    markercluster: fs.readFileSync(require.resolve('leaflet.markercluster/dist/leaflet.markercluster-src.js'), 'utf8'),
+    emotionTypes: fs.readFileSync(path.join(ROOT, 'static/js/emotion-types.js'), 'utf8'),
+    map: fs.readFileSync(path.join(ROOT, 'static/js/map.js'), 'utf8'),
+    worker: fs.readFileSync(path.join(ROOT, 'static/js/map-worker.js'), 'utf8')
+};
+
+// 生成/api/emotions响应：点分布在中国范围内
+function buildPayload(count) {
+    const emotions = [];
+    for (let i = 0; i < count; i++) {
+        const emotionType = EMOTION_TYPES[i % EMOTION_TYPES.length];
+        emotions.push({
+            id: i + 1,
+            user_id: `user-${i % 500}`,
+            emotion_type: emotionType,
+            content: `benchmark emotion ${i}`,
+            custom_emoji: emotionType === 'custom' ? '🎈' : null,
+            intensity: 1 + (i % 10),
+            latitude: 18 + Math.random() * 35,
+            longitude: 73 + Math.random() * 62,
+            place_name: null,
+            privacy_setting: 'public',
+            created_at: new Date(Date.now() - i * 60000).toISOString(),
+            updated_at: new Date(Date.now() - i * 60000).toISOString(),
+            user: { username: 'bench', display_name: 'bench', avatar_url: '' }
+        });
+    }
+    return JSON.stringify({ emotions: emotions, page: 1, limit: count });
+}
+
+// /api/emotion-types响应（只需包含基准数据用到的类型）
+const TYPES_PAYLOAD = JSON.stringify({
+    types: EMOTION_TYPES.map((code, index) => ({ id: index + 1, code: code, name: code, emoji: '🙂', color: '#9370DB' }))
+});
+
+// worker_threads中模拟浏览器Worker环境运行map-worker.js
+// Node会在一个任务里反序列化所有排队的消息，这里以字符串传递，主线程每条消息单独一个任务解析，与浏览器一致
+const WORKER_BOOTSTRAP = `
+const { parentPort, workerData } = require('worker_threads');
+const vm = require('vm');
+global.self = { postMessage: (message) => parentPort.postMessage(JSON.stringify(message)), onmessage: null };
+global.fetch = async () => ({ ok: true, status: 200, json: async () => JSON.parse(workerData.payload) });
+parentPort.on('message', (data) => self.onmessage({ data }));
+vm.runInThisContext(workerData.source);
+`;
+
+function createWindow(payload) {
+    const dom = new JSDOM('<!DOCTYPE html><div id="map" style="width: 1280px; height: 800px"></div>', {
+        url: 'http://localhost/',
+        runScripts: 'outside-only',
+        pretendToBeVisual: true
+    });
+    const { window } = dom;
+    window.fetch = async (url) => ({
+        ok: true,
+        status: 200,
+        json: async () => JSON.parse(String(url).includes('emotion-types') ? TYPES_PAYLOAD : payload)
+    });
+    window.Worker = class {
+        constructor() {
+            this.queue = [];
+            this.thread = new Worker(WORKER_BOOTSTRAP, { eval: true, workerData: { source: sources.worker, payload } });
+            this.thread.on('message', (raw) => {
+                this.queue.push(raw);
+                if (this.queue.length === 1) {
+                    setTimeout(() => this.deliver(), 0);
+                }
+            });
+            this.thread.on('error', (error) => this.onerror && this.onerror(error));
+        }
+        // 每个任务只派发一条消息
+        deliver() {
+            const raw = this.queue.shift();
+            if (this.onmessage) {
+                this.onmessage({ data: JSON.parse(raw) });
+            }
+            if (this.queue.length) {
+                setTimeout(() => this.deliver(), 0);
+            }
+        }
+        postMessage(message) {
+            this.thread.postMessage(message);
+        }
+        terminate() {
+            this.thread.terminate();
+        }
+    };
+    // 与页面中的多个script标签一样按脚本执行，顶层的class/const在脚本之间共享（window.eval的声明只在本次eval内可见）
+    const context = dom.getInternalVMContext();
+    for (const source of [sources.leaflet, sources.markercluster, sources.emotionTypes, sources.map]) {
+        new vm.Script(source).runInContext(context);
+    }
+    return window;
+}
+
+// 主线程心跳：相邻两次回调的间隔即为期间被阻塞的时长
+function startLongTaskProbe() {
+    const probe = { longest: 0, lastLongTaskEnd: 0, stopped: false };
+    let last = performance.now();
+    const tick = () => {
+        const now = performance.now();
+        const blocked = now - last;
+        probe.longest = Math.max(probe.longest, blocked);
+        if (blocked > LONG_TASK_MS) {
+            probe.lastLongTaskEnd = now;
+        }
+        last = now;
+        if (!probe.stopped) {
+            setTimeout(tick, 0);
+        }
+    };
+    setTimeout(tick, 0);
+    return probe;
+}
+
+// 让心跳再执行一次以记录最后一段阻塞，然后停止
+async function stopProbe(probe) {
+    await new Promise((resolve) => setTimeout(resolve, 5));
+    probe.stopped = true;
+}
+
+function waitFor(condition, interval = 20) {
+    return new Promise((resolve) => {
+        const check = () => (condition() ? resolve() : setTimeout(check, interval));
+        check();
+    });
+}
+
+// 优化前的做法：主线程解析，每个标记一个新divIcon，逐个addLayer
+async function renderLegacy(window, payload, count) {
+    const probe = startLongTaskProbe();
+    const started = performance.now();
+    const L = window.L;
+    const map = L.map(window.document.getElementById('map'), { center: [35, 105], zoom: 4 });
+    const cluster = L.markerClusterGroup({ chunkedLoading: true, maxClusterRadius: 80 });
+    map.addLayer(cluster);
+
+    await new Promise((resolve) => setTimeout(resolve, 0));
+    const data = JSON.parse(payload);
+    data.emotions.forEach((emotion) => {
+        const icon = L.divIcon({
+            html: `<div style="width: 32px; height: 32px; border-radius: 50%;">${emotion.emotion_type}</div>`,
+            className: 'emotion-marker',
+            iconSize: [32, 32],
+            iconAnchor: [16, 16]
+        });
+        cluster.addLayer(L.marker([emotion.latitude, emotion.longitude], { icon: icon }));
+    });
+    await waitFor(() => cluster.getLayers().length >= count);
+    const rendered = performance.now() - started;
+    await stopProbe(probe);
+    map.remove();
+    return summarize(started, rendered, probe);
+}
+
+// 当前做法：EmotionMap的Worker解析 + 共享图标 + 分帧addLayers
+async function renderPipeline(window, payload, count) {
+    const probe = startLongTaskProbe();
+    const started = performance.now();
+    const EmotionMap = window.eval('EmotionMap');
+    EmotionMap.MAX_MARKERS = count;
+    const emotionMap = new EmotionMap('map');
+    if (emotionMap.renderPass) {
+        await emotionMap.renderPass.promise;
+    }
+    await waitFor(() => emotionMap.markerCluster.getLayers().length >= count);
+    const rendered = performance.now() - started;
+    await stopProbe(probe);
+    const icons = emotionMap.iconCache.size;
+    if (emotionMap.worker) {
+        emotionMap.worker.terminate();
+    }
+    emotionMap.destroy();
+    return Object.assign(summarize(started, rendered, probe), { icons: icons });
+}
+
+function summarize(started, rendered, probe) {
+    return {
+        rendered: rendered,
+        longest: probe.longest,
+        interactive: probe.lastLongTaskEnd ? probe.lastLongTaskEnd - started : 0
+    };
+}
+
+function packageVersion(name) {
+    return JSON.parse(fs.readFileSync(require.resolve(`${name}/package.json`), 'utf8')).version;
+}
+
+async function main() {
+    console.log(`leaflet ${packageVersion('leaflet')}, leaflet.markercluster ${packageVersion('leaflet.markercluster')}, jsdom ${packageVersion('jsdom')}\n`);
+    const counts = process.argv.slice(2).map(Number).filter(Boolean);
+    const sizes = counts.length ? counts : [10000, 50000];
+
+    console.log(`${'点数'.padEnd(8)}${'方式'.padEnd(10)}${'渲染完成(ms)'.padStart(14)}${'最长阻塞(ms)'.padStart(14)}${'可交互(ms)'.padStart(12)}${'图标数'.padStart(8)}`);
+    for (const count of sizes) {
+        const payload = buildPayload(count);
+        for (const [label, render] of [['逐个渲染', renderLegacy], ['分块渲染', renderPipeline]]) {
+            const window = createWindow(payload);
+            const result = await render(window, payload, count);
+            window.close();
+            console.log(
+                `${String(count).padEnd(10)}${label.padEnd(8)}` +
+                `${result.rendered.toFixed(0).padStart(14)}${result.longest.toFixed(0).padStart(14)}` +
+                `${result.interactive.toFixed(0).padStart(12)}${String(result.icons === undefined ? count : result.icons).padStart(8)}`
+            );
+        }
+    }
+}
+
+main().catch((error) => {
+    console.error(error);
+    process.exit(1);
+});
@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+对比普通emotions表和按月分区表在时间过滤查询、按ID查询、点赞/评论写入和归档上的耗时
+
+在独立的schema中生成多年的合成数据（不影响业务表），需要可写的PostgreSQL：
+    DATABASE_URL=postgresql://... python benchmarks/partitioning.py --years 3 --rows 3000000
+"""
+
+import argparse
+import os
+import random
+import statistics
+import time
+
+import psycopg2
+
+SCHEMA = 'bench_partitioning'
+
+# (名称, 查询起点)：与get_time_filter_start及地图时间过滤一致
+WINDOWS = [
+    ('1h', "NOW() - INTERVAL '1 hour'"),
+    ('6h', "NOW() - INTERVAL '6 hours'"),
+    ('24h', "NOW() - INTERVAL '24 hours'"),
+    ('7d', "NOW() - INTERVAL '7 days'"),
+    ('today', "date_trunc('day', NOW())"),
+    ('week', "date_trunc('week', NOW())"),
+    ('month', "date_trunc('month', NOW())"),
+]
+
+# /api/emotions公开列表和地图使用的查询形态
+FEED_QUERY = """
+    SELECT id, emotion_type, latitude, longitude, created_at
+    FROM {table}
+    WHERE is_deleted = false AND privacy_setting = 'public' AND created_at >= {since}
+    ORDER BY created_at DESC
+    LIMIT 1000
+"""
+
+COUNT_QUERY = """
+    SELECT emotion_type, COUNT(*)
+    FROM {table}
+    WHERE is_deleted = false AND created_at >= {since}
+    GROUP BY emotion_type
+"""
+
+# 按ID查询：分区表的主键为(id, created_at)，只按id查询需要探测每个分区的主键索引；
+# 经emotion_ids查到created_at后可在执行时裁剪到单个分区
+ID_QUERIES = [
+    ('普通表', 'SELECT * FROM emotions_plain WHERE id = {id}'),
+    ('分区表', 'SELECT * FROM emotions_monthly WHERE id = {id}'),
+    ('经ID表', """
+        SELECT * FROM emotions_monthly
+        WHERE id = {id} AND created_at = (SELECT created_at FROM emotion_ids WHERE id = {id})
+    """),
+]
+
+# 点赞/评论写入：外键分别指向普通表的主键和emotion_ids的主键
+INSERTS = [
+    ('点赞', "INSERT INTO likes_{suffix} (emotion_id, user_id) VALUES (%s, gen_random_uuid())"),
+    ('评论', "INSERT INTO comments_{suffix} (emotion_id, user_id, content) VALUES (%s, gen_random_uuid(), 'synthetic comment')"),
+]
+
+COLUMNS = """
+    id BIGINT NOT NULL,
+    user_id UUID,
+    emotion_type VARCHAR(50) NOT NULL,
+    content TEXT,
+    latitude DECIMAL(10, 8) NOT NULL,
+    longitude DECIMAL(11, 8) NOT NULL,
+    privacy_setting VARCHAR(20) DEFAULT 'public',
+    is_deleted BOOLEAN DEFAULT false,
+    created_at TIMESTAMP WITH TIME ZONE NOT NULL
+"""
+
+
+def setup(cursor, years, rows):
+    """生成合成数据：普通表和按月分区表内容相同，索引与迁移脚本一致"""
+    cursor.execute(f'DROP SCHEMA IF EXISTS {SCHEMA} CASCADE')
+    cursor.execute(f'CREATE SCHEMA {SCHEMA}')
+    cursor.execute(f'SET search_path = {SCHEMA}')
+
+    cursor.execute(f'CREATE TABLE emotions_plain ({COLUMNS}, PRIMARY KEY (id))')
+    cursor.execute(f'CREATE TABLE emotions_monthly ({COLUMNS}, PRIMARY KEY (id, created_at)) PARTITION BY RANGE (created_at)')
+    cursor.execute("""
+        SELECT month FROM generate_series(
+            date_trunc('month', NOW() - make_interval(years => %s)),
+            date_trunc('month', NOW()) + INTERVAL '1 month',
+            INTERVAL '1 month'
+        ) AS month
+    """, (years,))
+    for (month,) in cursor.fetchall():
+        cursor.execute(
+            f"CREATE TABLE emotions_p{month:%Y_%m} PARTITION OF emotions_monthly "
+            "FOR VALUES FROM (%s) TO (%s::TIMESTAMPTZ + INTERVAL '1 month')",
+            (month, month)
+        )
+    cursor.execute('CREATE TABLE emotions_monthly_default PARTITION OF emotions_monthly DEFAULT')
+
+    # 时间均匀分布在最近years年内，10%私密、3%已删除
+    cursor.execute("""
+        INSERT INTO emotions_plain
+        SELECT g,
+               NULL,
+               (ARRAY['happy', 'anxious', 'calm', 'sad', 'angry', 'custom'])[1 + g %% 6],
+               'synthetic emotion ' || g,
+               18 + random() * 35,
+               73 + random() * 62,
+               CASE WHEN g %% 10 = 0 THEN 'private' ELSE 'public' END,
+               g %% 33 = 0,
+               NOW() - random() * make_interval(years => %s)
+        FROM generate_series(1, %s) AS g
+    """, (years, rows))
+    cursor.execute('INSERT INTO emotions_monthly SELECT * FROM emotions_plain')
+
+    # 与迁移脚本一致：emotion_ids保证id唯一并作为子表外键的目标
+    cursor.execute('CREATE TABLE emotion_ids (id BIGINT PRIMARY KEY, created_at TIMESTAMP WITH TIME ZONE NOT NULL)')
+    cursor.execute('INSERT INTO emotion_ids SELECT id, created_at FROM emotions_plain')
+    for suffix, target in (('plain', 'emotions_plain'), ('monthly', 'emotion_ids')):
+        cursor.execute(f"""
+            CREATE TABLE likes_{suffix} (
+                id BIGSERIAL PRIMARY KEY,
+                emotion_id BIGINT NOT NULL REFERENCES {target}(id),
+                user_id UUID NOT NULL,
+                created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+                UNIQUE (emotion_id, user_id)
+            )
+        """)
+        cursor.execute(f"""
+            CREATE TABLE comments_{suffix} (
+                id BIGSERIAL PRIMARY KEY,
+                emotion_id BIGINT NOT NULL REFERENCES {target}(id),
+                user_id UUID NOT NULL,
+                content TEXT NOT NULL,
+                created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+            )
+        """)
+
+    for table in ('emotions_plain', 'emotions_monthly'):
+        cursor.execute(
+            f"CREATE INDEX ON {table}(created_at DESC) WHERE is_deleted = false AND privacy_setting = 'public'"
+        )
+        cursor.execute(f'CREATE INDEX ON {table}(created_at DESC)')
+        cursor.execute(f'ANALYZE {table}')
+    cursor.execute('ANALYZE emotion_ids')
+
+
+def measure(cursor, sql, repeat, include_planning=False):
+    """执行repeat次，返回(执行时间中位数ms, 扫描的分区/表数量)
+    include_planning为True时计入规划时间（点查询的规划开销随分区数增长，与执行时间相当）"""
+    timings = []
+    scanned = 0
+    for _ in range(repeat):
+        cursor.execute('EXPLAIN (ANALYZE, FORMAT JSON) ' + sql)
+        plan = cursor.fetchone()[0][0]
+        timings.append(plan['Execution Time'] + (plan['Planning Time'] if include_planning else 0))
+        scanned = count_scanned(plan['Plan'])
+    return statistics.median(timings), scanned
+
+
+def count_scanned(node):
+    """统计计划中实际执行过的表扫描节点（运行时裁剪掉的分区不计入）"""
+    count = 0
+    if 'Relation Name' in node and node.get('Actual Loops', 0) > 0:
+        count = 1
+    for child in node.get('Plans', []):
+        count += count_scanned(child)
+    return count
+
+
+def measure_inserts(cursor, sql, rows, count):
+    """逐行插入count条（每条一个事务，与API一致），返回每条的平均耗时ms"""
+    emotion_ids = [random.randint(1, rows) for _ in range(count)]
+    started = time.perf_counter()
+    for emotion_id in emotion_ids:
+        cursor.execute(sql, (emotion_id,))
+    return (time.perf_counter() - started) * 1000 / count
+
+
+def measure_archive(cursor):
+    """归档最早一个月：普通表批量DELETE vs 分区表DETACH + DROP
+    两者都先删除引用这些情绪的点赞和评论（迁移脚本的detach_emotion_partitions同样先移走子表数据）"""
+    cursor.execute('SELECT MIN(created_at) FROM emotions_plain')
+    oldest = cursor.fetchone()[0]
+    cursor.execute("SELECT date_trunc('month', %s::TIMESTAMPTZ)", (oldest,))
+    month = cursor.fetchone()[0]
+    partition = f'emotions_p{month:%Y_%m}'
+
+    started = time.perf_counter()
+    for child in ('likes_plain', 'comments_plain'):
+        cursor.execute(
+            f"DELETE FROM {child} c USING emotions_plain e WHERE c.emotion_id = e.id "
+            "AND e.created_at >= %s AND e.created_at < %s::TIMESTAMPTZ + INTERVAL '1 month'",
+            (month, month)
+        )
+    cursor.execute(
+        "DELETE FROM emotions_plain WHERE created_at >= %s AND created_at < %s::TIMESTAMPTZ + INTERVAL '1 month'",
+        (month, month)
+    )
+    deleted = cursor.rowcount
+    delete_ms = (time.perf_counter() - started) * 1000
+
+    started = time.perf_counter()
+    for child in ('likes_monthly', 'comments_monthly'):
+        cursor.execute(f'DELETE FROM {child} c USING {partition} e WHERE c.emotion_id = e.id')
+    cursor.execute(f'DELETE FROM emotion_ids i USING {partition} e WHERE i.id = e.id')
+    cursor.execute(f'ALTER TABLE emotions_monthly DETACH PARTITION {partition}')
+    cursor.execute(f'DROP TABLE {partition}')
+    detach_ms = (time.perf_counter() - started) * 1000
+    return deleted, delete_ms, detach_ms
+
+
+def main():
+    parser = argparse.ArgumentParser(description='emotions按月分区基准测试')
+    parser.add_argument('--dsn', default=os.environ.get('DATABASE_URL'), help='PostgreSQL连接串（默认读取DATABASE_URL）')
+    parser.add_argument('--years', type=int, default=3, help='合成数据覆盖的年数')
+    parser.add_argument('--rows', type=int, default=1000000, help='合成数据行数')
+    parser.add_argument('--repeat', type=int, default=5, help='每个查询重复次数')
+    parser.add_argument('--inserts', type=int, default=1000, help='点赞/评论写入的条数')
+    parser.add_argument('--keep', action='store_true', help='结束后保留测试schema')
+    args = parser.parse_args()
+    if not args.dsn:
+        parser.error('需要通过--dsn或DATABASE_URL指定数据库')
+
+    conn = psycopg2.connect(args.dsn)
+    conn.autocommit = True
+    cursor = conn.cursor()
+    try:
+        started = time.perf_counter()
+        setup(cursor, args.years, args.rows)
+        print(f"生成{args.rows}行{args.years}年的合成数据，用时{time.perf_counter() - started:.1f}s\n")
+
+        print(f"{'查询':<14}{'普通表(ms)':>12}{'分区表(ms)':>12}{'扫描分区':>10}")
+        for label, query in (('列表', FEED_QUERY), ('计数', COUNT_QUERY)):
+            for window, since in WINDOWS:
+                plain_ms, _ = measure(cursor, query.format(table='emotions_plain', since=since), args.repeat)
+                monthly_ms, scanned = measure(cursor, query.format(table='emotions_monthly', since=since), args.repeat)
+                print(f"{label + ' ' + window:<14}{plain_ms:>12.2f}{monthly_ms:>12.2f}{scanned:>10}")
+
+        print(f"\n{'按ID查询':<14}{'规划+执行(ms)':>12}{'扫描分区':>10}")
+        emotion_id = random.randint(1, args.rows)
+        for label, query in ID_QUERIES:
+            elapsed, scanned = measure(cursor, query.format(id=emotion_id), args.repeat, include_planning=True)
+            print(f"{label:<14}{elapsed:>12.3f}{scanned:>10}")
+
+        print(f"\n{'写入（每条）':<14}{'普通表(ms)':>12}{'分区表(ms)':>12}")
+        for label, sql in INSERTS:
+            plain_ms = measure_inserts(cursor, sql.format(suffix='plain'), args.rows, args.inserts)
+            monthly_ms = measure_inserts(cursor, sql.format(suffix='monthly'), args.rows, args.inserts)
+            print(f"{label:<14}{plain_ms:>12.3f}{monthly_ms:>12.3f}")
+
+        deleted, delete_ms, detach_ms = measure_archive(cursor)
+        print(f"\n归档最早一个月（{deleted}行）: DELETE {delete_ms:.1f}ms, DETACH + DROP {detach_ms:.1f}ms")
+    finally:
+        if not args.keep:
+            cursor.execute(f'DROP SCHEMA IF EXISTS {SCHEMA} CASCADE')
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+统计各API接口每次请求访问数据库的次数（round trip）
+
+用计数替身替换api模块中的Supabase客户端，不需要真实数据库：
+    python benchmarks/roundtrips.py
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import api
+from app import app
+
+# 优化前各接口的数据库请求次数（登录用户）
+BASELINE = {
+    'GET /api/emotions/<id>': 6,
+    'POST /api/emotions/<id>/comments': 3,
+}
+
+# 替身返回的通用记录，包含各接口需要的字段
+FAKE_ROW = {
+    'id': 1, 'parent_id': None, 'user_id': 'bench-user', 'emotion_type': 'happy',
+    'content': 'benchmark', 'custom_emoji': None, 'intensity': 5,
+    'latitude': 39.9, 'longitude': 116.4, 'privacy_setting': 'public',
+    'created_at': '2025-01-01T00:00:00+00:00', 'updated_at': '2025-01-01T00:00:00+00:00',
+    'username': 'bench', 'display_name': 'bench', 'avatar_url': '',
+    'users': {'username': 'bench', 'display_name': 'bench', 'avatar_url': ''},
+    'likes_count': 0, 'collections_count': 0, 'comments_count': 0,
+    'is_liked': False, 'is_collected': False,
+}
+
+
+class FakeResult:
+    def __init__(self, data):
+        self.data = data
+        self.count = len(data)
+
+
+class FakeQuery:
+    """记录execute调用次数的查询替身，任意链式调用都返回自身"""
+
+    def __init__(self, client):
+        self.client = client
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: self
+
+    def execute(self):
+        self.client.round_trips += 1
+        return FakeResult([dict(FAKE_ROW)])
+
+
+class CountingClient:
+    def __init__(self):
+        self.round_trips = 0
+
+    def table(self, name):
+        return FakeQuery(self)
+
+    def rpc(self, name, params=None):
+        return FakeQuery(self)
+
+
+def measure(client, method, path, **kwargs):
+    """执行一次请求并返回数据库请求次数"""
+    counter = CountingClient()
+    api.supabase = counter
+    response = getattr(client, method)(path, **kwargs)
+    assert response.status_code < 500, response.get_data(as_text=True)
+    return counter.round_trips
+
+
+def main():
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess['is_authenticated'] = True
+        sess['user_id'] = 'bench-user'
+
+    results = {
+        'GET /api/emotions/<id>': measure(client, 'get', '/api/emotions/1'),
+        'POST /api/emotions/<id>/comments': measure(
+            client, 'post', '/api/emotions/1/comments', json={'content': 'benchmark'}
+        ),
+    }
+
+    print(f"{'接口':<40}{'优化前':>8}{'当前':>8}")
+    for name, count in results.items():
+        print(f"{name:<40}{BASELINE.get(name, '-'):>8}{count:>8}")
+
+
+if __name__ == "__main__":
+    main()
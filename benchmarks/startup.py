@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+应用冷启动基准测试
+
+每次在新的Python进程中导入app并通过测试客户端请求/，统计从启动进程到首页响应的耗时，
+用`python -X importtime`列出导入最慢的模块，并检查应推迟到首次使用时才导入的模块：
+    python benchmarks/startup.py --runs 5 --budget-ms 600
+
+冷启动耗时超出预算或启动时导入了推迟的模块时以非零状态退出，可用于CI中防止启动变慢。
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 只在首次使用时导入的重量级模块
+DEFERRED_MODULES = ('supabase', 'postgrest', 'httpx', 'numpy')
+
+COLD_START_SCRIPT = f"""
+import sys
+from app import app
+response = app.test_client().get('/')
+assert response.status_code == 200, response.status_code
+print('loaded:' + ','.join(name for name in {DEFERRED_MODULES!r} if name in sys.modules))
+"""
+
+
+def run_python(args, workdir):
+    """在workdir中启动新的解释器，返回(耗时ms, stdout, stderr)"""
+    env = dict(os.environ, PYTHONPATH=ROOT, PYTHONDONTWRITEBYTECODE='1')
+    started = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable] + args, cwd=workdir, env=env,
+        capture_output=True, text=True, check=True
+    )
+    return (time.perf_counter() - started) * 1000, result.stdout, result.stderr
+
+
+def parse_importtime(output):
+    """解析-X importtime输出，返回[(累计耗时us, 自身耗时us, 模块名)]"""
+    modules = []
+    for line in output.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        fields = line[len('import time:'):].split('|')
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            continue
+        modules.append((int(fields[1]), int(fields[0]), fields[2].strip()))
+    return modules
+
+
+def main():
+    parser = argparse.ArgumentParser(description='应用冷启动基准测试')
+    parser.add_argument('--runs', type=int, default=5, help='冷启动次数（取中位数）')
+    parser.add_argument('--budget-ms', type=float, default=float(os.environ.get('STARTUP_BUDGET_MS', 600)),
+                        help='从启动进程到首页响应的耗时预算（毫秒，默认读取STARTUP_BUDGET_MS或600）')
+    parser.add_argument('--top', type=int, default=15, help='列出导入最慢的模块数量')
+    args = parser.parse_args()
+
+    # 在临时目录中运行，任务队列、限流等SQLite文件不写入项目目录
+    with tempfile.TemporaryDirectory() as workdir:
+        _, _, stderr = run_python(['-X', 'importtime', '-c', 'import app'], workdir)
+        modules = parse_importtime(stderr)
+
+        timings = []
+        loaded = set()
+        for _ in range(args.runs):
+            elapsed, stdout, _ = run_python(['-c', COLD_START_SCRIPT], workdir)
+            timings.append(elapsed)
+            for line in stdout.splitlines():
+                if line.startswith('loaded:'):
+                    loaded.update(name for name in line[len('loaded:'):].split(',') if name)
+
+    total = next((cumulative for cumulative, _, name in modules if name == 'app'), 0)
+    print(f"导入app: {total / 1000:.1f}ms（-X importtime）\n")
+    print(f"{'模块':<40}{'累计(ms)':>10}{'自身(ms)':>10}")
+    for cumulative, self_time, name in sorted(modules, reverse=True)[:args.top]:
+        print(f"{name:<40}{cumulative / 1000:>10.1f}{self_time / 1000:>10.1f}")
+
+    cold_start = statistics.median(timings)
+    print(f"\n冷启动到首页响应: 中位数{cold_start:.0f}ms，最慢{max(timings):.0f}ms（{args.runs}次，预算{args.budget_ms:.0f}ms）")
+
+    failed = False
+    if cold_start > args.budget_ms:
+        print(f"超出预算: {cold_start:.0f}ms > {args.budget_ms:.0f}ms")
+        failed = True
+    if loaded:
+        print(f"启动时导入了应推迟的模块: {', '.join(sorted(loaded))}")
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
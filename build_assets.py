@@ -0,0 +1,359 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+构建静态资源
+
+下载自托管的第三方库，压缩并合并static下的JS/CSS，按内容哈希命名输出到static/dist，
+同时生成.gz/.br预压缩文件和manifest.json（运行时由assets.py读取）：
+    python build_assets.py
+    python build_assets.py --offline   # 不下载第三方库，缺失的库在页面中继续使用CDN
+"""
+
+import argparse
+import base64
+import gzip
+import hashlib
+import json
+import os
+import posixpath
+import re
+import shutil
+
+import requests
+
+from assets import BUNDLES, DIST_DIR, MANIFEST_NAME, OPTIONAL_SOURCES, VENDOR_FILES
+
+try:
+    import brotli
+except ImportError:  # 未安装brotli时只生成.gz
+    brotli = None
+
+STATIC_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+
+# 生成预压缩文件的类型
+COMPRESSIBLE_EXTENSIONS = ('.js', '.css', '.json', '.svg')
+
+# 这些字符或关键字之后的/是正则表达式字面量的开始，否则为除号
+REGEX_PRECEDING_CHARS = set('(,=:[!&|?{};+-*%<>~^')
+REGEX_PRECEDING_WORDS = {
+    'return', 'typeof', 'case', 'do', 'else', 'in', 'of', 'new', 'delete',
+    'void', 'throw', 'instanceof', 'yield', 'await'
+}
+
+CSS_STRING_PATTERN = re.compile(r'("(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\')', re.S)
+CSS_COMMENT_PATTERN = re.compile(CSS_STRING_PATTERN.pattern + r'|/\*.*?\*/', re.S)
+CSS_URL_PATTERN = re.compile(r'url\(\s*([\'"]?)([^\'")]+)\1\s*\)')
+
+
+# ==================== 压缩 ====================
+
+def is_word_char(ch):
+    """标识符、关键字和数字中的字符"""
+    return ch.isalnum() or ch in '_$' or ord(ch) > 127
+
+
+def skip_quoted(source, start):
+    """返回从start处引号开始的字符串字面量之后的位置"""
+    quote = source[start]
+    i = start + 1
+    while i < len(source) and source[i] != quote:
+        i += 2 if source[i] == '\\' else 1
+    return i + 1
+
+
+def skip_regex(source, start):
+    """返回从start处/开始的正则表达式字面量（含标志）之后的位置"""
+    i = start + 1
+    in_class = False
+    while i < len(source):
+        ch = source[i]
+        if ch == '\\':
+            i += 2
+            continue
+        if ch == '[':
+            in_class = True
+        elif ch == ']':
+            in_class = False
+        elif ch == '/' and not in_class:
+            break
+        i += 1
+    i += 1
+    while i < len(source) and is_word_char(source[i]):
+        i += 1
+    return i
+
+
+def minify_js(source):
+    """去掉JS中的注释、缩进和多余空白
+    换行全部保留（合并为一个），自动分号插入的结果不变；字符串、模板字符串和正则表达式原样保留"""
+    out = []
+    state = {'last': '', 'kind': '', 'word': '', 'space': False, 'newline': False}
+    # 每层{为False，模板字符串中的${为True
+    braces = []
+
+    def needs_space(next_char):
+        last = state['last']
+        if state['kind'] == 'regex' and is_word_char(next_char):
+            return True
+        if is_word_char(last) and is_word_char(next_char):
+            return True
+        if last.isdigit() and next_char == '.':
+            return True
+        return last in '+-/' and next_char == last
+
+    def emit(token, kind=''):
+        if out:
+            if state['newline']:
+                out.append('\n')
+            elif state['space'] and needs_space(token[0]):
+                out.append(' ')
+        state.update(space=False, newline=False, last=token[-1], kind=kind, word=token if kind == 'word' else '')
+        out.append(token)
+
+    def copy_template(i):
+        """从i开始复制模板字符串内容，直到结束的`或${，返回之后的位置"""
+        start = i
+        while i < len(source):
+            ch = source[i]
+            if ch == '\\':
+                i += 2
+                continue
+            if ch == '`':
+                out.append(source[start:i + 1])
+                state.update(last='`', kind='template', word='')
+                return i + 1
+            if ch == '$' and source[i + 1:i + 2] == '{':
+                out.append(source[start:i + 2])
+                state.update(last='{', kind='', word='')
+                braces.append(True)
+                return i + 2
+            i += 1
+        out.append(source[start:])
+        return i
+
+    i = 0
+    while i < len(source):
+        ch = source[i]
+        following = source[i + 1:i + 2]
+        if ch == '\n':
+            state['newline'] = True
+            i += 1
+        elif ch.isspace():
+            state['space'] = True
+            i += 1
+        elif ch == '/' and following == '/':
+            end = source.find('\n', i)
+            i = len(source) if end == -1 else end
+        elif ch == '/' and following == '*':
+            end = source.find('*/', i + 2)
+            end = len(source) if end == -1 else end + 2
+            if '\n' in source[i:end]:
+                state['newline'] = True
+            else:
+                state['space'] = True
+            i = end
+        elif ch in '\'"':
+            end = skip_quoted(source, i)
+            emit(source[i:end], 'string')
+            i = end
+        elif ch == '`':
+            emit('`', 'template')
+            i = copy_template(i + 1)
+        elif ch == '/' and (not out or state['word'] in REGEX_PRECEDING_WORDS
+                            or state['last'] in REGEX_PRECEDING_CHARS and state['kind'] != 'update'):
+            end = skip_regex(source, i)
+            emit(source[i:end], 'regex')
+            i = end
+        elif is_word_char(ch):
+            end = i + 1
+            while end < len(source) and is_word_char(source[end]):
+                end += 1
+            emit(source[i:end], 'word')
+            i = end
+        elif ch == '{':
+            braces.append(False)
+            emit(ch)
+            i += 1
+        elif ch in '+-' and following == ch:
+            # ++/--之后的/是除号（b++ / 2），不能按前一个字符+/-当作正则表达式
+            emit(ch * 2, 'update')
+            i += 2
+        elif ch == '}' and braces and braces[-1]:
+            braces.pop()
+            emit(ch)
+            i = copy_template(i + 1)
+        else:
+            if ch == '}' and braces:
+                braces.pop()
+            emit(ch)
+            i += 1
+    return ''.join(out) + '\n'
+
+
+def minify_css(source):
+    """去掉CSS中的注释和多余空白，字符串原样保留"""
+    css = CSS_COMMENT_PATTERN.sub(lambda match: match.group(1) or '', source)
+    parts = CSS_STRING_PATTERN.split(css)
+    # split结果中奇数下标为字符串
+    for index in range(0, len(parts), 2):
+        segment = re.sub(r'\s+', ' ', parts[index])
+        segment = re.sub(r' ?([{};,>]) ?', r'\1', segment)
+        parts[index] = segment.replace(': ', ':').replace(';}', '}')
+    return ''.join(parts).strip() + '\n'
+
+
+def rewrite_css_urls(css, source_path, output_dir, manifest):
+    """把CSS中相对路径的url()改写为相对输出目录的构建文件"""
+    source_dir = posixpath.dirname(source_path)
+
+    def replace(match):
+        url = match.group(2).strip()
+        if re.match(r'^(data:|[a-z]+:|//|/|#)', url):
+            return match.group(0)
+        path = url.split('?', 1)[0].split('#', 1)[0]
+        logical = posixpath.normpath(posixpath.join(source_dir, path))
+        target = manifest.get(logical, logical)
+        return f'url({posixpath.relpath(target, output_dir)})'
+
+    return CSS_URL_PATTERN.sub(replace, css)
+
+
+# ==================== 构建 ====================
+
+def fetch_vendor(static_folder, offline=False):
+    """下载缺失的第三方库并校验SRI摘要，返回仍缺失的文件"""
+    missing = []
+    for path, (url, integrity) in VENDOR_FILES.items():
+        target = os.path.join(static_folder, path)
+        if os.path.exists(target):
+            continue
+        if offline:
+            missing.append(path)
+            continue
+        response = requests.get(url, timeout=30)
+        response.raise_for_status()
+        if integrity:
+            algorithm, expected = integrity.split('-', 1)
+            actual = base64.b64encode(hashlib.new(algorithm, response.content).digest()).decode()
+            if actual != expected:
+                raise ValueError(f'{url} 的SRI摘要不匹配')
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        with open(target, 'wb') as f:
+            f.write(response.content)
+        print(f"已下载 {url}")
+    return missing
+
+
+def fingerprint(path, content):
+    """构建文件名：源文件名中插入内容哈希（第三方库路径已带版本号，保持原名）"""
+    if path.startswith('vendor/'):
+        return posixpath.join(DIST_DIR, path)
+    stem, ext = posixpath.splitext(path)
+    return posixpath.join(DIST_DIR, f'{stem}.{hashlib.sha256(content).hexdigest()[:10]}{ext}')
+
+
+def write_output(static_folder, path, content):
+    """写入构建文件及其预压缩版本，返回各版本的大小"""
+    target = os.path.join(static_folder, path)
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    with open(target, 'wb') as f:
+        f.write(content)
+    sizes = {'raw': len(content), 'gz': None, 'br': None}
+    if path.endswith(COMPRESSIBLE_EXTENSIONS):
+        compressed = {'gz': gzip.compress(content, 9, mtime=0)}
+        if brotli is not None:
+            compressed['br'] = brotli.compress(content, quality=11)
+        for suffix, data in compressed.items():
+            if len(data) < len(content):
+                with open(f'{target}.{suffix}', 'wb') as f:
+                    f.write(data)
+                sizes[suffix] = len(data)
+    return sizes
+
+
+def read_source(static_folder, path, manifest, output_dir):
+    """读取并压缩一个源文件，output_dir为输出目录（第三方库已压缩，只改写CSS中的url）"""
+    with open(os.path.join(static_folder, path), 'rb') as f:
+        content = f.read()
+    if path.endswith('.css'):
+        css = rewrite_css_urls(content.decode('utf-8'), path, output_dir, manifest)
+        return (css if path.startswith('vendor/') else minify_css(css)).encode('utf-8')
+    if path.endswith('.js') and not path.startswith('vendor/'):
+        return minify_js(content.decode('utf-8')).encode('utf-8')
+    return content
+
+
+def build(static_folder, offline=False):
+    """构建所有静态资源，返回(清单, 各文件统计)"""
+    missing = set(fetch_vendor(static_folder, offline))
+    shutil.rmtree(os.path.join(static_folder, DIST_DIR), ignore_errors=True)
+
+    # 缺少第三方库的打包跳过，其中的本地源文件单独构建（页面按源文件逐个引用）
+    bundles = {}
+    for name, sources in BUNDLES.items():
+        sources = [
+            source for source in sources
+            if source not in OPTIONAL_SOURCES or os.path.exists(os.path.join(static_folder, source))
+        ]
+        if missing.intersection(sources):
+            print(f"跳过 {name}：缺少 {', '.join(sorted(missing.intersection(sources)))}")
+        else:
+            bundles[name] = sources
+    bundled = {source for sources in bundles.values() for source in sources}
+
+    singles = []
+    for root, dirs, files in os.walk(static_folder):
+        dirs[:] = sorted(d for d in dirs if os.path.join(root, d) != os.path.join(static_folder, DIST_DIR))
+        for filename in sorted(files):
+            path = os.path.relpath(os.path.join(root, filename), static_folder).replace(os.sep, '/')
+            if path not in bundled:
+                singles.append(path)
+    # 图片等先构建，CSS中的url()才能指向构建后的文件
+    singles.sort(key=lambda path: (path.endswith(('.css', '.js')), path))
+
+    manifest = {}
+    stats = []
+    for path in singles:
+        content = read_source(static_folder, path, manifest, posixpath.join(DIST_DIR, posixpath.dirname(path)))
+        output = fingerprint(path, content)
+        manifest[path] = output
+        stats.append((path, os.path.getsize(os.path.join(static_folder, path)), write_output(static_folder, output, content)))
+
+    for name, sources in bundles.items():
+        output_dir = posixpath.join(DIST_DIR, posixpath.dirname(name))
+        parts = [read_source(static_folder, source, manifest, output_dir) for source in sources]
+        # JS文件之间加分号，避免前一个文件末尾缺少分号时与下一个文件连在一起
+        separator = b'\n;\n' if name.endswith('.js') else b'\n'
+        content = separator.join(part.rstrip(b'\n') for part in parts) + b'\n'
+        output = fingerprint(name, content)
+        manifest[name] = output
+        original = sum(os.path.getsize(os.path.join(static_folder, source)) for source in sources)
+        stats.append((name, original, write_output(static_folder, output, content)))
+
+    with open(os.path.join(static_folder, DIST_DIR, MANIFEST_NAME), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return manifest, stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description='构建静态资源（压缩、合并、内容哈希、预压缩）')
+    parser.add_argument('--static', default=STATIC_FOLDER, help='static目录')
+    parser.add_argument('--offline', action='store_true', help='不下载缺失的第三方库')
+    args = parser.parse_args()
+
+    manifest, stats = build(args.static, args.offline)
+
+    def size(value):
+        return '-' if value is None else f'{value / 1024:.1f}'
+
+    print(f"{'文件':<60}{'源(KB)':>10}{'构建(KB)':>10}{'gzip(KB)':>10}{'br(KB)':>10}")
+    for path, original, sizes in stats:
+        if path.endswith(COMPRESSIBLE_EXTENSIONS):
+            print(f"{manifest[path]:<60}{size(original):>10}{size(sizes['raw']):>10}{size(sizes['gz']):>10}{size(sizes['br']):>10}")
+    if brotli is None:
+        print("未安装brotli，只生成了.gz文件（pip install brotli）")
+    print(f"\n共{len(manifest)}个文件，清单: {os.path.join(args.static, DIST_DIR, MANIFEST_NAME)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -25,6 +25,116 @@ class Config:
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB最大文件上传大小
     MAX_EMOTION_LENGTH = 200  # 情绪文字最大长度
     COMMENT_MAX_LENGTH = 500  # 评论最大长度
+    COMMENT_THREAD_MAX_DEPTH = 3  # 评论楼中楼最大展开深度
+    COMMENT_THREAD_MAX_REPLIES = 50  # 每个评论线程最多返回的回复数
+    
+    # GitHub API配置
+    GITHUB_OAUTH_URL = os.environ.get('GITHUB_OAUTH_URL', 'https://github.com')  # GitHub OAuth授权和换取令牌的地址（可指向本地模拟服务）
+    GITHUB_API_URL = os.environ.get('GITHUB_API_URL', 'https://api.github.com')  # GitHub API地址（可指向本地模拟服务）
+    GITHUB_TOKEN_SEAL_TTL = 86400  # 后台任务中加密保存的访问令牌有效期（秒）
+    GITHUB_API_TIMEOUT = 5  # 单次请求超时时间（秒）
+    GITHUB_ETAG_CACHE_TTL = 86400  # 按令牌缓存的GitHub响应及ETag保留时间（秒）
+    
+    # 后台任务配置
+    JOB_QUEUE_PATH = os.environ.get('JOB_QUEUE_PATH', 'data/jobs.sqlite3')  # 任务队列SQLite文件
+    JOB_WORKERS = int(os.environ.get('JOB_WORKERS', 2))  # 工作线程数
+    JOB_MAX_ATTEMPTS = 5  # 最多执行次数
+    JOB_RETRY_DELAY = 2  # 首次重试等待时间（秒），之后指数增长
+    JOB_LEASE_SECONDS = int(os.environ.get('JOB_LEASE_SECONDS', 300))  # 执行中任务的租约时长（秒），持有者退出后租约过期才会被重新领取
+    JOB_PERIODIC_STARTUP_DELAY = int(os.environ.get('JOB_PERIODIC_STARTUP_DELAY', 60))  # 启动后首次执行周期任务前的等待时间（秒），避免与冷启动争用资源
+    
+    # 软删除清理配置
+    PURGE_RETENTION_DAYS = int(os.environ.get('PURGE_RETENTION_DAYS', 30))  # 软删除情绪保留天数，之后归档并物理删除
+    PURGE_MIN_RETENTION_DAYS = 7  # 保留天数下限（数据库函数同样拒绝更短的保留期）
+    PURGE_BATCH_SIZE = 500  # 每批处理的情绪数量
+    PURGE_MAX_BATCHES = 20  # 单次任务最多处理的批数
+    PURGE_INTERVAL_HOURS = 24  # 清理任务执行间隔（小时）
+    
+    # 情绪表按月分区配置
+    EMOTION_PARTITION_MONTHS_AHEAD = 3  # 预先创建的未来月份分区数
+    EMOTION_PARTITION_KEEP_MONTHS = int(os.environ.get('EMOTION_PARTITION_KEEP_MONTHS', 0))  # 保留的月份数，更早的分区被分离归档；0表示不分离
+    EMOTION_PARTITION_MAINTENANCE_HOURS = 24  # 分区维护任务执行间隔（小时）
+    
+    # 会话令牌配置
+    SESSION_TOKEN_TTL = int(os.environ.get('SESSION_TOKEN_TTL', 900))  # 令牌有效期（秒）
+    SESSION_TOKEN_REFRESH_BEFORE = 300  # 剩余有效期少于该值时后台刷新用户资料（秒）
+    SESSION_LIFETIME_DAYS = 7  # 登录状态最长保持天数
+    
+    # 缓存配置
+    USER_TIMELINE_CACHE_TTL = int(os.environ.get('USER_TIMELINE_CACHE_TTL', 60))  # 用户情绪首页缓存时间（秒）
+    EMOTION_DETAIL_CACHE_TTL = int(os.environ.get('EMOTION_DETAIL_CACHE_TTL', 5))  # 情绪详情缓存时间（秒）
+    
+    # 热力图配置
+    HEATMAP_MAX_ZOOM = 12  # 预聚合的最大缩放级别
+    HEATMAP_CELL_BITS = 3  # 每个瓦片划分为 2^3 x 2^3 个格子
+    HEATMAP_RETENTION = {'hour': 48, 'day': 30}  # 各粒度保留的时间桶数量
+    HEATMAP_CACHE_MAX_AGE = 60  # 瓦片HTTP缓存时间（秒）
+    
+    # 数据分析配置
+    ANALYTICS_SNAPSHOT_DIR = os.environ.get('ANALYTICS_SNAPSHOT_DIR', 'data/analytics')  # 列式快照目录
+    ANALYTICS_SNAPSHOT_TTL = int(os.environ.get('ANALYTICS_SNAPSHOT_TTL', 600))  # 快照重建间隔（秒）
+    
+    # 附近情绪查询配置
+    NEARBY_CELL_DEGREES = 0.05  # 空间索引网格大小（度）
+    NEARBY_DEFAULT_RADIUS_KM = 5  # 默认查询半径（公里）
+    NEARBY_MAX_RADIUS_KM = 50  # 最大查询半径（公里）
+    NEARBY_MAX_K = 100  # 单次最多返回数量
+    
+    # 热门排行配置
+    TRENDING_HALF_LIFE_HOURS = 12  # 热度半衰期（小时）
+    TRENDING_WINDOWS = {  # 可选的发布时间窗口（秒）
+        '6h': 6 * 3600,
+        '24h': 24 * 3600,
+        '7d': 7 * 86400
+    }
+    TRENDING_DEFAULT_WINDOW = '24h'
+    TRENDING_WEIGHTS = {  # 发布、点赞、收藏、评论的热度权重
+        'post': 1.0,
+        'like': 2.0,
+        'collection': 3.0,
+        'comment': 4.0
+    }
+    TRENDING_MAX_LIMIT = 100  # 单次最多返回数量
+    
+    # 逆地理编码配置
+    GEOCODE_UPSTREAM_URL = os.environ.get('GEOCODE_UPSTREAM_URL', 'https://nominatim.openstreetmap.org')  # Nominatim兼容服务地址
+    GEOCODE_CACHE_PATH = os.environ.get('GEOCODE_CACHE_PATH', 'data/geocode.sqlite3')  # SQLite缓存文件
+    GEOCODE_GEOHASH_PRECISION = 7  # 缓存网格精度（7位约150米）
+    GEOCODE_UPSTREAM_ZOOM = 16  # 上游查询的地址详细程度
+    GEOCODE_TIMEOUT = 5  # 上游请求超时时间（秒）
+    GEOCODE_CACHE_TTL_DAYS = 90  # 缓存有效期（天）
+    GEOCODE_USER_AGENT = os.environ.get('GEOCODE_USER_AGENT', 'TRAE-Emotion-Map/1.0')
+    GEOCODE_MIN_INTERVAL = float(os.environ.get('GEOCODE_MIN_INTERVAL', 1.0))  # 所有进程合计的上游请求最小间隔（秒），Nominatim要求不超过每秒1次
+    GEOCODE_MAX_WAIT = 2  # 上游请求排队超过该时间（秒）时直接返回繁忙
+    
+    # 限流配置
+    RATE_LIMIT_ENABLED = os.environ.get('RATE_LIMIT_ENABLED', 'true').lower() == 'true'
+    RATE_LIMIT_BACKEND = os.environ.get('RATE_LIMIT_BACKEND', 'memory')  # memory（进程内）或sqlite（多进程共享）
+    RATE_LIMIT_SQLITE_PATH = os.environ.get('RATE_LIMIT_SQLITE_PATH', 'data/ratelimit.sqlite3')
+    RATE_LIMIT_TRUST_PROXY = os.environ.get('RATE_LIMIT_TRUST_PROXY', 'false').lower() == 'true'  # 部署在一层反向代理之后时开启，使用该代理追加的X-Forwarded-For地址作为客户端IP
+    RATE_LIMITS = {  # 每个路由的令牌桶：capacity为突发数量，window为补满所需秒数
+        'create_emotion': {'capacity': 5, 'window': 60},
+        'create_comment': {'capacity': 10, 'window': 60},
+        'toggle_like': {'capacity': 30, 'window': 60},
+        'toggle_collection': {'capacity': 30, 'window': 60},
+        'toggle_comment_like': {'capacity': 30, 'window': 60},
+        'geocode_reverse': {'capacity': 20, 'window': 60}
+    }
+    
+    # 点赞/收藏写回配置
+    WRITE_BEHIND_ENABLED = os.environ.get('WRITE_BEHIND_ENABLED', 'false').lower() == 'true'  # 开启后切换先写日志，后台批量写入数据库
+    WRITE_BEHIND_JOURNAL_PATH = os.environ.get('WRITE_BEHIND_JOURNAL_PATH', 'data/toggles.journal')
+    WRITE_BEHIND_FLUSH_INTERVAL_MS = int(os.environ.get('WRITE_BEHIND_FLUSH_INTERVAL_MS', 500))  # 批量刷写间隔（毫秒）
+    
+    # 进程内索引同步配置
+    INDEX_SYNC_INTERVAL = int(os.environ.get('INDEX_SYNC_INTERVAL', 30))  # 读取其他进程写入的情绪变化的间隔（秒）
+    INDEX_REBUILD_INTERVAL = int(os.environ.get('INDEX_REBUILD_INTERVAL', 3600))  # 后台完整重建内存索引的间隔（秒），覆盖物理删除等不更新updated_at的变化；0表示不重建
+    
+    # 情绪类型配置
+    EMOTION_TYPES_MAX_AGE = 3600  # 未带版本号请求/api/emotion-types的HTTP缓存时间（秒），带当前版本号时为一年且immutable
+    
+    # 静态资源配置
+    ASSET_MANIFEST_ENABLED = os.environ.get('ASSET_MANIFEST_ENABLED', 'true').lower() == 'true'  # 存在static/dist/manifest.json时使用构建后的资源（修改前端源码调试时可关闭）
     
     # CORS配置
     CORS_ORIGINS = ['http://localhost:5000', 'http://127.0.0.1:5000']
\ No newline at end of file
@@ -0,0 +1,31 @@
+# 共享Supabase客户端
+# 进程内所有模块共用一个service role客户端；首次访问时才导入Supabase SDK并创建，缩短冷启动时间
+import threading
+
+from config import Config
+
+
+class LazySupabaseClient:
+    """首次使用时创建的Supabase客户端，属性访问透传给真实客户端"""
+
+    def __init__(self, url, key):
+        self._url = url
+        self._key = key
+        self._client = None
+        self._lock = threading.Lock()
+
+    def get_client(self):
+        """返回真实客户端（首次调用时创建）"""
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    from supabase import create_client
+                    self._client = create_client(self._url, self._key)
+        return self._client
+
+    def __getattr__(self, name):
+        return getattr(self.get_client(), name)
+
+
+# 全局共享客户端
+supabase = LazySupabaseClient(Config.SUPABASE_URL, Config.SUPABASE_SERVICE_ROLE_KEY)
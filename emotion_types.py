@@ -0,0 +1,78 @@
+# 情绪类型注册表
+# 所有情绪类型在这里统一定义，编译为小整数ID（用于紧凑存储）和预序列化的/api/emotion-types响应
+# 类型列表须与数据库约束emotions_emotion_type_check一致；ID只追加不复用，已有ID不能修改
+import hashlib
+import json
+
+# (ID, 代码, 名称, 表情, 颜色)
+EMOTION_TYPE_DEFINITIONS = (
+    (1, 'happy', '开心', '😊', '#FFD700'),
+    (2, 'sad', '难过', '😢', '#4169E1'),
+    (3, 'angry', '愤怒', '😠', '#FF4500'),
+    (4, 'excited', '兴奋', '🤩', '#FF69B4'),
+    (5, 'calm', '平静', '😌', '#98FB98'),
+    (6, 'anxious', '焦虑', '😰', '#DDA0DD'),
+    (7, 'confused', '困惑', '😕', '#B0C4DE'),
+    (8, 'grateful', '感激', '🙏', '#F0E68C'),
+    (9, 'love', '恋爱', '😍', '#FF6B81'),
+    (10, 'tired', '疲惫', '😴', '#A9A9A9'),
+    (11, 'surprised', '惊讶', '😲', '#FFA500'),
+    (12, 'lonely', '孤独', '😔', '#708090'),
+    (13, 'custom', '自定义', '🎭', '#9370DB'),
+)
+
+
+class EmotionTypeRegistry:
+    """不可变的情绪类型注册表"""
+
+    def __init__(self, definitions):
+        types = [
+            {'id': type_id, 'code': code, 'name': name, 'emoji': emoji, 'color': color}
+            for type_id, code, name, emoji, color in definitions
+        ]
+        self._by_code = {item['code']: item for item in types}
+        self._by_id = {item['id']: item for item in types}
+        if len(self._by_code) != len(types) or len(self._by_id) != len(types):
+            raise ValueError('情绪类型代码或ID重复')
+        if min(self._by_id) < 1 or max(self._by_id) > 254:
+            raise ValueError('情绪类型ID必须在1-254之间')
+        self.types = tuple(types)
+
+        # 响应体只在启动时序列化一次，版本号为内容摘要，类型变化时随之变化
+        content = json.dumps(types, ensure_ascii=False, separators=(',', ':'), sort_keys=True)
+        self.version = hashlib.sha256(content.encode('utf-8')).hexdigest()[:12]
+        self.body = json.dumps({
+            'version': self.version,
+            'emotion_types': {item['code']: item['name'] for item in types},
+            'types': types
+        }, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+    def __contains__(self, code):
+        return code in self._by_code
+
+    def __iter__(self):
+        return iter(self._by_code)
+
+    def __len__(self):
+        return len(self.types)
+
+    def id_of(self, code):
+        """类型代码对应的ID，未知类型返回None"""
+        item = self._by_code.get(code)
+        return item['id'] if item else None
+
+    def code_of(self, type_id):
+        """ID对应的类型代码，未知ID返回None"""
+        item = self._by_id.get(type_id)
+        return item['code'] if item else None
+
+    def codes_by_id(self):
+        """以ID为下标的类型代码列表（未使用的ID为None）"""
+        codes = [None] * (max(self._by_id) + 1)
+        for type_id, item in self._by_id.items():
+            codes[type_id] = item['code']
+        return codes
+
+
+# 全局情绪类型注册表
+emotion_types = EmotionTypeRegistry(EMOTION_TYPE_DEFINITIONS)
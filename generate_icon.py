@@ -1,117 +1,325 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 """
-将emoji转换为PNG图标文件
+将emoji批量渲染为PNG图标、尺寸变体和精灵图
+
+    python generate_icon.py favicon      # 站点图标static/images/favicon.png及各尺寸变体
+    python generate_icon.py emotions     # 每种情绪类型一个图标，并合成地图标记使用的精灵图和CSS
+    python generate_icon.py custom party=🎉 rain=🌧️ --output static/images/extra --sizes 32 64
+
+图标在进程池中并行渲染；输出PNG中记录源内容哈希（emoji、尺寸、字体、渲染版本），
+未变化的图标直接跳过，--force强制重新生成。
 """
 
+import argparse
+import functools
+import hashlib
+import json
+import math
 import os
+import shutil
+import subprocess
+from concurrent.futures import ProcessPoolExecutor
+
 from PIL import Image, ImageDraw, ImageFont
-import requests
-from io import BytesIO
-
-def create_emoji_icon(emoji, size=512, output_path="static/images/favicon.png"):
-    """
-    将emoji转换为PNG图标
-    
-    Args:
-        emoji: emoji字符
-        size: 图标尺寸
-        output_path: 输出路径
-    """
+from PIL.PngImagePlugin import PngInfo
+
+# 渲染逻辑变化时递增，使已有输出全部重新生成
+RENDER_VERSION = 1
+# 记录源内容哈希的PNG文本块
+HASH_KEY = 'source-hash'
+# emoji四周留白占图标尺寸的比例
+PADDING = 0.1
+
+# 常见系统的彩色emoji字体（Windows、macOS、各Linux发行版）
+FONT_PATHS = [
+    "C:/Windows/Fonts/seguiemj.ttf",  # Segoe UI Emoji
+    "C:/Windows/Fonts/NotoColorEmoji.ttf",
+    "C:/Windows/Fonts/TwitterColorEmoji-SVGinOT.ttf",
+    "/System/Library/Fonts/Apple Color Emoji.ttc",
+    "/usr/share/fonts/truetype/noto/NotoColorEmoji.ttf",  # Debian/Ubuntu
+    "/usr/share/fonts/noto/NotoColorEmoji.ttf",  # Arch
+    "/usr/share/fonts/google-noto-emoji/NotoColorEmoji.ttf",  # Fedora
+    "/usr/share/fonts/noto-emoji/NotoColorEmoji.ttf",
+    "/usr/share/fonts/truetype/twemoji/TwitterColorEmoji-SVGinOT.ttf",
+]
+
+# 位图emoji字体只能按固定字号加载（Noto为109，Apple为160等），加载后再缩放
+BITMAP_FONT_SIZES = (109, 160, 136, 96, 64, 48, 40, 32, 20)
+
+
+def find_emoji_font():
+    """查找可用的彩色emoji字体，找不到时返回None"""
+    for font_path in FONT_PATHS:
+        if os.path.exists(font_path):
+            return font_path
+    # 其他Linux/BSD系统通过fontconfig查找
+    if shutil.which('fc-match'):
+        try:
+            result = subprocess.run(
+                ['fc-match', '--format=%{file}', 'emoji:color'],
+                capture_output=True, text=True, timeout=5
+            )
+        except (OSError, subprocess.SubprocessError):
+            return None
+        font_path = result.stdout.strip()
+        # 没有emoji字体时fc-match会返回DejaVu等普通字体，这里只接受名称中带emoji的字体
+        if font_path and 'emoji' in os.path.basename(font_path).lower() and os.path.exists(font_path):
+            return font_path
+    return None
+
+
+def font_identity(font_path):
+    """字体标识（路径、大小和修改时间），字体更新后图标重新生成"""
+    if not font_path:
+        return None
+    stat = os.stat(font_path)
+    return [os.path.abspath(font_path), stat.st_size, int(stat.st_mtime)]
+
+
+@functools.lru_cache(maxsize=None)
+def load_font(font_path, size):
+    """加载字体（每个进程缓存），位图字体依次尝试其支持的字号"""
+    for font_size in (size,) + BITMAP_FONT_SIZES:
+        try:
+            return ImageFont.truetype(font_path, font_size)
+        except OSError:
+            continue
+    return None
+
+
+def render_emoji(emoji, size, font_path):
+    """用emoji字体渲染，裁掉空白后按留白缩放居中；字体缺少该emoji时返回None"""
+    font = load_font(font_path, size) if font_path else None
+    if font is None:
+        return None
+    canvas_size = int(font.size * 2)
+    canvas = Image.new('RGBA', (canvas_size, canvas_size), (0, 0, 0, 0))
+    ImageDraw.Draw(canvas).text(
+        (canvas_size / 2, canvas_size / 2), emoji, font=font,
+        fill=(0, 0, 0, 255), anchor='mm', embedded_color=True
+    )
+    bbox = canvas.getbbox()
+    if bbox is None:
+        return None
+    glyph = canvas.crop(bbox)
+    inner = size * (1 - 2 * PADDING)
+    scale = inner / max(glyph.size)
+    glyph = glyph.resize(
+        (max(1, round(glyph.width * scale)), max(1, round(glyph.height * scale))),
+        Image.Resampling.LANCZOS
+    )
+    img = Image.new('RGBA', (size, size), (0, 0, 0, 0))
+    img.alpha_composite(glyph, ((size - glyph.width) // 2, (size - glyph.height) // 2))
+    return img
+
+
+def render_fallback(label, size, color):
+    """没有emoji字体时的替代图标：彩色圆形加名称首字母"""
+    img = Image.new('RGBA', (size, size), (0, 0, 0, 0))
+    draw = ImageDraw.Draw(img)
+    margin = round(size * PADDING)
+    draw.ellipse([margin, margin, size - margin - 1, size - margin - 1], fill=color)
+    font = ImageFont.load_default(size=max(8, size // 2))
+    draw.text((size / 2, size / 2), label[:1].upper(), font=font, fill=(255, 255, 255, 255), anchor='mm')
+    return img
+
+
+def output_hash(path):
+    """读取已有输出中记录的源内容哈希"""
     try:
-        # 创建一个透明背景的图像
-        img = Image.new('RGBA', (size, size), (0, 0, 0, 0))
-        draw = ImageDraw.Draw(img)
-        
-        # 尝试使用系统字体渲染emoji
-        font_size = int(size * 0.8)  # 字体大小为图像尺寸的80%
-        
-        # Windows系统常见的支持emoji的字体
-        font_paths = [
-            "C:/Windows/Fonts/seguiemj.ttf",  # Segoe UI Emoji
-            "C:/Windows/Fonts/NotoColorEmoji.ttf",  # Noto Color Emoji
-            "C:/Windows/Fonts/TwitterColorEmoji-SVGinOT.ttf",  # Twitter Color Emoji
-        ]
-        
-        font = None
-        for font_path in font_paths:
-            if os.path.exists(font_path):
-                try:
-                    font = ImageFont.truetype(font_path, font_size)
-                    break
-                except:
-                    continue
-        
-        if font is None:
-            # 如果没有找到合适的字体，使用默认字体
-            try:
-                font = ImageFont.load_default()
-            except:
-                print("无法加载字体，使用基本渲染")
-                font = None
-        
-        # 计算文本位置（居中）
-        if font:
-            bbox = draw.textbbox((0, 0), emoji, font=font)
-            text_width = bbox[2] - bbox[0]
-            text_height = bbox[3] - bbox[1]
-        else:
-            text_width = size // 2
-            text_height = size // 2
-        
-        x = (size - text_width) // 2
-        y = (size - text_height) // 2
-        
-        # 绘制emoji
-        if font:
-            draw.text((x, y), emoji, font=font, fill=(0, 0, 0, 255))
-        else:
-            # 如果没有字体，创建一个简单的图标
-            draw.ellipse([size//4, size//4, 3*size//4, 3*size//4], fill=(135, 206, 235, 255))
-            draw.text((size//2-10, size//2-10), "🌤", fill=(255, 255, 255, 255))
-        
-        # 确保输出目录存在
-        os.makedirs(os.path.dirname(output_path), exist_ok=True)
-        
-        # 保存图像
-        img.save(output_path, "PNG")
-        print(f"图标已保存到: {output_path}")
-        
-        # 创建不同尺寸的图标
-        sizes = [16, 32, 48, 64, 128, 256]
-        for icon_size in sizes:
-            resized_img = img.resize((icon_size, icon_size), Image.Resampling.LANCZOS)
-            icon_path = output_path.replace('.png', f'_{icon_size}.png')
-            resized_img.save(icon_path, "PNG")
-            print(f"图标已保存到: {icon_path}")
-        
-        return True
-        
-    except Exception as e:
-        print(f"创建图标时出错: {e}")
-        return False
+        with Image.open(path) as img:
+            return img.text.get(HASH_KEY)
+    except (OSError, AttributeError):
+        return None
+
+
+def save_png(img, path, digest):
+    """保存PNG并记录源内容哈希"""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    info = PngInfo()
+    info.add_text(HASH_KEY, digest)
+    img.save(path, 'PNG', pnginfo=info, optimize=True)
+
+
+def icon_outputs(task):
+    """图标及其尺寸变体的输出路径：[(路径, 尺寸)]"""
+    base = os.path.join(task['output'], f"{task['name']}.png")
+    return [(base, task['size'])] + [
+        (os.path.join(task['output'], f"{task['name']}_{size}.png"), size) for size in task['sizes']
+    ]
+
+
+def task_hash(task):
+    """图标的源内容哈希"""
+    source = [RENDER_VERSION, task['emoji'], task['size'], task['sizes'], task['font'], task['color']]
+    return hashlib.sha256(json.dumps(source, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+
+def render_icon(task):
+    """渲染一个图标及其尺寸变体（在进程池中执行），返回(名称, 是否重新生成, 是否使用了替代图标)"""
+    digest = task_hash(task)
+    outputs = icon_outputs(task)
+    if not task['force'] and all(output_hash(path) == digest for path, _ in outputs):
+        return task['name'], False, False
+
+    font_path = task['font'][0] if task['font'] else None
+    img = render_emoji(task['emoji'], task['size'], font_path)
+    fallback = img is None
+    if fallback:
+        img = render_fallback(task['name'], task['size'], task['color'])
+
+    for path, size in outputs:
+        variant = img if size == task['size'] else img.resize((size, size), Image.Resampling.LANCZOS)
+        save_png(variant, path, digest)
+    return task['name'], True, fallback
+
+
+def build_atlas(tasks, atlas_path, css_path, css_prefix, force=False):
+    """把各图标合成为一张精灵图，并生成按百分比定位的CSS（图标显示为任意尺寸时都适用）"""
+    size = tasks[0]['size']
+    columns = math.ceil(math.sqrt(len(tasks)))
+    rows = math.ceil(len(tasks) / columns)
+    source = [RENDER_VERSION, size, columns] + [[task['name'], task_hash(task)] for task in tasks]
+    digest = hashlib.sha256(json.dumps(source).encode('utf-8')).hexdigest()
+
+    atlas_changed = force or output_hash(atlas_path) != digest
+    if atlas_changed:
+        atlas = Image.new('RGBA', (columns * size, rows * size), (0, 0, 0, 0))
+        for index, task in enumerate(tasks):
+            with Image.open(os.path.join(task['output'], f"{task['name']}.png")) as icon:
+                atlas.alpha_composite(icon.convert('RGBA'), ((index % columns) * size, (index // columns) * size))
+        save_png(atlas, atlas_path, digest)
+
+    def position(index, count):
+        return '0%' if count == 1 else f'{index * 100 / (count - 1):g}%'
+
+    image_url = os.path.relpath(atlas_path, os.path.dirname(css_path)).replace(os.sep, '/')
+    lines = [
+        "/* 由generate_icon.py生成，请勿手动修改 */",
+        f".{css_prefix}{{display:inline-block;background-image:url({image_url});"
+        f"background-size:{columns * 100}% {rows * 100}%;background-repeat:no-repeat}}",
+    ]
+    for index, task in enumerate(tasks):
+        lines.append(
+            f".{css_prefix}-{task['name']}{{background-position:"
+            f"{position(index % columns, columns)} {position(index // columns, rows)}}}"
+        )
+    css = '\n'.join(lines) + '\n'
+
+    css_changed = True
+    if os.path.exists(css_path):
+        with open(css_path, encoding='utf-8') as f:
+            css_changed = f.read() != css
+    if css_changed:
+        os.makedirs(os.path.dirname(css_path) or '.', exist_ok=True)
+        with open(css_path, 'w', encoding='utf-8') as f:
+            f.write(css)
+    return atlas_changed, css_changed
+
+
+def favicon_set():
+    """站点图标：512px主图标及16-256px变体"""
+    return {
+        'icons': [('favicon', '🌤️', (135, 206, 235, 255))],
+        'output': 'static/images',
+        'size': 512,
+        'sizes': [16, 32, 48, 64, 128, 256],
+    }
+
+
+def emotions_set():
+    """情绪类型图标：按注册表每种类型一个图标，合成为地图标记的精灵图"""
+    from emotion_types import emotion_types
+
+    return {
+        'icons': [(item['code'], item['emoji'], item['color']) for item in emotion_types.types],
+        'output': 'static/images/emotions',
+        'size': 96,
+        'sizes': [],
+        'atlas': 'static/images/emotion-sprite.png',
+        'css': 'static/css/emotion-sprite.css',
+        'css_prefix': 'emotion-sprite',
+    }
+
+
+def custom_set(args):
+    """命令行指定的任意emoji：名称=emoji"""
+    icons = []
+    for item in args.icons:
+        name, sep, emoji = item.partition('=')
+        if not sep or not name or not emoji:
+            raise SystemExit(f"图标格式应为 名称=emoji: {item}")
+        icons.append((name, emoji, (135, 206, 235, 255)))
+    icon_set = {'icons': icons, 'output': args.output, 'size': args.size, 'sizes': args.sizes}
+    if args.atlas:
+        icon_set.update(atlas=args.atlas, css=args.css or os.path.splitext(args.atlas)[0] + '.css',
+                        css_prefix=args.css_prefix)
+    return icon_set
+
+
+def generate(icon_set, font_path=None, jobs=None, force=False):
+    """并行渲染图标集，有精灵图配置时合成精灵图"""
+    font = font_identity(font_path)
+    tasks = [
+        {
+            'name': name, 'emoji': emoji, 'color': color, 'font': font, 'force': force,
+            'output': icon_set['output'], 'size': icon_set['size'], 'sizes': list(icon_set['sizes']),
+        }
+        for name, emoji, color in icon_set['icons']
+    ]
+
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        results = list(executor.map(render_icon, tasks))
+
+    for name, changed, fallback in results:
+        status = '已生成' if changed else '未变化'
+        print(f"{status}: {name}{'（未找到emoji字体，使用替代图标）' if fallback else ''}")
+
+    if icon_set.get('atlas'):
+        atlas_changed, css_changed = build_atlas(
+            tasks, icon_set['atlas'], icon_set['css'], icon_set['css_prefix'], force
+        )
+        print(f"{'已生成' if atlas_changed else '未变化'}: {icon_set['atlas']}")
+        print(f"{'已生成' if css_changed else '未变化'}: {icon_set['css']}")
+    return results
+
 
 def main():
     """主函数"""
-    emoji = "🌤️"
-    
-    print(f"正在将 {emoji} 转换为PNG图标...")
-    
-    # 创建主图标
-    success = create_emoji_icon(emoji, 512, "static/images/favicon.png")
-    
-    if success:
-        print("\n图标创建成功！")
-        print("已创建以下文件:")
-        print("- static/images/favicon.png (512x512)")
-        print("- static/images/favicon_16.png (16x16)")
-        print("- static/images/favicon_32.png (32x32)")
-        print("- static/images/favicon_48.png (48x48)")
-        print("- static/images/favicon_64.png (64x64)")
-        print("- static/images/favicon_128.png (128x128)")
-        print("- static/images/favicon_256.png (256x256)")
+    # 各子命令共用的参数
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument('--font', help='emoji字体文件（默认自动查找）')
+    common.add_argument('--jobs', type=int, default=None, help='并行进程数（默认CPU核数）')
+    common.add_argument('--force', action='store_true', help='忽略内容哈希，全部重新生成')
+
+    parser = argparse.ArgumentParser(description='将emoji批量渲染为PNG图标、尺寸变体和精灵图')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('favicon', parents=[common], help='站点图标')
+    subparsers.add_parser('emotions', parents=[common], help='情绪类型图标和地图标记精灵图')
+    custom = subparsers.add_parser('custom', parents=[common], help='任意emoji图标')
+    custom.add_argument('icons', nargs='+', help='名称=emoji')
+    custom.add_argument('--output', required=True, help='输出目录')
+    custom.add_argument('--size', type=int, default=96, help='图标尺寸')
+    custom.add_argument('--sizes', type=int, nargs='*', default=[], help='额外生成的尺寸变体')
+    custom.add_argument('--atlas', help='精灵图输出路径')
+    custom.add_argument('--css', help='精灵图CSS输出路径（默认与精灵图同名）')
+    custom.add_argument('--css-prefix', default='sprite', help='精灵图CSS类名前缀')
+    args = parser.parse_args()
+
+    if args.command == 'favicon':
+        icon_set = favicon_set()
+    elif args.command == 'emotions':
+        icon_set = emotions_set()
     else:
-        print("图标创建失败！")
+        icon_set = custom_set(args)
+
+    font_path = args.font or find_emoji_font()
+    if args.font and not os.path.exists(args.font):
+        raise SystemExit(f"字体文件不存在: {args.font}")
+    print(f"emoji字体: {font_path or '未找到'}")
+    generate(icon_set, font_path, args.jobs, args.force)
+
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,215 @@
+# 逆地理编码缓存
+# 坐标先对齐到geohash网格，同一网格共享一条SQLite缓存记录，未命中时才请求上游（Nominatim兼容接口）
+# 上游请求经过跨进程共享的全局节流（Nominatim使用政策要求不超过每秒1次）
+import os
+import sqlite3
+import threading
+import time
+
+import requests
+
+from cache import SingleFlight
+
+GEOHASH_ALPHABET = '0123456789bcdefghjkmnpqrstuvwxyz'
+
+# 组成粗粒度地名的地址字段（从大到小）
+CITY_FIELDS = ('city', 'town', 'village', 'county', 'state')
+DISTRICT_FIELDS = ('city_district', 'district', 'suburb', 'borough', 'neighbourhood')
+
+
+def geohash_encode(lat, lng, precision=7):
+    """经纬度编码为geohash字符串"""
+    lat_range = [-90.0, 90.0]
+    lng_range = [-180.0, 180.0]
+    chars = []
+    bits = 0
+    bit_count = 0
+    even = True
+    while len(chars) < precision:
+        value, value_range = (lng, lng_range) if even else (lat, lat_range)
+        middle = (value_range[0] + value_range[1]) / 2
+        bits <<= 1
+        if value >= middle:
+            bits |= 1
+            value_range[0] = middle
+        else:
+            value_range[1] = middle
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(GEOHASH_ALPHABET[bits])
+            bits = 0
+            bit_count = 0
+    return ''.join(chars)
+
+
+def geohash_center(geohash):
+    """返回geohash网格的中心点(纬度, 经度)"""
+    lat_range = [-90.0, 90.0]
+    lng_range = [-180.0, 180.0]
+    even = True
+    for char in geohash:
+        index = GEOHASH_ALPHABET.index(char)
+        for shift in range(4, -1, -1):
+            value_range = lng_range if even else lat_range
+            middle = (value_range[0] + value_range[1]) / 2
+            if index >> shift & 1:
+                value_range[0] = middle
+            else:
+                value_range[1] = middle
+            even = not even
+    return (lat_range[0] + lat_range[1]) / 2, (lng_range[0] + lng_range[1]) / 2
+
+
+def coarse_place_name(address):
+    """从地址字段生成粗粒度地名（城市 + 区县），无法识别时返回None"""
+    address = address or {}
+    city = next((address[field] for field in CITY_FIELDS if address.get(field)), None)
+    district = next((address[field] for field in DISTRICT_FIELDS if address.get(field)), None)
+    parts = [part for part in (city, district) if part]
+    if not parts:
+        return address.get('country')
+    return ' '.join(dict.fromkeys(parts))
+
+
+class UpstreamBusy(Exception):
+    """上游请求配额已排满，需要稍后再试"""
+
+    def __init__(self, retry_after):
+        super().__init__(f'地址服务请求排队已满，{retry_after:.1f}秒后再试')
+        self.retry_after = retry_after
+
+
+class ReverseGeocoder:
+    """带持久化缓存的逆地理编码"""
+
+    def __init__(self, db_path, upstream_url, precision=7, zoom=16, timeout=5,
+                 user_agent='emotion-map', ttl_days=90, language='zh-CN', min_interval=1.0, max_wait=2.0):
+        self.db_path = db_path
+        self.upstream_url = upstream_url.rstrip('/')
+        self.precision = precision
+        self.zoom = zoom
+        self.timeout = timeout
+        self.ttl = ttl_days * 86400
+        self.language = language
+        self.user_agent = user_agent
+        # 所有进程合计的上游请求最小间隔（秒），排队等待超过max_wait秒时放弃本次请求
+        self.min_interval = min_interval
+        self.max_wait = max_wait
+        # HTTP会话在首次请求上游时创建
+        self._session = None
+        self._flight = SingleFlight()
+        self._init_lock = threading.Lock()
+        self._initialized = False
+
+    def _connect(self):
+        """打开缓存数据库（首次调用时建表）"""
+        if not self._initialized:
+            with self._init_lock:
+                if not self._initialized:
+                    directory = os.path.dirname(self.db_path)
+                    if directory:
+                        os.makedirs(directory, exist_ok=True)
+                    with sqlite3.connect(self.db_path) as conn:
+                        conn.execute('PRAGMA journal_mode=WAL')
+                        conn.execute(
+                            'CREATE TABLE IF NOT EXISTS reverse_geocode ('
+                            'geohash TEXT PRIMARY KEY, place_name TEXT, display_name TEXT, fetched_at REAL NOT NULL)'
+                        )
+                        conn.execute(
+                            'CREATE TABLE IF NOT EXISTS upstream_throttle (id INTEGER PRIMARY KEY CHECK (id = 1), next_at REAL NOT NULL)'
+                        )
+                    self._initialized = True
+        return sqlite3.connect(self.db_path, timeout=5)
+
+    def _read(self, geohash):
+        """读取未过期的缓存记录"""
+        conn = self._connect()
+        try:
+            row = conn.execute(
+                'SELECT place_name, display_name, fetched_at FROM reverse_geocode WHERE geohash = ?',
+                (geohash,)
+            ).fetchone()
+        finally:
+            conn.close()
+        if row is None or row[2] < time.time() - self.ttl:
+            return None
+        return {'place_name': row[0], 'display_name': row[1]}
+
+    def _write(self, geohash, place):
+        """写入缓存记录（无结果也会缓存，避免重复请求海洋等无地址区域）"""
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute(
+                    'INSERT OR REPLACE INTO reverse_geocode (geohash, place_name, display_name, fetched_at) '
+                    'VALUES (?, ?, ?, ?)',
+                    (geohash, place['place_name'], place['display_name'], time.time())
+                )
+        finally:
+            conn.close()
+
+    def _reserve_slot(self):
+        """在所有进程共享的节流表中预约下一个上游请求时刻并等待到该时刻
+        排队超过max_wait秒时不预约，抛出UpstreamBusy"""
+        conn = self._connect()
+        try:
+            conn.isolation_level = None
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                row = conn.execute('SELECT next_at FROM upstream_throttle WHERE id = 1').fetchone()
+                now = time.time()
+                slot = max(now, row[0] if row else 0.0)
+                if slot - now <= self.max_wait:
+                    conn.execute(
+                        'INSERT OR REPLACE INTO upstream_throttle (id, next_at) VALUES (1, ?)',
+                        (slot + self.min_interval,)
+                    )
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+        finally:
+            conn.close()
+        if slot - now > self.max_wait:
+            raise UpstreamBusy(slot - now)
+        if slot > now:
+            time.sleep(slot - now)
+
+    def _fetch(self, geohash):
+        """请求上游服务查询网格中心点的地址"""
+        self._reserve_slot()
+        if self._session is None:
+            session = requests.Session()
+            session.headers['User-Agent'] = self.user_agent
+            self._session = session
+        lat, lng = geohash_center(geohash)
+        response = self._session.get(f'{self.upstream_url}/reverse', params={
+            'format': 'json',
+            'lat': f'{lat:.6f}',
+            'lon': f'{lng:.6f}',
+            'zoom': self.zoom,
+            'addressdetails': 1,
+            'accept-language': self.language
+        }, timeout=self.timeout)
+        response.raise_for_status()
+        data = response.json()
+        place = {
+            'place_name': coarse_place_name(data.get('address')),
+            'display_name': data.get('display_name')
+        }
+        self._write(geohash, place)
+        return place
+
+    def reverse(self, lat, lng, cached_only=False):
+        """查询坐标所在网格的地名，返回包含geohash、place_name、display_name、cached的字典
+        上游请求失败时抛出requests异常，节流排队已满时抛出UpstreamBusy；cached_only为True时未命中返回None"""
+        geohash = geohash_encode(lat, lng, self.precision)
+        place = self._read(geohash)
+        if place is not None:
+            return dict(place, geohash=geohash, cached=True)
+        if cached_only:
+            return None
+        # 同一网格的并发未命中只请求一次上游
+        place = self._flight.do(geohash, lambda: self._read(geohash) or self._fetch(geohash))
+        return dict(place, geohash=geohash, cached=False)
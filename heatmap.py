@@ -0,0 +1,257 @@
+# 情绪热力图瓦片聚合
+# 将公开情绪按时间桶（小时/天）和多级经纬度网格预先聚合，按 z/x/y 瓦片提供查询
+import hashlib
+import math
+import threading
+from datetime import datetime, timezone
+
+# 时间桶粒度（秒）
+GRANULARITIES = {
+    'hour': 3600,
+    'day': 86400
+}
+
+# Web墨卡托投影的纬度范围
+MAX_LATITUDE = 85.05112878
+
+
+def parse_timestamp(value):
+    """将数据库返回的时间字符串转换为UTC时间戳（秒）"""
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, datetime):
+        dt = value
+    else:
+        dt = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.timestamp()
+
+
+def project(lat, lng):
+    """经纬度投影到[0, 1)范围的Web墨卡托坐标"""
+    lat = max(min(lat, MAX_LATITUDE), -MAX_LATITUDE)
+    x = (lng + 180.0) / 360.0
+    sin_lat = math.sin(math.radians(lat))
+    y = 0.5 - math.log((1 + sin_lat) / (1 - sin_lat)) / (4 * math.pi)
+    return min(max(x, 0.0), 1.0 - 1e-12), min(max(y, 0.0), 1.0 - 1e-12)
+
+
+def unproject(x, y):
+    """Web墨卡托坐标还原为经纬度"""
+    lng = x * 360.0 - 180.0
+    n = math.pi - 2 * math.pi * y
+    lat = math.degrees(math.atan(math.sinh(n)))
+    return lat, lng
+
+
+class HeatmapAggregator:
+    """按时间桶和多级网格增量维护的情绪热力图"""
+
+    def __init__(self, max_zoom=12, cell_bits=3, retention=None):
+        self.max_zoom = max_zoom
+        self.cell_bits = cell_bits
+        # 每种粒度保留的时间桶数量
+        self.retention = retention or {'hour': 48, 'day': 30}
+        # (粒度, 桶起点, z, x, y) -> {(cx, cy): [数量, 强度和, {情绪类型: 强度加权和}]}
+        self._tiles = {}
+        # 瓦片版本号，用于生成ETag；进程重启后版本号重新计数，因此附加实例标识
+        self._versions = {}
+        self._generation = f'{datetime.now(timezone.utc).timestamp():.6f}'
+        # 情绪ID -> (已写入的聚合位置, 类型, 强度, 来源字段)，删除和更新时无需再次查询原始数据
+        self._members = {}
+        self._lock = threading.RLock()
+        self._loaded = False
+        self._load_lock = threading.Lock()
+        self._last_prune = 0.0
+
+    # ==================== 写入 ====================
+
+    def ensure_loaded(self, loader):
+        """首次使用时通过loader批量加载历史情绪"""
+        if self._loaded:
+            return
+        with self._load_lock:
+            if self._loaded:
+                return
+            for emotion in loader(self.oldest_timestamp()):
+                self.add(emotion)
+            self._loaded = True
+
+    def oldest_timestamp(self, now=None):
+        """需要保留的最早时间点"""
+        now = now if now is not None else datetime.now(timezone.utc).timestamp()
+        return min(now - GRANULARITIES[g] * self.retention[g] for g in GRANULARITIES)
+
+    def rebuild(self, loader):
+        """用loader重新聚合后整体替换（期间查询仍使用旧数据），尚未加载时不处理"""
+        if not self._loaded:
+            return
+        fresh = HeatmapAggregator(self.max_zoom, self.cell_bits, self.retention)
+        for emotion in loader(fresh.oldest_timestamp()):
+            fresh.add(emotion)
+        with self._lock:
+            self._tiles = fresh._tiles
+            self._members = fresh._members
+            # 版本号随新数据重新计数，同时更换实例标识使旧ETag全部失效
+            self._versions = fresh._versions
+            self._generation = fresh._generation
+
+    def add(self, emotion):
+        """聚合一条公开情绪（按ID幂等，类型、强度、位置或时间变化时替换原有聚合）"""
+        if emotion.get('latitude') is None or emotion.get('longitude') is None:
+            self.remove(emotion['id'])
+            return
+        emotion_id = emotion['id']
+        created_at = parse_timestamp(emotion['created_at'])
+        intensity = float(emotion.get('intensity') or 5)
+        emotion_type = emotion['emotion_type']
+        x, y = project(float(emotion['latitude']), float(emotion['longitude']))
+        source = (created_at, x, y)
+
+        entries = []
+        now = datetime.now(timezone.utc).timestamp()
+        for granularity, size in GRANULARITIES.items():
+            if created_at < now - size * self.retention[granularity]:
+                continue
+            bucket = int(created_at // size * size)
+            entries.extend(self._cell_keys(granularity, bucket, x, y))
+
+        with self._lock:
+            member = self._members.get(emotion_id)
+            if member is not None:
+                if member[1:] == (emotion_type, intensity, source):
+                    return
+                self.remove(emotion_id)
+            for tile_key, cell in entries:
+                self._apply(tile_key, cell, emotion_type, intensity, 1)
+            self._members[emotion_id] = (entries, emotion_type, intensity, source)
+
+    def remove(self, emotion_id):
+        """从聚合中移除一条情绪（删除或改为私密时调用）"""
+        with self._lock:
+            member = self._members.pop(emotion_id, None)
+            if member is None:
+                return
+            entries, emotion_type, intensity, _ = member
+            for tile_key, cell in entries:
+                self._apply(tile_key, cell, emotion_type, intensity, -1)
+
+    def maybe_prune(self, interval=GRANULARITIES['hour']):
+        """距离上次清理超过interval秒时执行清理"""
+        now = datetime.now(timezone.utc).timestamp()
+        if now - self._last_prune >= interval:
+            self.prune(now)
+
+    def prune(self, now=None):
+        """清理超出保留期的时间桶"""
+        now = now if now is not None else datetime.now(timezone.utc).timestamp()
+        with self._lock:
+            self._last_prune = now
+            expired = [
+                key for key in self._tiles
+                if key[1] < now - GRANULARITIES[key[0]] * self.retention[key[0]]
+            ]
+            for key in expired:
+                del self._tiles[key]
+                self._versions.pop(key, None)
+            expired_members = [
+                emotion_id for emotion_id, (entries, _, _, _) in self._members.items()
+                if all(key not in self._tiles for key, _ in entries)
+            ]
+            for emotion_id in expired_members:
+                del self._members[emotion_id]
+
+    def _cell_keys(self, granularity, bucket, x, y):
+        """计算一个点在每一级缩放下所在的瓦片和格子"""
+        full = self.max_zoom + self.cell_bits
+        full_x = int(x * (1 << full))
+        full_y = int(y * (1 << full))
+        mask = (1 << self.cell_bits) - 1
+        keys = []
+        for z in range(self.max_zoom + 1):
+            shift = self.max_zoom - z
+            cx = full_x >> shift
+            cy = full_y >> shift
+            tile_key = (granularity, bucket, z, cx >> self.cell_bits, cy >> self.cell_bits)
+            keys.append((tile_key, (cx & mask, cy & mask)))
+        return keys
+
+    def _apply(self, tile_key, cell_key, emotion_type, intensity, sign):
+        """更新单个格子的统计值"""
+        cells = self._tiles.get(tile_key)
+        if cells is None:
+            if sign < 0:
+                return
+            cells = self._tiles[tile_key] = {}
+        cell = cells.get(cell_key)
+        if cell is None:
+            if sign < 0:
+                return
+            cell = cells[cell_key] = [0, 0.0, {}]
+        cell[0] += sign
+        cell[1] += sign * intensity
+        weights = cell[2]
+        weights[emotion_type] = weights.get(emotion_type, 0.0) + sign * intensity
+        if weights[emotion_type] <= 1e-9:
+            del weights[emotion_type]
+        if cell[0] <= 0:
+            del cells[cell_key]
+            if not cells:
+                del self._tiles[tile_key]
+        self._versions[tile_key] = self._versions.get(tile_key, 0) + 1
+
+    # ==================== 查询 ====================
+
+    def bucket_starts(self, granularity, count, now=None):
+        """最近count个时间桶的起点（从新到旧）"""
+        size = GRANULARITIES[granularity]
+        now = now if now is not None else datetime.now(timezone.utc).timestamp()
+        latest = int(now // size * size)
+        return [latest - i * size for i in range(count)]
+
+    def tile_etag(self, z, x, y, granularity, buckets):
+        """根据瓦片版本号计算ETag，无需组装瓦片内容"""
+        with self._lock:
+            parts = [self._generation, f'{z}/{x}/{y}/{granularity}']
+            for bucket in buckets:
+                version = self._versions.get((granularity, bucket, z, x, y), 0)
+                parts.append(f'{bucket}:{version}')
+        return hashlib.sha1('|'.join(parts).encode('utf-8')).hexdigest()[:20]
+
+    def get_tile(self, z, x, y, granularity, buckets):
+        """合并多个时间桶，返回瓦片内的格子列表"""
+        merged = {}
+        with self._lock:
+            for bucket in buckets:
+                cells = self._tiles.get((granularity, bucket, z, x, y))
+                if not cells:
+                    continue
+                for cell_key, (count, intensity_sum, weights) in cells.items():
+                    target = merged.setdefault(cell_key, [0, 0.0, {}])
+                    target[0] += count
+                    target[1] += intensity_sum
+                    for emotion_type, weight in weights.items():
+                        target[2][emotion_type] = target[2].get(emotion_type, 0.0) + weight
+
+        cell_count = 1 << self.cell_bits
+        scale = 1 << (z + self.cell_bits)
+        result = []
+        for (cx, cy), (count, intensity_sum, weights) in merged.items():
+            lat, lng = unproject((x * cell_count + cx + 0.5) / scale, (y * cell_count + cy + 0.5) / scale)
+            total_weight = sum(weights.values()) or 1.0
+            dominant = max(weights, key=weights.get) if weights else None
+            result.append({
+                'cx': cx,
+                'cy': cy,
+                'latitude': round(lat, 6),
+                'longitude': round(lng, 6),
+                'count': count,
+                'avg_intensity': round(intensity_sum / count, 2) if count else 0,
+                'dominant_type': dominant,
+                'distribution': {
+                    emotion_type: round(weight / total_weight, 4)
+                    for emotion_type, weight in weights.items()
+                }
+            })
+        return result
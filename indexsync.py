@@ -0,0 +1,83 @@
+# 进程内索引同步
+# 热力图、附近、搜索、热门等内存索引只会收到本进程处理的写入；多进程部署时按updated_at定期读取
+# 所有进程写入的情绪变化（包括删除、隐私和类型变化）应用到本进程的索引，并定期在后台完整重建，
+# 覆盖物理删除（清理任务、分区分离）这类不会更新updated_at的变化
+import threading
+import time
+
+from heatmap import parse_timestamp
+
+
+class IndexSync:
+    """按updated_at增量同步并定期重建进程内索引"""
+
+    def __init__(self, fetch_changes, apply_change, interval=30, rebuild_interval=3600, overlap=60):
+        # fetch_changes(since)返回updated_at不早于since的情绪（含已删除和私密情绪）
+        self.fetch_changes = fetch_changes
+        # apply_change(emotion)把一条变化应用到各索引（必须幂等）
+        self.apply_change = apply_change
+        self.interval = interval
+        self.rebuild_interval = rebuild_interval
+        # 每次多读取水位线之前overlap秒的变化，覆盖服务器时钟偏差和较晚提交的事务
+        self.overlap = overlap
+        self._rebuilders = []
+        # 已同步到的updated_at；从进程启动时开始，更早的数据由索引首次加载时读取
+        self._watermark = time.time()
+        self._last_sync = time.monotonic()
+        self._last_rebuild = time.monotonic()
+        self._sync_lock = threading.Lock()
+        self._rebuilding = False
+
+    def register(self, rebuild):
+        """注册索引的完整重建函数rebuild()（索引尚未加载时应直接返回）"""
+        self._rebuilders.append(rebuild)
+
+    def maybe_sync(self):
+        """距离上次同步超过interval秒时应用增量变化，返回应用的数量
+        其他线程正在同步时不等待，直接使用当前索引；到期时在后台线程完整重建"""
+        now = time.monotonic()
+        if now - self._last_sync < self.interval or not self._sync_lock.acquire(blocking=False):
+            return 0
+        try:
+            if now - self._last_sync < self.interval:
+                return 0
+            try:
+                return self.sync()
+            except Exception as e:
+                # 同步失败不影响查询，下个间隔再试
+                self._last_sync = time.monotonic()
+                print(f"同步情绪索引失败: {e}")
+                return 0
+        finally:
+            self._sync_lock.release()
+            if self.rebuild_interval and now - self._last_rebuild >= self.rebuild_interval and not self._rebuilding:
+                self._last_rebuild = now
+                self._rebuilding = True
+                threading.Thread(target=self._rebuild_all, daemon=True).start()
+
+    def sync(self):
+        """读取水位线以来的变化并应用到索引，返回应用的数量"""
+        watermark = self._watermark
+        count = 0
+        for emotion in self.fetch_changes(self._watermark - self.overlap):
+            self.apply_change(emotion)
+            watermark = max(watermark, parse_timestamp(emotion['updated_at']))
+            count += 1
+        self._watermark = watermark
+        self._last_sync = time.monotonic()
+        return count
+
+    def _rebuild_all(self):
+        """后台完整重建各索引
+        重建读取的数据可能早于期间应用到旧索引的增量，完成后把水位线退回到重建开始时，下次同步重新应用"""
+        started = time.time()
+        try:
+            for rebuild in self._rebuilders:
+                try:
+                    rebuild()
+                except Exception as e:
+                    print(f"重建情绪索引失败: {e}")
+            with self._sync_lock:
+                self._watermark = min(self._watermark, started)
+        finally:
+            self._rebuilding = False
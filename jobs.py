@@ -0,0 +1,318 @@
+# 后台任务队列
+# 任务持久化在本地SQLite中，由工作线程池执行；失败按指数退避重试，进程重启后继续执行未完成的任务
+# 多个进程可共用同一个队列：领取任务时写入工作者ID和租约到期时间，执行期间定期续约，
+# 只有租约过期（持有者已退出或卡死）的执行中任务才会被其他工作者重新领取
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import traceback
+import uuid
+
+from config import Config
+
+
+class JobRunner:
+    """轻量级持久化后台任务队列"""
+
+    def __init__(self, db_path, workers=2, max_attempts=5, retry_delay=2, poll_interval=5, startup_delay=0,
+                 lease_seconds=300):
+        self.db_path = db_path
+        self.workers = workers
+        self.max_attempts = max_attempts
+        # 第n次失败后等待 retry_delay * 2^(n-1) 秒再重试
+        self.retry_delay = retry_delay
+        self.poll_interval = poll_interval
+        # 启动后等待startup_delay秒才首次把周期任务入队
+        self.startup_delay = startup_delay
+        # 租约时长，执行中每隔lease_seconds / 3秒续约一次
+        self.lease_seconds = lease_seconds
+        self._instance = uuid.uuid4().hex[:8]
+        # 本工作者正在执行的任务ID
+        self._held = set()
+        self._held_lock = threading.Lock()
+        self._handlers = {}
+        # 任务名 -> (间隔秒数, 参数)，由调度线程定期入队
+        self._periodic = {}
+        self._wakeup = threading.Condition()
+        self._threads = []
+        self._started = False
+        self._stop = False
+        self._stopped = threading.Event()
+        self._init_lock = threading.Lock()
+        self._initialized = False
+
+    @property
+    def worker_id(self):
+        """工作者ID（主机名、进程号和实例标识；fork出的子进程进程号不同）"""
+        return f'{socket.gethostname()}:{os.getpid()}:{self._instance}'
+
+    def register(self, name, handler):
+        """注册任务处理函数handler(payload)"""
+        self._handlers[name] = handler
+
+    def schedule(self, name, interval, payload=None):
+        """每隔interval秒执行一次任务（同名任务尚未完成时不重复入队）"""
+        self._periodic[name] = (interval, payload)
+
+    # ==================== 存储 ====================
+
+    def _connect(self):
+        """打开任务数据库（首次调用时建表）"""
+        if not self._initialized:
+            with self._init_lock:
+                if not self._initialized:
+                    directory = os.path.dirname(self.db_path)
+                    if directory:
+                        os.makedirs(directory, exist_ok=True)
+                    with sqlite3.connect(self.db_path) as conn:
+                        conn.execute('PRAGMA journal_mode=WAL')
+                        conn.execute(
+                            'CREATE TABLE IF NOT EXISTS jobs ('
+                            'id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT NOT NULL, payload TEXT NOT NULL, '
+                            "status TEXT NOT NULL DEFAULT 'pending', attempts INTEGER NOT NULL DEFAULT 0, "
+                            'run_at REAL NOT NULL, last_error TEXT, created_at REAL NOT NULL, '
+                            'worker_id TEXT, lease_expires_at REAL)'
+                        )
+                        conn.execute('CREATE INDEX IF NOT EXISTS idx_jobs_due ON jobs(status, run_at)')
+                        conn.execute('CREATE INDEX IF NOT EXISTS idx_jobs_lease ON jobs(status, lease_expires_at)')
+                    # 任务参数可能包含访问令牌，只允许当前用户读写
+                    os.chmod(self.db_path, 0o600)
+                    self._initialized = True
+        return sqlite3.connect(self.db_path, timeout=10, isolation_level=None)
+
+    def enqueue(self, name, payload=None, delay=0):
+        """添加任务，返回任务ID"""
+        now = time.time()
+        conn = self._connect()
+        try:
+            cursor = conn.execute(
+                'INSERT INTO jobs (name, payload, run_at, created_at) VALUES (?, ?, ?, ?)',
+                (name, json.dumps(payload or {}), now + delay, now)
+            )
+            job_id = cursor.lastrowid
+        finally:
+            conn.close()
+        with self._wakeup:
+            self._wakeup.notify_all()
+        return job_id
+
+    def _claim(self):
+        """取出一个到期任务（或租约已过期的执行中任务）并以本工作者的租约标记为执行中"""
+        conn = self._connect()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            now = time.time()
+            # 租约过期说明上一次执行没有完成（进程崩溃或卡死），计为一次失败的执行
+            expired = conn.execute(
+                "SELECT id, attempts FROM jobs WHERE status = 'running' AND lease_expires_at <= ?",
+                (now,)
+            ).fetchall()
+            for job_id, attempts in expired:
+                if attempts + 1 >= self.max_attempts:
+                    conn.execute(
+                        "UPDATE jobs SET status = 'failed', attempts = ?, last_error = ?, payload = '{}', "
+                        'worker_id = NULL, lease_expires_at = NULL WHERE id = ?',
+                        (attempts + 1, '执行中断（租约过期）', job_id)
+                    )
+                else:
+                    conn.execute(
+                        "UPDATE jobs SET status = 'pending', attempts = ?, last_error = ?, run_at = ?, "
+                        'worker_id = NULL, lease_expires_at = NULL WHERE id = ?',
+                        (attempts + 1, '执行中断（租约过期）', now, job_id)
+                    )
+            row = conn.execute(
+                "SELECT id, name, payload, attempts FROM jobs WHERE status = 'pending' AND run_at <= ? "
+                'ORDER BY run_at LIMIT 1',
+                (now,)
+            ).fetchone()
+            if row is not None:
+                conn.execute(
+                    "UPDATE jobs SET status = 'running', worker_id = ?, lease_expires_at = ? WHERE id = ?",
+                    (self.worker_id, now + self.lease_seconds, row[0])
+                )
+                with self._held_lock:
+                    self._held.add(row[0])
+            conn.execute('COMMIT')
+            return row
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        finally:
+            conn.close()
+
+    def _renew_leases(self):
+        """延长本工作者正在执行的任务的租约"""
+        with self._held_lock:
+            held = list(self._held)
+        if not held:
+            return
+        conn = self._connect()
+        try:
+            conn.executemany(
+                "UPDATE jobs SET lease_expires_at = ? WHERE id = ? AND status = 'running' AND worker_id = ?",
+                [(time.time() + self.lease_seconds, job_id, self.worker_id) for job_id in held]
+            )
+        finally:
+            conn.close()
+
+    def _finish(self, job_id, attempts, error=None):
+        """任务成功时删除，失败时安排重试或标记为失败（租约已被其他工作者接管时不做修改）"""
+        with self._held_lock:
+            self._held.discard(job_id)
+        conn = self._connect()
+        try:
+            if error is None:
+                conn.execute('DELETE FROM jobs WHERE id = ? AND worker_id = ?', (job_id, self.worker_id))
+            elif attempts >= self.max_attempts:
+                # 失败的任务不再需要参数（可能包含令牌），只保留错误信息
+                conn.execute(
+                    "UPDATE jobs SET status = 'failed', attempts = ?, last_error = ?, payload = '{}', "
+                    'worker_id = NULL, lease_expires_at = NULL WHERE id = ? AND worker_id = ?',
+                    (attempts, error, job_id, self.worker_id)
+                )
+            else:
+                conn.execute(
+                    "UPDATE jobs SET status = 'pending', attempts = ?, last_error = ?, run_at = ?, "
+                    'worker_id = NULL, lease_expires_at = NULL WHERE id = ? AND worker_id = ?',
+                    (attempts, error, time.time() + self.retry_delay * 2 ** (attempts - 1), job_id, self.worker_id)
+                )
+        finally:
+            conn.close()
+
+    def enqueue_unique(self, name, payload=None):
+        """没有同名的待执行/执行中任务时入队，返回是否入队
+        检查和插入在同一条语句中完成，多个进程同时调用时只会入队一次"""
+        now = time.time()
+        conn = self._connect()
+        try:
+            cursor = conn.execute(
+                'INSERT INTO jobs (name, payload, run_at, created_at) SELECT ?, ?, ?, ? '
+                "WHERE NOT EXISTS (SELECT 1 FROM jobs WHERE name = ? AND status IN ('pending', 'running'))",
+                (name, json.dumps(payload or {}), now, now, name)
+            )
+            inserted = cursor.rowcount == 1
+        finally:
+            conn.close()
+        if inserted:
+            with self._wakeup:
+                self._wakeup.notify_all()
+        return inserted
+
+    def _next_run_at(self):
+        """最近一个待执行任务（或执行中任务租约过期）的时间"""
+        conn = self._connect()
+        try:
+            row = conn.execute(
+                "SELECT MIN(CASE WHEN status = 'pending' THEN run_at ELSE lease_expires_at END) FROM jobs "
+                "WHERE status IN ('pending', 'running')"
+            ).fetchone()
+            return row[0]
+        finally:
+            conn.close()
+
+    # ==================== 执行 ====================
+
+    def start(self):
+        """启动工作线程（重复调用无影响）；上次中断的任务在租约过期后重新领取"""
+        if self._started:
+            return
+        self._started = True
+        self._connect().close()
+        thread = threading.Thread(target=self._heartbeat, name='job-heartbeat', daemon=True)
+        thread.start()
+        self._threads.append(thread)
+        for index in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f'job-worker-{index}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        if self._periodic:
+            thread = threading.Thread(target=self._run_periodic, name='job-scheduler', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self):
+        """通知工作线程退出"""
+        self._stop = True
+        self._stopped.set()
+        with self._wakeup:
+            self._wakeup.notify_all()
+
+    def run_pending(self):
+        """在当前线程执行所有到期任务（用于命令行和调试），返回执行数量"""
+        count = 0
+        while self._run_one():
+            count += 1
+        return count
+
+    def _work(self):
+        while not self._stop:
+            try:
+                if self._run_one():
+                    continue
+                next_run_at = self._next_run_at()
+                timeout = self.poll_interval if next_run_at is None else min(max(next_run_at - time.time(), 0.05), self.poll_interval)
+            except Exception as e:
+                print(f"后台任务队列错误: {e}")
+                timeout = self.poll_interval
+            with self._wakeup:
+                self._wakeup.wait(timeout)
+
+    def _heartbeat(self):
+        """续约线程：执行时间较长的任务不会被其他工作者当作中断任务重新领取"""
+        while not self._stop:
+            try:
+                self._renew_leases()
+            except Exception as e:
+                print(f"后台任务续约失败: {e}")
+            self._stopped.wait(self.lease_seconds / 3)
+
+    def _run_periodic(self):
+        """调度线程：启动startup_delay秒后和每个间隔到期时把周期任务入队"""
+        first_run = time.time() + self.startup_delay
+        next_runs = {name: first_run for name in self._periodic}
+        while not self._stop:
+            now = time.time()
+            for name, (interval, payload) in self._periodic.items():
+                if next_runs[name] <= now:
+                    try:
+                        self.enqueue_unique(name, payload)
+                        next_runs[name] = now + interval
+                    except Exception as e:
+                        print(f"周期任务{name}入队失败: {e}")
+                        next_runs[name] = now + self.poll_interval
+            timeout = max(min(next_runs.values()) - time.time(), 0.05)
+            with self._wakeup:
+                self._wakeup.wait(timeout)
+
+    def _run_one(self):
+        """执行一个到期任务，没有到期任务时返回False"""
+        row = self._claim()
+        if row is None:
+            return False
+        job_id, name, payload, attempts = row
+        handler = self._handlers.get(name)
+        try:
+            if handler is None:
+                raise LookupError(f'未注册的任务: {name}')
+            handler(json.loads(payload))
+        except Exception as e:
+            print(f"后台任务{name}执行失败（第{attempts + 1}次）: {e}")
+            traceback.print_exc()
+            self._finish(job_id, attempts + 1, f'{type(e).__name__}: {e}')
+        else:
+            self._finish(job_id, attempts + 1)
+        return True
+
+
+# 全局任务队列（由app启动）
+job_runner = JobRunner(
+    Config.JOB_QUEUE_PATH,
+    workers=Config.JOB_WORKERS,
+    max_attempts=Config.JOB_MAX_ATTEMPTS,
+    retry_delay=Config.JOB_RETRY_DELAY,
+    startup_delay=Config.JOB_PERIODIC_STARTUP_DELAY,
+    lease_seconds=Config.JOB_LEASE_SECONDS
+)
@@ -0,0 +1,131 @@
+# 写操作限流
+# 令牌桶：每个(路由, 用户/IP)一个桶，容量为允许的突发数量，按固定速率补充令牌
+import os
+import sqlite3
+import threading
+import time
+
+
+def refill(tokens, updated_at, now, capacity, rate):
+    """按经过的时间补充令牌，返回当前令牌数"""
+    return min(capacity, tokens + (now - updated_at) * rate)
+
+
+class MemoryBucketStore:
+    """进程内令牌桶存储
+    CPython没有CAS原语，这里按key哈希分片加锁，不同key之间互不阻塞，临界区只有几次浮点运算"""
+
+    def __init__(self, shards=64, max_keys=100000):
+        self._shards = [({}, threading.Lock()) for _ in range(shards)]
+        self.max_keys_per_shard = max(max_keys // shards, 1)
+
+    def take(self, keys, capacity, rate, now=None):
+        """所有key都有令牌时各取出一个并返回0，否则不取出任何令牌，返回需要等待的秒数"""
+        now = now if now is not None else time.monotonic()
+        # 按分片序号加锁，避免不同请求交叉加锁死锁
+        indexes = sorted({hash(key) % len(self._shards) for key in keys})
+        locks = [self._shards[index][1] for index in indexes]
+        for lock in locks:
+            lock.acquire()
+        try:
+            states = []
+            for key in keys:
+                buckets = self._shards[hash(key) % len(self._shards)][0]
+                state = buckets.get(key)
+                tokens = capacity if state is None else refill(state[0], state[1], now, capacity, rate)
+                states.append((buckets, key, state, tokens))
+            wait = max((1 - tokens) / rate for _, _, _, tokens in states) if states else 0
+            if wait > 0:
+                return wait
+            for buckets, key, state, tokens in states:
+                if state is None and len(buckets) >= self.max_keys_per_shard:
+                    self._prune(buckets, now, capacity, rate)
+                buckets[key] = (tokens - 1, now)
+            return 0
+        finally:
+            for lock in reversed(locks):
+                lock.release()
+
+    @staticmethod
+    def _prune(buckets, now, capacity, rate):
+        """清理已经补满的桶（补满后与不存在等价）"""
+        full_after = capacity / rate
+        for key in [k for k, (_, updated_at) in buckets.items() if now - updated_at >= full_after]:
+            del buckets[key]
+
+
+class SQLiteBucketStore:
+    """基于SQLite的共享令牌桶存储，多个进程（如多个gunicorn worker）共享限流状态
+    每个桶记录补满的时刻，补满后与不存在等价，定期删除"""
+
+    def __init__(self, db_path, prune_interval=60):
+        self.db_path = db_path
+        self.prune_interval = prune_interval
+        self._next_prune = 0.0
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with sqlite3.connect(db_path) as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS token_buckets ('
+                'key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated_at REAL NOT NULL, full_at REAL NOT NULL)'
+            )
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_token_buckets_full_at ON token_buckets(full_at)')
+        self._local = threading.local()
+
+    def _connection(self):
+        """每个线程复用一个连接"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=5, isolation_level=None)
+            self._local.conn = conn
+        return conn
+
+    def take(self, keys, capacity, rate, now=None):
+        """所有key都有令牌时各取出一个并返回0，否则不取出任何令牌，返回需要等待的秒数"""
+        # 跨进程共享时使用墙上时间
+        now = now if now is not None else time.time()
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            balances = []
+            for key in keys:
+                row = conn.execute('SELECT tokens, updated_at FROM token_buckets WHERE key = ?', (key,)).fetchone()
+                balances.append(capacity if row is None else refill(row[0], row[1], now, capacity, rate))
+            wait = max((1 - tokens) / rate for tokens in balances) if balances else 0
+            if wait <= 0:
+                wait = 0
+                for key, tokens in zip(keys, balances):
+                    conn.execute(
+                        'INSERT OR REPLACE INTO token_buckets (key, tokens, updated_at, full_at) VALUES (?, ?, ?, ?)',
+                        (key, tokens - 1, now, now + (capacity - tokens + 1) / rate)
+                    )
+            if now >= self._next_prune:
+                self._next_prune = now + self.prune_interval
+                conn.execute('DELETE FROM token_buckets WHERE full_at <= ?', (now,))
+            conn.execute('COMMIT')
+            return wait
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+
+class RateLimiter:
+    """按路由预算对多个身份（用户ID、IP）同时限流"""
+
+    def __init__(self, store, limits):
+        self.store = store
+        # 路由名 -> {'capacity': 突发数量, 'window': 补满所需秒数}
+        self.limits = limits
+
+    def hit(self, route, identities):
+        """记录一次请求：全部身份都有令牌时各扣除一个并返回0，
+        否则不扣除任何身份的令牌（被拒绝的请求不消耗其他身份的额度），返回建议的重试等待秒数"""
+        limit = self.limits.get(route)
+        if not limit:
+            return 0
+        capacity = limit['capacity']
+        rate = capacity / limit['window']
+        keys = [f'{route}:{identity}' for identity in identities if identity is not None]
+        return self.store.take(keys, capacity, rate)
@@ -0,0 +1,169 @@
+# 情绪内容全文搜索
+# 进程内倒排索引：中文按单字和相邻双字切分，其他文字按单词切分，BM25打分排序
+import math
+import re
+import threading
+
+from heatmap import parse_timestamp
+
+# 中日韩统一表意文字及常用扩展区
+CJK_PATTERN = re.compile(r'[㐀-䶿一-鿿豈-﫿]+')
+WORD_PATTERN = re.compile(r'[㐀-䶿一-鿿豈-﫿]+|[0-9a-z]+')
+
+# BM25参数
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+
+def tokenize(text, for_query=False):
+    """切分文本；索引时中文同时生成单字和双字，查询时长度大于1的中文片段只用双字"""
+    tokens = []
+    for match in WORD_PATTERN.finditer((text or '').lower()):
+        piece = match.group()
+        if not CJK_PATTERN.fullmatch(piece):
+            tokens.append(piece)
+            continue
+        bigrams = [piece[i:i + 2] for i in range(len(piece) - 1)]
+        if for_query:
+            tokens.extend(bigrams or [piece])
+        else:
+            tokens.extend(piece)
+            tokens.extend(bigrams)
+    return tokens
+
+
+def document_meta(emotion):
+    """搜索过滤使用的字段"""
+    return {
+        'user_id': emotion.get('user_id'),
+        'privacy_setting': emotion.get('privacy_setting', 'public'),
+        'emotion_type': emotion['emotion_type'],
+        'created_at': parse_timestamp(emotion['created_at'])
+    }
+
+
+def document_payload(emotion):
+    """搜索结果返回的字段"""
+    return {
+        'id': emotion['id'],
+        'user_id': emotion.get('user_id'),
+        'emotion_type': emotion['emotion_type'],
+        'content': emotion.get('content', ''),
+        'custom_emoji': emotion.get('custom_emoji'),
+        'intensity': emotion.get('intensity', 5),
+        'latitude': emotion.get('latitude'),
+        'longitude': emotion.get('longitude'),
+        'privacy_setting': emotion.get('privacy_setting', 'public'),
+        'created_at': emotion['created_at']
+    }
+
+
+class SearchIndex:
+    """情绪内容倒排索引"""
+
+    def __init__(self):
+        # 词 -> {情绪ID: 词频}
+        self._postings = {}
+        # 情绪ID -> (词列表, 文档长度, 过滤字段, 返回数据)
+        self._docs = {}
+        self._total_length = 0
+        self._lock = threading.RLock()
+        self._loaded = False
+        self._load_lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._docs)
+
+    def ensure_loaded(self, loader):
+        """首次使用时通过loader批量加载情绪"""
+        if self._loaded:
+            return
+        with self._load_lock:
+            if self._loaded:
+                return
+            for emotion in loader():
+                self.add(emotion)
+            self._loaded = True
+
+    def rebuild(self, loader):
+        """用loader重新加载后整体替换（期间查询仍使用旧数据），尚未加载时不处理"""
+        if not self._loaded:
+            return
+        fresh = SearchIndex()
+        for emotion in loader():
+            fresh.add(emotion)
+        with self._lock:
+            self._postings = fresh._postings
+            self._docs = fresh._docs
+            self._total_length = fresh._total_length
+
+    def add(self, emotion):
+        """索引或重新索引一条情绪"""
+        tokens = tokenize(emotion.get('content'))
+        frequencies = {}
+        for token in tokens:
+            frequencies[token] = frequencies.get(token, 0) + 1
+        meta = document_meta(emotion)
+        payload = document_payload(emotion)
+        with self._lock:
+            self.remove(emotion['id'])
+            for token, count in frequencies.items():
+                self._postings.setdefault(token, {})[emotion['id']] = count
+            self._docs[emotion['id']] = (list(frequencies), len(tokens), meta, payload)
+            self._total_length += len(tokens)
+
+    def remove(self, emotion_id):
+        """从索引中移除一条情绪"""
+        with self._lock:
+            doc = self._docs.pop(emotion_id, None)
+            if doc is None:
+                return
+            terms, length, _, _ = doc
+            for token in terms:
+                posting = self._postings.get(token)
+                if posting is not None:
+                    posting.pop(emotion_id, None)
+                    if not posting:
+                        del self._postings[token]
+            self._total_length -= length
+
+    def search(self, query, accept=None, page=1, limit=20):
+        """搜索包含全部查询词的情绪，accept(meta)用于过滤，返回(当前页结果, 总数)"""
+        terms = list(dict.fromkeys(tokenize(query, for_query=True)))
+        if not terms:
+            return [], 0
+        with self._lock:
+            postings = [self._postings.get(term) for term in terms]
+            if not all(postings):
+                return [], 0
+            # 从最短的倒排表开始求交集
+            postings.sort(key=len)
+            candidates = set(postings[0])
+            for posting in postings[1:]:
+                candidates.intersection_update(posting)
+                if not candidates:
+                    return [], 0
+
+            doc_count = len(self._docs)
+            avg_length = self._total_length / doc_count if doc_count else 1.0
+            idf = [math.log(1 + (doc_count - len(p) + 0.5) / (len(p) + 0.5)) for p in postings]
+            scored = []
+            for emotion_id in candidates:
+                _, length, meta, _ = self._docs[emotion_id]
+                if accept is not None and not accept(meta):
+                    continue
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * length / avg_length)
+                score = 0.0
+                for posting, weight in zip(postings, idf):
+                    tf = posting[emotion_id]
+                    score += weight * tf * (BM25_K1 + 1) / (tf + norm)
+                scored.append((score, meta['created_at'], emotion_id))
+
+            # 相关度相同时新的情绪排在前面
+            scored.sort(reverse=True)
+            offset = (page - 1) * limit
+            results = [
+                dict(self._docs[emotion_id][3], score=round(score, 4))
+                for score, _, emotion_id in scored[offset:offset + limit]
+            ]
+        return results, len(scored)
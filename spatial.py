@@ -0,0 +1,162 @@
+# 附近情绪查询
+# 按经纬度网格分桶的内存空间索引，查询时从所在格子向外逐圈扩展，用haversine距离筛选最近的k条情绪
+import heapq
+import math
+import threading
+
+# 地球平均半径（公里）
+EARTH_RADIUS_KM = 6371.0088
+# 每度纬度对应的距离（公里）
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180.0
+
+
+def haversine_km(lat1, lng1, lat2, lng2):
+    """计算两点之间的球面距离（公里）"""
+    phi1 = math.radians(lat1)
+    phi2 = math.radians(lat2)
+    d_phi = phi2 - phi1
+    d_lambda = math.radians(lng2 - lng1)
+    a = math.sin(d_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+class NearbyIndex:
+    """网格分桶的公开情绪空间索引"""
+
+    def __init__(self, cell_degrees=0.05):
+        self.cell_degrees = cell_degrees
+        self.columns = int(math.ceil(360.0 / cell_degrees))
+        self.rows = int(math.ceil(180.0 / cell_degrees))
+        # (行, 列) -> {情绪ID: (纬度, 经度)}
+        self._cells = {}
+        # 情绪ID -> (格子, 纬度, 经度, 返回数据)
+        self._points = {}
+        self._lock = threading.RLock()
+        self._loaded = False
+        self._load_lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._points)
+
+    def ensure_loaded(self, loader):
+        """首次使用时通过loader批量加载公开情绪"""
+        if self._loaded:
+            return
+        with self._load_lock:
+            if self._loaded:
+                return
+            for emotion in loader():
+                self.add(emotion)
+            self._loaded = True
+
+    def rebuild(self, loader):
+        """用loader重新加载后整体替换（期间查询仍使用旧数据），尚未加载时不处理"""
+        if not self._loaded:
+            return
+        fresh = NearbyIndex(self.cell_degrees)
+        for emotion in loader():
+            fresh.add(emotion)
+        with self._lock:
+            self._cells = fresh._cells
+            self._points = fresh._points
+
+    def _cell(self, lat, lng):
+        row = min(int((lat + 90.0) / self.cell_degrees), self.rows - 1)
+        column = int((lng + 180.0) / self.cell_degrees) % self.columns
+        return row, column
+
+    def add(self, emotion):
+        """加入或更新一条情绪"""
+        if emotion.get('latitude') is None or emotion.get('longitude') is None:
+            self.remove(emotion['id'])
+            return
+        lat = float(emotion['latitude'])
+        lng = float(emotion['longitude'])
+        payload = {
+            'id': emotion['id'],
+            'emotion_type': emotion['emotion_type'],
+            'custom_emoji': emotion.get('custom_emoji'),
+            'intensity': emotion.get('intensity', 5),
+            'content': emotion.get('content', ''),
+            'latitude': lat,
+            'longitude': lng,
+            'created_at': emotion['created_at']
+        }
+        cell = self._cell(lat, lng)
+        with self._lock:
+            self.remove(emotion['id'])
+            self._cells.setdefault(cell, {})[emotion['id']] = (lat, lng)
+            self._points[emotion['id']] = (cell, lat, lng, payload)
+
+    def remove(self, emotion_id):
+        """移除一条情绪"""
+        with self._lock:
+            point = self._points.pop(emotion_id, None)
+            if point is None:
+                return
+            cell = point[0]
+            members = self._cells.get(cell)
+            if members is not None:
+                members.pop(emotion_id, None)
+                if not members:
+                    del self._cells[cell]
+
+    def _ring(self, row, column, radius):
+        """返回与中心格子切比雪夫距离为radius的所有格子"""
+        if radius == 0:
+            yield row, column
+            return
+        for d_row in range(-radius, radius + 1):
+            r = row + d_row
+            if r < 0 or r >= self.rows:
+                continue
+            if abs(d_row) == radius:
+                d_columns = range(-radius, radius + 1)
+            else:
+                d_columns = (-radius, radius)
+            for d_column in d_columns:
+                yield r, (column + d_column) % self.columns
+
+    def _ring_lower_bound_km(self, lat, radius):
+        """第radius圈内任意一点到查询点的距离下界（公里）"""
+        if radius <= 1:
+            return 0.0
+        gap = (radius - 1) * self.cell_degrees
+        # 经度方向的距离随纬度收缩，取该圈可能到达的最高纬度计算
+        max_lat = min(abs(lat) + radius * self.cell_degrees, 90.0)
+        shrink = max(math.cos(math.radians(max_lat)), 0.0)
+        return gap * KM_PER_DEGREE * min(1.0, shrink)
+
+    def query(self, lat, lng, k=20, radius_km=5.0):
+        """查询距离(lat, lng)最近且在radius_km以内的k条情绪，按距离升序返回"""
+        row, column = self._cell(lat, lng)
+        # 最多需要扩展的圈数（高纬度时经度方向格子变窄，按收缩后的宽度计算）
+        shrink = max(math.cos(math.radians(min(abs(lat) + radius_km / KM_PER_DEGREE, 89.0))), 0.01)
+        max_radius = min(
+            int(math.ceil(radius_km / (KM_PER_DEGREE * self.cell_degrees * shrink))) + 1,
+            self.columns // 2
+        )
+        # 以负距离保存的大顶堆，堆顶是当前第k近的情绪
+        best = []
+        with self._lock:
+            for radius in range(max_radius + 1):
+                bound = self._ring_lower_bound_km(lat, radius)
+                if bound > radius_km or (len(best) >= k and bound > -best[0][0]):
+                    break
+                for cell in self._ring(row, column, radius):
+                    members = self._cells.get(cell)
+                    if not members:
+                        continue
+                    for emotion_id, (p_lat, p_lng) in members.items():
+                        distance = haversine_km(lat, lng, p_lat, p_lng)
+                        if distance > radius_km:
+                            continue
+                        if len(best) < k:
+                            heapq.heappush(best, (-distance, emotion_id))
+                        elif distance < -best[0][0]:
+                            heapq.heapreplace(best, (-distance, emotion_id))
+            best.sort(reverse=True)
+            return [
+                dict(self._points[emotion_id][3], distance_km=round(-neg_distance, 3))
+                for neg_distance, emotion_id in best
+            ]
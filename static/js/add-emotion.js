@@ -159,12 +159,12 @@ class AddEmotionPage {
         locationInfo.innerHTML = `已选择位置：纬度 ${lat.toFixed(6)}, 经度 ${lng.toFixed(6)}<br>正在获取地址信息...`;
         
         try {
-            // 使用反向地理编码获取地址
-            const response = await fetch(`https://nominatim.openstreetmap.org/reverse?format=json&lat=${lat}&lon=${lng}&zoom=18&addressdetails=1`);
+            // 通过服务端缓存的反向地理编码获取地址
+            const response = await fetch(`/api/geocode/reverse?lat=${lat}&lng=${lng}`);
             const data = await response.json();
             
-            if (data && data.display_name) {
-                locationInfo.innerHTML = `已选择位置：${data.display_name}`;
+            if (response.ok && (data.display_name || data.place_name)) {
+                locationInfo.textContent = `已选择位置：${data.display_name || data.place_name}`;
             } else {
                 locationInfo.innerHTML = `已选择位置：纬度 ${lat.toFixed(6)}, 经度 ${lng.toFixed(6)}`;
             }
@@ -88,7 +88,11 @@ class EmotionDetail {
     // 加载情绪数据
     async loadEmotionData() {
         try {
-            const response = await fetch(`/api/emotions/${this.emotionId}`);
+            // 情绪类型与情绪数据并行加载，渲染时两者都已就绪
+            const [response] = await Promise.all([
+                fetch(`/api/emotions/${this.emotionId}`),
+                EmotionTypes.load()
+            ]);
             if (response.ok) {
                 const data = await response.json();
                 this.updateEmotionData(data.emotion);
@@ -438,46 +442,12 @@ class EmotionDetail {
 
     // 获取情绪表情
     getEmotionEmoji(emotionType, customEmoji = null) {
-        if (emotionType === 'custom' && customEmoji) {
-            return customEmoji;
-        }
-        
-        const emojis = {
-            'happy': '😊',
-            'sad': '😢',
-            'angry': '😠',
-            'excited': '🤩',
-            'calm': '😌',
-            'anxious': '😰',
-            'love': '😍',
-            'tired': '😴',
-            'surprised': '😲',
-            'confused': '😕',
-            'grateful': '🙏',
-            'lonely': '😔',
-            'custom': '🎭'
-        };
-        return emojis[emotionType] || '😐';
+        return EmotionTypes.emoji(emotionType, customEmoji);
     }
 
     // 获取情绪名称
     getEmotionName(emotionType) {
-        const names = {
-            'happy': '开心',
-            'sad': '难过',
-            'angry': '愤怒',
-            'excited': '兴奋',
-            'calm': '平静',
-            'anxious': '焦虑',
-            'love': '恋爱',
-            'tired': '疲惫',
-            'surprised': '惊讶',
-            'confused': '困惑',
-            'grateful': '感恩',
-            'lonely': '孤独',
-            'custom': '自定义'
-        };
-        return names[emotionType] || '其他';
+        return EmotionTypes.name(emotionType);
     }
 
     // 格式化时间
@@ -0,0 +1,51 @@
+// 情绪类型：从服务端注册表(/api/emotion-types)加载，各页面脚本不再各自维护类型列表
+// 地址带注册表版本号(?v=)，由页面的script标签data-url属性提供，浏览器可长期缓存
+const EmotionTypes = {
+    // 类型代码 -> {id, code, name, emoji, color}
+    byCode: new Map(),
+    url: (typeof document !== 'undefined' && document.currentScript && document.currentScript.dataset.url) || '/api/emotion-types',
+    ready: null,
+
+    // 加载类型列表（每个页面只请求一次）；失败时列表为空，各页面按未知类型显示
+    load() {
+        if (!this.ready) {
+            this.ready = fetch(this.url)
+                .then(response => {
+                    if (!response.ok) {
+                        throw new Error('获取情绪类型失败');
+                    }
+                    return response.json();
+                })
+                .then(data => {
+                    (data.types || []).forEach(item => this.byCode.set(item.code, item));
+                    return this;
+                })
+                .catch(error => {
+                    console.error('加载情绪类型失败:', error);
+                    return this;
+                });
+        }
+        return this.ready;
+    },
+
+    // 类型信息，未知类型返回null
+    get(code) {
+        return this.byCode.get(code) || null;
+    },
+
+    // 显示用的表情：自定义类型优先使用用户选择的表情
+    emoji(code, customEmoji = null, fallback = '😐') {
+        if (code === 'custom' && customEmoji) {
+            return customEmoji;
+        }
+        const item = this.get(code);
+        return item ? item.emoji : fallback;
+    },
+
+    name(code, fallback = '其他') {
+        const item = this.get(code);
+        return item ? item.name : fallback;
+    }
+};
+
+EmotionTypes.load();
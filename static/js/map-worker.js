@@ -0,0 +1,34 @@
+// 地图数据解析Worker
+// 在后台线程请求并解析情绪列表，过滤无坐标的记录后按块发回主线程，主线程只负责创建标记
+const CHUNK_SIZE = 500;
+
+let controller = null;
+
+self.onmessage = async (event) => {
+    const { requestId, url } = event.data;
+    
+    // 新的请求到达时取消上一个未完成的请求
+    if (controller) {
+        controller.abort();
+    }
+    controller = new AbortController();
+    const signal = controller.signal;
+    
+    try {
+        const response = await fetch(url, { credentials: 'same-origin', signal: signal });
+        if (!response.ok) {
+            throw new Error(`获取情绪数据失败: HTTP ${response.status}`);
+        }
+        
+        const data = await response.json();
+        const emotions = (data.emotions || []).filter(emotion => emotion.latitude && emotion.longitude);
+        for (let start = 0; start < emotions.length; start += CHUNK_SIZE) {
+            self.postMessage({ requestId, type: 'chunk', emotions: emotions.slice(start, start + CHUNK_SIZE) });
+        }
+        self.postMessage({ requestId, type: 'done', total: emotions.length });
+    } catch (error) {
+        if (error.name !== 'AbortError') {
+            self.postMessage({ requestId, type: 'error', message: error.message });
+        }
+    }
+};
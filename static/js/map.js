@@ -3,10 +3,20 @@ class EmotionMap {
     constructor(containerId) {
         this.containerId = containerId;
         this.map = null;
-        this.emotionMarkers = [];
+        // 情绪ID -> {marker, emotion}，筛选切换时复用已创建的标记（按最近使用排序，超过MAX_MARKERS时淘汰）
+        this.emotionMarkers = new Map();
+        // 当前显示在聚合图层中的情绪ID
+        this.visibleIds = new Set();
         this.markerCluster = null;
         this.currentFilter = 'all';
         this.currentTimeFilter = 'all';
+        // 同一类型/强度档位的标记共享图标实例
+        this.iconCache = new Map();
+        // 精灵图样式是否已加载（首次创建图标时检测）
+        this.spriteLoaded = null;
+        this.worker = null;
+        this.renderPass = null;
+        this.loadSeq = 0;
         this.userLocation = null;
         this.userLocationMarker = null;
         
@@ -42,6 +52,8 @@ class EmotionMap {
             // 初始化标记聚合器
             this.markerCluster = L.markerClusterGroup({
                 chunkedLoading: true,
+                // chunkedLoading下插件每连续处理chunkInterval毫秒让出一次主线程，其余标记在之后的定时器中添加
+                chunkInterval: EmotionMap.FRAME_BUDGET_MS,
                 maxClusterRadius: 80
             });
             this.map.addLayer(this.markerCluster);
@@ -52,9 +64,12 @@ class EmotionMap {
             // 绑定筛选事件
             this.bindFilterEvents();
             
-            // 地图加载完成后加载情绪数据
+            // 创建数据解析Worker
+            this.worker = this.createWorker();
+            
+            // 地图和情绪类型都加载完成后加载情绪数据（标记图标按类型的颜色和表情生成）
             this.map.whenReady(() => {
-                this.loadEmotions();
+                EmotionTypes.load().then(() => this.loadEmotions()).catch(() => {});
             });
             
             console.log('Leaflet地图初始化成功');
@@ -131,73 +146,265 @@ class EmotionMap {
         }
     }
 
-    // 加载情绪数据
-    async loadEmotions() {
+    // 加载情绪数据（类型和时间筛选由服务端按索引完成，响应在Worker中解析）
+    loadEmotions() {
+        const params = new URLSearchParams({ limit: EmotionMap.MAX_MARKERS });
+        if (this.currentFilter !== 'all') {
+            params.set('type', this.currentFilter);
+        }
+        if (this.currentTimeFilter !== 'all') {
+            params.set('time_filter', this.currentTimeFilter);
+        }
+        
+        // 筛选快速切换时作废上一次未完成的加载，避免旧结果覆盖新结果
+        if (this.renderPass) {
+            this.renderPass.cancelled = true;
+            this.renderPass.resolve();
+        }
+        const pass = {
+            id: ++this.loadSeq,
+            url: `/api/emotions?${params}`,
+            nextIds: new Set(),
+            chunks: [],
+            finished: false,
+            cancelled: false,
+            scheduled: false
+        };
+        pass.promise = new Promise((resolve, reject) => {
+            pass.resolve = resolve;
+            pass.reject = reject;
+        });
+        this.renderPass = pass;
+        
+        if (this.worker) {
+            this.worker.postMessage({ requestId: pass.id, url: pass.url });
+        } else {
+            this.fetchOnMainThread(pass);
+        }
+        return pass.promise;
+    }
+
+    // 创建解析Worker，浏览器不支持时返回null（退回主线程解析）
+    createWorker() {
+        if (typeof Worker === 'undefined') {
+            return null;
+        }
+        try {
+            const worker = new Worker(EmotionMap.WORKER_URL);
+            worker.onmessage = (event) => this.handleWorkerMessage(event.data);
+            worker.onerror = (error) => {
+                console.warn('地图Worker不可用，改为主线程解析:', error.message);
+                worker.terminate();
+                this.worker = null;
+                const pass = this.renderPass;
+                if (pass && !pass.finished && !pass.cancelled) {
+                    this.fetchOnMainThread(pass);
+                }
+            };
+            return worker;
+        } catch (error) {
+            console.warn('创建地图Worker失败:', error);
+            return null;
+        }
+    }
+
+    // 处理Worker发回的分块数据
+    handleWorkerMessage(message) {
+        const pass = this.renderPass;
+        if (!pass || message.requestId !== pass.id) {
+            return;
+        }
+        if (message.type === 'chunk') {
+            pass.chunks.push(message.emotions);
+            this.scheduleRender(pass);
+        } else if (message.type === 'done') {
+            pass.finished = true;
+            this.scheduleRender(pass);
+        } else if (message.type === 'error') {
+            this.failRender(pass, new Error(message.message));
+        }
+    }
+
+    // 不支持Worker时在主线程请求和解析，之后同样分块渲染
+    async fetchOnMainThread(pass) {
         try {
-            const response = await fetch('/api/emotions');
+            const response = await fetch(pass.url);
             if (!response.ok) {
                 throw new Error('获取情绪数据失败');
             }
             
             const data = await response.json();
-            this.displayEmotions(data.emotions || []);
+            const emotions = data.emotions || [];
+            for (let start = 0; start < emotions.length; start += EmotionMap.LAYER_CHUNK_SIZE) {
+                pass.chunks.push(emotions.slice(start, start + EmotionMap.LAYER_CHUNK_SIZE));
+            }
+            pass.finished = true;
+            this.scheduleRender(pass);
         } catch (error) {
-            console.error('加载情绪数据失败:', error);
+            this.failRender(pass, error);
+        }
+    }
+
+    scheduleRender(pass) {
+        if (!pass.scheduled && !pass.cancelled) {
+            pass.scheduled = true;
+            requestAnimationFrame(() => this.renderFrame(pass));
         }
     }
 
-    // 显示情绪数据
-    displayEmotions(emotions) {
-        // 清除现有标记
-        this.emotionMarkers = [];
-        this.markerCluster.clearLayers();
+    // 每帧逐块创建标记并addLayers，超过时间预算后不再开始新的分块，剩余分块留到下一帧
+    // 预算只在分块之间检查，单个分块的耗时不受限制
+    renderFrame(pass) {
+        pass.scheduled = false;
+        if (pass.cancelled) {
+            return;
+        }
+        
+        const deadline = performance.now() + EmotionMap.FRAME_BUDGET_MS;
+        while (pass.chunks.length && performance.now() < deadline) {
+            const toAdd = [];
+            pass.chunks.shift().forEach(emotion => {
+                if (!emotion.latitude || !emotion.longitude) {
+                    return;
+                }
+                pass.nextIds.add(emotion.id);
+                let item = this.emotionMarkers.get(emotion.id);
+                if (!item) {
+                    item = { marker: this.createEmotionMarker(emotion), emotion: emotion };
+                } else {
+                    item.emotion = emotion;
+                    // 重新插入，移到最近使用的一端
+                    this.emotionMarkers.delete(emotion.id);
+                }
+                this.emotionMarkers.set(emotion.id, item);
+                if (!this.visibleIds.has(emotion.id)) {
+                    this.visibleIds.add(emotion.id);
+                    toAdd.push(item.marker);
+                }
+            });
+            if (toAdd.length) {
+                this.markerCluster.addLayers(toAdd);
+            }
+        }
         
-        emotions.forEach(emotion => {
-            if (emotion.latitude && emotion.longitude) {
-                const marker = this.createEmotionMarker(emotion);
-                this.emotionMarkers.push({
-                    marker: marker,
-                    emotion: emotion
-                });
-                this.markerCluster.addLayer(marker);
+        if (pass.chunks.length) {
+            this.scheduleRender(pass);
+        } else if (pass.finished) {
+            this.finishRender(pass);
+        }
+    }
+
+    // 全部数据渲染后分批移除不再符合筛选条件的标记
+    async finishRender(pass) {
+        const stale = [];
+        this.visibleIds.forEach(id => {
+            if (!pass.nextIds.has(id)) {
+                stale.push(id);
             }
         });
+        
+        for (let start = 0; start < stale.length; start += EmotionMap.LAYER_CHUNK_SIZE) {
+            if (start > 0) {
+                await new Promise(resolve => requestAnimationFrame(resolve));
+            }
+            if (pass.cancelled) {
+                return;
+            }
+            const ids = stale.slice(start, start + EmotionMap.LAYER_CHUNK_SIZE);
+            this.markerCluster.removeLayers(ids.map(id => this.emotionMarkers.get(id).marker));
+            ids.forEach(id => this.visibleIds.delete(id));
+        }
+        this.evictMarkers();
+        
+        if (this.renderPass === pass) {
+            this.renderPass = null;
+        }
+        pass.resolve();
+    }
+
+    // 缓存的标记超过MAX_MARKERS时，从最久未使用的一端淘汰当前不显示的标记
+    evictMarkers() {
+        let excess = this.emotionMarkers.size - EmotionMap.MAX_MARKERS;
+        for (const [id, item] of this.emotionMarkers) {
+            if (excess <= 0) {
+                break;
+            }
+            if (!this.visibleIds.has(id)) {
+                item.marker.off();
+                this.emotionMarkers.delete(id);
+                excess--;
+            }
+        }
+    }
+
+    failRender(pass, error) {
+        if (pass.cancelled) {
+            return;
+        }
+        pass.cancelled = true;
+        if (this.renderPass === pass) {
+            this.renderPass = null;
+        }
+        console.error('加载情绪数据失败:', error);
+        pass.reject(error);
+    }
+
+    // 获取情绪图标：同一类型、强度档位（自定义情绪还区分表情）的标记共享一个图标实例
+    getEmotionIcon(emotion) {
+        const bucket = EmotionMap.intensityBucket(emotion.intensity);
+        const customEmoji = emotion.emotion_type === 'custom' ? (emotion.custom_emoji || '') : '';
+        const key = `${emotion.emotion_type}|${bucket}|${customEmoji}`;
+        let icon = this.iconCache.get(key);
+        if (!icon) {
+            const emotionConfig = this.getEmotionConfig(emotion.emotion_type, emotion.custom_emoji);
+            const size = EmotionMap.ICON_SIZES[bucket];
+            if (this.spriteLoaded === null) {
+                this.spriteLoaded = EmotionMap.isSpriteLoaded();
+            }
+            // 预置类型从精灵图取图标，整张地图只加载一张图片；自定义表情仍按文字显示
+            const glyphSize = Math.round(size * 0.6);
+            const content = this.spriteLoaded && !customEmoji && EmotionTypes.get(emotion.emotion_type)
+                ? `<span class="emotion-sprite emotion-sprite-${emotion.emotion_type}" style="width: ${glyphSize}px; height: ${glyphSize}px;"></span>`
+                : this.escapeHtml(emotionConfig.emoji);
+            icon = L.divIcon({
+                html: `
+                    <div style="
+                        width: ${size}px; 
+                        height: ${size}px; 
+                        background: ${emotionConfig.color}; 
+                        border: 2px solid white; 
+                        border-radius: 50%; 
+                        display: flex; 
+                        align-items: center; 
+                        justify-content: center; 
+                        font-size: ${Math.round(size / 2)}px;
+                        box-shadow: 0 2px 4px rgba(0,0,0,0.2);
+                    ">${content}</div>
+                `,
+                className: 'emotion-marker',
+                iconSize: [size, size],
+                iconAnchor: [size / 2, size / 2],
+                popupAnchor: [0, -size / 2]
+            });
+            this.iconCache.set(key, icon);
+        }
+        return icon;
     }
 
     // 创建情绪标记
     createEmotionMarker(emotion) {
         const emotionConfig = this.getEmotionConfig(emotion.emotion_type, emotion.custom_emoji);
-        
-        // 创建自定义图标
-        const emotionIcon = L.divIcon({
-            html: `
-                <div style="
-                    width: 32px; 
-                    height: 32px; 
-                    background: ${emotionConfig.color}; 
-                    border: 2px solid white; 
-                    border-radius: 50%; 
-                    display: flex; 
-                    align-items: center; 
-                    justify-content: center; 
-                    font-size: 16px;
-                    box-shadow: 0 2px 4px rgba(0,0,0,0.2);
-                ">${emotionConfig.emoji}</div>
-            `,
-            className: 'emotion-marker',
-            iconSize: [32, 32],
-            iconAnchor: [16, 16],
-            popupAnchor: [0, -16]
-        });
+        const emotionIcon = this.getEmotionIcon(emotion);
         
         const marker = L.marker([emotion.latitude, emotion.longitude], { 
             icon: emotionIcon,
             title: emotionConfig.name
         });
         
-        // 添加点击事件
+        // 添加点击事件（使用最近一次加载的情绪数据）
         marker.on('click', () => {
-            this.showEmotionPopup(emotion, marker);
+            const item = this.emotionMarkers.get(emotion.id);
+            this.showEmotionPopup(item ? item.emotion : emotion, marker);
         });
         
         return marker;
@@ -205,19 +412,14 @@ class EmotionMap {
 
     // 获取情绪配置
     getEmotionConfig(emotionType, customEmoji = null) {
-        const configs = {
-            happy: { name: '开心', emoji: '😊', color: '#FFD700' },
-            sad: { name: '难过', emoji: '😢', color: '#4169E1' },
-            angry: { name: '愤怒', emoji: '😠', color: '#FF4500' },
-            excited: { name: '兴奋', emoji: '🤩', color: '#FF69B4' },
-            calm: { name: '平静', emoji: '😌', color: '#98FB98' },
-            anxious: { name: '焦虑', emoji: '😰', color: '#DDA0DD' },
-            grateful: { name: '感激', emoji: '🙏', color: '#F0E68C' },
-            lonely: { name: '孤独', emoji: '😔', color: '#708090' },
-            custom: { name: '自定义', emoji: customEmoji || '🎭', color: '#9370DB' }
-        };
-        
-        return configs[emotionType] || { name: '未知', emoji: '❓', color: '#808080' };
+        const config = EmotionTypes.get(emotionType);
+        if (!config) {
+            return { name: '未知', emoji: '❓', color: '#808080' };
+        }
+        if (emotionType === 'custom' && customEmoji) {
+            return { ...config, emoji: customEmoji };
+        }
+        return config;
     }
 
     // 显示情绪弹窗
@@ -276,7 +478,7 @@ class EmotionMap {
                         <span class="emotion-emoji">${emotionConfig.emoji}</span>
                         <div class="emotion-info">
                             <h3>${emotionConfig.name}</h3>
-                            <p class="emotion-time">${timeAgo}</p>
+                            <p class="emotion-time">${timeAgo}${emotion.place_name ? ` · ${this.escapeHtml(emotion.place_name)}` : ''}</p>
                         </div>
                     </div>
                     ${emotion.emotion_text ? `<div class="emotion-text">${this.escapeHtml(emotion.emotion_text)}</div>` : ''}
@@ -483,45 +685,10 @@ class EmotionMap {
         }
     }
 
-    // 应用筛选
+    // 应用筛选：按新的筛选条件向服务端重新查询，增量更新标记
     applyFilters() {
-        this.markerCluster.clearLayers();
-        
-        const filteredMarkers = this.emotionMarkers.filter(item => {
-            const emotion = item.emotion;
-            
-            // 情绪类型筛选
-            if (this.currentFilter !== 'all' && emotion.emotion_type !== this.currentFilter) {
-                return false;
-            }
-            
-            // 时间筛选
-            if (this.currentTimeFilter !== 'all') {
-                const emotionTime = new Date(emotion.created_at);
-                const now = new Date();
-                const diffHours = (now - emotionTime) / (1000 * 60 * 60);
-                
-                switch (this.currentTimeFilter) {
-                    case '1h':
-                        if (diffHours > 1) return false;
-                        break;
-                    case '6h':
-                        if (diffHours > 6) return false;
-                        break;
-                    case '24h':
-                        if (diffHours > 24) return false;
-                        break;
-                    case '7d':
-                        if (diffHours > 168) return false;
-                        break;
-                }
-            }
-            
-            return true;
-        });
-        
-        filteredMarkers.forEach(item => {
-            this.markerCluster.addLayer(item.marker);
+        return this.loadEmotions().catch(() => {
+            this.showNotification('加载情绪数据失败，请检查网络连接', 'error');
         });
     }
 
@@ -529,11 +696,13 @@ class EmotionMap {
     addEmotion(emotion) {
         if (emotion.latitude && emotion.longitude) {
             const marker = this.createEmotionMarker(emotion);
-            this.emotionMarkers.push({
+            this.emotionMarkers.set(emotion.id, {
                 marker: marker,
                 emotion: emotion
             });
+            this.visibleIds.add(emotion.id);
             this.markerCluster.addLayer(marker);
+            this.evictMarkers();
             
             // 移动地图到新位置
             this.map.setView([emotion.latitude, emotion.longitude], 15);
@@ -599,8 +768,9 @@ class EmotionMap {
                 this.markerCluster.clearLayers();
             }
             
-            // 清空情绪标记数组
-            this.emotionMarkers = [];
+            // 清空情绪标记
+            this.emotionMarkers.clear();
+            this.visibleIds.clear();
             
             // 重置筛选器
             this.currentFilter = 'all';
@@ -789,6 +959,34 @@ class EmotionMap {
     }
 }
 
+// 强度(1-10)分为低/中/高三档，对应不同的图标尺寸
+EmotionMap.intensityBucket = function(intensity) {
+    const value = Number(intensity) || 5;
+    return value <= 3 ? 0 : (value <= 7 ? 1 : 2);
+};
+
+// 检测generate_icon.py生成的精灵图样式是否已随页面加载
+EmotionMap.isSpriteLoaded = function() {
+    const probe = document.createElement('span');
+    probe.className = 'emotion-sprite';
+    document.body.appendChild(probe);
+    const loaded = /url\(/.test(window.getComputedStyle(probe).backgroundImage || '');
+    probe.remove();
+    return loaded;
+};
+
+// 单次加载的最大情绪数量，也是缓存的标记数量上限
+EmotionMap.MAX_MARKERS = 1000;
+// 每批增删的标记数量
+EmotionMap.LAYER_CHUNK_SIZE = 500;
+// 每帧开始新分块的时间预算（毫秒）
+EmotionMap.FRAME_BUDGET_MS = 8;
+// 各强度档位的图标尺寸（像素）
+EmotionMap.ICON_SIZES = [28, 32, 38];
+// 解析Worker脚本地址（由页面的script标签data-worker属性提供）
+EmotionMap.WORKER_URL = (typeof document !== 'undefined' && document.currentScript && document.currentScript.dataset.worker)
+    || '/static/js/map-worker.js';
+
 // 全局地图实例
 let emotionMap = null;
 
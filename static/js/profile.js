@@ -133,6 +133,8 @@ class ProfileManager {
 
     // 加载标签页内容
     async loadTabContent() {
+        // 各标签页按情绪类型显示表情和名称
+        await EmotionTypes.load();
         switch (this.currentTab) {
             case 'my-emotions':
                 await this.loadMyEmotions();
@@ -605,38 +607,12 @@ class ProfileManager {
 
     // 获取情绪表情
     getEmotionEmoji(emotionType, customEmoji = null) {
-        if (emotionType === 'custom' && customEmoji) {
-            return customEmoji;
-        }
-        
-        const emojis = {
-            'happy': '😊',
-            'sad': '😢',
-            'angry': '😠',
-            'excited': '🤩',
-            'calm': '😌',
-            'anxious': '😰',
-            'grateful': '🙏',
-            'lonely': '😔',
-            'custom': '🎭'
-        };
-        return emojis[emotionType] || '😐';
+        return EmotionTypes.emoji(emotionType, customEmoji);
     }
 
     // 获取情绪名称
     getEmotionName(emotionType) {
-        const names = {
-            'happy': '开心',
-            'sad': '难过',
-            'angry': '愤怒',
-            'excited': '兴奋',
-            'calm': '平静',
-            'anxious': '焦虑',
-            'grateful': '感激',
-            'lonely': '孤独',
-            'custom': '自定义'
-        };
-        return names[emotionType] || '其他';
+        return EmotionTypes.name(emotionType);
     }
 
     // 格式化时间
@@ -0,0 +1,98 @@
+-- 评论楼中楼：一次查询加载一页评论线程
+-- 使用递归CTE从一页顶层评论向下展开回复，限制深度，并在每层递归内限制每个线程的回复数量
+
+-- 1. 回复查询按(parent_id, created_at)读取子评论
+CREATE INDEX IF NOT EXISTS idx_comments_parent_created
+    ON comments(parent_id, created_at)
+    WHERE is_deleted = false;
+
+-- 2. 顶层评论分页查询
+CREATE INDEX IF NOT EXISTS idx_comments_emotion_roots
+    ON comments(emotion_id, created_at DESC)
+    WHERE parent_id IS NULL AND is_deleted = false;
+
+-- 3. 创建评论线程查询函数
+--    返回按路径（深度优先）排序的扁平行，客户端按parent_id一次遍历组装成树
+CREATE OR REPLACE FUNCTION get_comment_threads(
+    p_emotion_id BIGINT,
+    p_viewer_id UUID DEFAULT NULL,
+    p_limit INTEGER DEFAULT 20,
+    p_offset INTEGER DEFAULT 0,
+    p_max_depth INTEGER DEFAULT 3,
+    p_max_replies INTEGER DEFAULT 50
+)
+RETURNS TABLE (
+    id BIGINT,
+    parent_id BIGINT,
+    root_id BIGINT,
+    depth INTEGER,
+    user_id UUID,
+    content TEXT,
+    created_at TIMESTAMP WITH TIME ZONE,
+    updated_at TIMESTAMP WITH TIME ZONE,
+    username VARCHAR,
+    display_name VARCHAR,
+    avatar_url TEXT,
+    likes_count BIGINT,
+    is_liked BOOLEAN,
+    thread_size BIGINT
+) AS $$
+    WITH RECURSIVE roots AS (
+        SELECT c.id, c.created_at
+        FROM comments c
+        WHERE c.emotion_id = p_emotion_id
+          AND c.parent_id IS NULL
+          AND c.is_deleted = false
+        ORDER BY c.created_at DESC
+        LIMIT p_limit OFFSET p_offset
+    ),
+    tree AS (
+        SELECT r.id, NULL::BIGINT AS parent_id, r.id AS root_id, r.created_at AS root_created_at,
+               0 AS depth, ARRAY[r.id] AS path
+        FROM roots r
+        UNION ALL
+        -- 每一层在递归内部截断：每个父评论最多读取p_max_replies + 1条回复（走parent_created索引），
+        -- 同一线程同一层最多保留p_max_replies + 1条，多出的一条只用于判断是否还有更多回复
+        SELECT x.id, x.parent_id, x.root_id, x.root_created_at, x.depth, x.path
+        FROM (
+            SELECT c.id, c.parent_id, t.root_id, t.root_created_at, t.depth + 1 AS depth, t.path || c.id AS path,
+                   row_number() OVER (PARTITION BY t.root_id ORDER BY t.path, c.id) AS level_rank
+            FROM tree t
+            CROSS JOIN LATERAL (
+                SELECT r.id, r.parent_id, r.created_at
+                FROM comments r
+                WHERE r.parent_id = t.id
+                  AND r.is_deleted = false
+                ORDER BY r.created_at
+                LIMIT p_max_replies + 1
+            ) c
+            WHERE t.depth < p_max_depth
+        ) x
+        WHERE x.level_rank <= p_max_replies + 1
+    ),
+    numbered AS (
+        -- 深度优先顺序编号，截断时保留的一定是完整的前缀子树
+        SELECT tree.*,
+               row_number() OVER (PARTITION BY tree.root_id ORDER BY tree.path) - 1 AS reply_rank,
+               -- 已读取的回复数（每层截断后），大于p_max_replies表示还有未返回的回复
+               count(*) OVER (PARTITION BY tree.root_id) - 1 AS thread_size
+        FROM tree
+    )
+    SELECT n.id, n.parent_id, n.root_id, n.depth,
+           c.user_id, c.content, c.created_at, c.updated_at,
+           u.username, u.display_name, u.avatar_url,
+           (SELECT count(*) FROM comment_likes cl WHERE cl.comment_id = n.id) AS likes_count,
+           (p_viewer_id IS NOT NULL AND EXISTS (
+               SELECT 1 FROM comment_likes cl WHERE cl.comment_id = n.id AND cl.user_id = p_viewer_id
+           )) AS is_liked,
+           n.thread_size
+    FROM numbered n
+    JOIN comments c ON c.id = n.id
+    LEFT JOIN users u ON u.user_id = c.user_id
+    WHERE n.reply_rank <= p_max_replies
+    ORDER BY n.root_created_at DESC, n.path;
+$$ LANGUAGE sql STABLE;
+
+-- 4. 授权
+GRANT EXECUTE ON FUNCTION get_comment_threads(BIGINT, UUID, INTEGER, INTEGER, INTEGER, INTEGER) TO anon;
+GRANT EXECUTE ON FUNCTION get_comment_threads(BIGINT, UUID, INTEGER, INTEGER, INTEGER, INTEGER) TO authenticated;
@@ -0,0 +1,85 @@
+-- 情绪详情和评论创建的单次调用函数
+-- 原先的情绪详情需要6次请求（情绪+作者、3次计数、2次点赞/收藏检查），创建评论需要插入后再查询一次
+
+-- 1. 情绪详情：一行返回情绪、作者、三项计数和当前用户的点赞/收藏状态
+CREATE OR REPLACE FUNCTION emotion_detail(
+    p_emotion_id BIGINT,
+    p_viewer_id UUID DEFAULT NULL
+)
+RETURNS TABLE (
+    id BIGINT,
+    user_id UUID,
+    emotion_type TEXT,
+    content TEXT,
+    custom_emoji TEXT,
+    intensity INTEGER,
+    latitude DOUBLE PRECISION,
+    longitude DOUBLE PRECISION,
+    privacy_setting TEXT,
+    created_at TIMESTAMP WITH TIME ZONE,
+    updated_at TIMESTAMP WITH TIME ZONE,
+    username TEXT,
+    display_name TEXT,
+    avatar_url TEXT,
+    likes_count BIGINT,
+    collections_count BIGINT,
+    comments_count BIGINT,
+    is_liked BOOLEAN,
+    is_collected BOOLEAN
+) AS $$
+    SELECT e.id, e.user_id, e.emotion_type::TEXT, e.content, e.custom_emoji::TEXT, e.intensity,
+           e.latitude::DOUBLE PRECISION, e.longitude::DOUBLE PRECISION, e.privacy_setting::TEXT,
+           e.created_at, e.updated_at,
+           u.username::TEXT, u.display_name::TEXT, u.avatar_url,
+           (SELECT count(*) FROM likes l WHERE l.emotion_id = e.id),
+           (SELECT count(*) FROM collections c WHERE c.emotion_id = e.id),
+           (SELECT count(*) FROM comments m WHERE m.emotion_id = e.id AND m.is_deleted = false),
+           (p_viewer_id IS NOT NULL AND EXISTS (
+               SELECT 1 FROM likes l WHERE l.emotion_id = e.id AND l.user_id = p_viewer_id
+           )),
+           (p_viewer_id IS NOT NULL AND EXISTS (
+               SELECT 1 FROM collections c WHERE c.emotion_id = e.id AND c.user_id = p_viewer_id
+           ))
+    FROM emotions e
+    LEFT JOIN users u ON u.user_id = e.user_id
+    WHERE e.id = p_emotion_id
+      AND e.is_deleted = false;
+$$ LANGUAGE sql STABLE;
+
+-- 2. 创建评论：插入并在同一语句中返回带作者信息的评论
+CREATE OR REPLACE FUNCTION create_comment_with_author(
+    p_emotion_id BIGINT,
+    p_user_id UUID,
+    p_content TEXT,
+    p_parent_id BIGINT DEFAULT NULL
+)
+RETURNS TABLE (
+    id BIGINT,
+    parent_id BIGINT,
+    user_id UUID,
+    content TEXT,
+    created_at TIMESTAMP WITH TIME ZONE,
+    updated_at TIMESTAMP WITH TIME ZONE,
+    username TEXT,
+    display_name TEXT,
+    avatar_url TEXT
+) AS $$
+    WITH inserted AS (
+        INSERT INTO comments (emotion_id, user_id, parent_id, content, created_at, updated_at)
+        VALUES (p_emotion_id, p_user_id, p_parent_id, p_content, NOW(), NOW())
+        RETURNING comments.id, comments.parent_id, comments.user_id, comments.content,
+                  comments.created_at, comments.updated_at
+    )
+    SELECT i.id, i.parent_id, i.user_id, i.content, i.created_at, i.updated_at,
+           u.username::TEXT, u.display_name::TEXT, u.avatar_url
+    FROM inserted i
+    LEFT JOIN users u ON u.user_id = i.user_id;
+$$ LANGUAGE sql VOLATILE;
+
+-- 3. 授权（create_comment_with_author只由服务端使用service role调用）
+GRANT EXECUTE ON FUNCTION emotion_detail(BIGINT, UUID) TO anon;
+GRANT EXECUTE ON FUNCTION emotion_detail(BIGINT, UUID) TO authenticated;
+--    Supabase默认把新函数的执行权限直接授予anon和authenticated，只撤销PUBLIC不够
+REVOKE EXECUTE ON FUNCTION create_comment_with_author(BIGINT, UUID, TEXT, BIGINT) FROM PUBLIC;
+REVOKE EXECUTE ON FUNCTION create_comment_with_author(BIGINT, UUID, TEXT, BIGINT) FROM anon, authenticated;
+GRANT EXECUTE ON FUNCTION create_comment_with_author(BIGINT, UUID, TEXT, BIGINT) TO service_role;
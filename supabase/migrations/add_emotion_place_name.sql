@@ -0,0 +1,9 @@
+-- 情绪地名字段
+-- 创建情绪时由服务端逆地理编码（带缓存）写入粗粒度地名，列表接口直接返回，无需客户端逐条查询
+
+-- 1. 添加地名字段
+ALTER TABLE emotions
+ADD COLUMN IF NOT EXISTS place_name TEXT;
+
+-- 2. 字段注释
+COMMENT ON COLUMN emotions.place_name IS '粗粒度地名（城市 区县），创建时根据坐标生成';
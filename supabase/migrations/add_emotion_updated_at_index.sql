@@ -0,0 +1,5 @@
+-- 按updated_at读取情绪变化
+-- 各进程定期查询 WHERE updated_at >= ? ORDER BY updated_at, id，把其他进程写入的删除、隐私和类型变化同步到内存索引
+
+CREATE INDEX IF NOT EXISTS idx_emotions_updated_at
+    ON emotions(updated_at, id);
@@ -0,0 +1,69 @@
+-- 按API实际查询形态建立部分复合索引
+-- 公开情绪列表(/api/emotions): WHERE is_deleted = false AND privacy_setting = 'public'
+--     [AND emotion_type = ?] [AND created_at >= ?] ORDER BY created_at DESC LIMIT ? OFFSET ?
+-- 评论列表: WHERE emotion_id = ? AND is_deleted = false ORDER BY created_at DESC
+-- 收藏列表: WHERE user_id = ? ORDER BY created_at DESC
+-- 点赞/收藏状态和计数: WHERE emotion_id = ? [AND user_id = ?]
+
+-- 1. 公开情绪列表（不按类型过滤）：索引顺序即返回顺序，时间过滤为索引范围扫描
+CREATE INDEX IF NOT EXISTS idx_emotions_public_feed
+    ON emotions(created_at DESC)
+    WHERE is_deleted = false AND privacy_setting = 'public';
+
+-- 2. 公开情绪列表（按类型过滤）
+CREATE INDEX IF NOT EXISTS idx_emotions_public_type_feed
+    ON emotions(emotion_type, created_at DESC)
+    WHERE is_deleted = false AND privacy_setting = 'public';
+
+-- 3. 评论列表
+CREATE INDEX IF NOT EXISTS idx_comments_emotion_created
+    ON comments(emotion_id, created_at DESC)
+    WHERE is_deleted = false;
+
+-- 4. 用户收藏列表
+CREATE INDEX IF NOT EXISTS idx_collections_user_created
+    ON collections(user_id, created_at DESC);
+
+-- 5. 点赞/收藏的(emotion_id, user_id)唯一索引：状态检查走唯一索引，计数走其emotion_id前缀
+--    初始化脚本中的UNIQUE约束已存在时跳过，避免重复索引
+DO $$
+DECLARE
+    target TEXT;
+BEGIN
+    FOREACH target IN ARRAY ARRAY['likes', 'collections'] LOOP
+        IF NOT EXISTS (
+            SELECT 1
+            FROM pg_index i
+            WHERE i.indrelid = to_regclass(target)
+              AND i.indisunique
+              AND i.indkey::TEXT = (
+                  SELECT string_agg(a.attnum::TEXT, ' ' ORDER BY k.ord)
+                  FROM unnest(ARRAY['emotion_id', 'user_id']) WITH ORDINALITY AS k(name, ord)
+                  JOIN pg_attribute a ON a.attrelid = i.indrelid AND a.attname = k.name
+              )
+        ) THEN
+            EXECUTE format(
+                'CREATE UNIQUE INDEX IF NOT EXISTS %I ON %I(emotion_id, user_id)',
+                'idx_' || target || '_emotion_user', target
+            );
+        END IF;
+    END LOOP;
+END $$;
+
+-- 6. 删除已被上面的部分索引取代或已失效的单列索引
+--    is_public列已由privacy_setting取代；低选择性的布尔/枚举单列索引不会被规划器选用
+DROP INDEX IF EXISTS idx_emotions_public;
+DROP INDEX IF EXISTS idx_emotions_privacy;
+DROP INDEX IF EXISTS idx_emotions_is_deleted;
+DROP INDEX IF EXISTS idx_comments_is_deleted;
+--    emotion_id单列索引与(emotion_id, user_id)唯一索引的前缀重复，规划器会优先选用较小的单列索引
+DROP INDEX IF EXISTS idx_likes_emotion_id;
+DROP INDEX IF EXISTS idx_collections_emotion_id;
+--    user_id单列索引已被收藏列表索引的前缀覆盖
+DROP INDEX IF EXISTS idx_collections_user_id;
+
+-- 7. 更新统计信息
+ANALYZE emotions;
+ANALYZE comments;
+ANALYZE likes;
+ANALYZE collections;
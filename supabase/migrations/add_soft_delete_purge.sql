@@ -0,0 +1,103 @@
+-- 软删除情绪的归档和物理删除
+-- 超过保留期的软删除情绪及其评论、评论点赞、点赞、收藏以JSONB形式移入归档表，再从主表删除，
+-- 使主表和索引只包含有效数据；每次调用处理一批，由后台任务定期循环调用
+
+-- 1. 归档表（按行保存JSONB，主表结构变化不影响归档）
+CREATE TABLE IF NOT EXISTS archived_rows (
+    id BIGSERIAL PRIMARY KEY,
+    source_table TEXT NOT NULL,
+    emotion_id TEXT NOT NULL,
+    row_data JSONB NOT NULL,
+    archived_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS idx_archived_rows_emotion ON archived_rows(emotion_id);
+
+-- 2. 待清理情绪按删除时间查找
+CREATE INDEX IF NOT EXISTS idx_emotions_purge
+    ON emotions(deleted_at)
+    WHERE is_deleted = true;
+
+-- 3. 归档并删除一批超过保留期的软删除情绪，返回本批处理的情绪数量
+--    单条语句完成：FOR UPDATE SKIP LOCKED允许多个任务并发执行而不重复处理
+--    保留期不足7天视为误传参数（如0会清空所有软删除数据），直接报错
+CREATE OR REPLACE FUNCTION purge_deleted_emotions(
+    p_retention_days INTEGER DEFAULT 30,
+    p_batch_size INTEGER DEFAULT 500
+)
+RETURNS INTEGER AS $$
+DECLARE
+    v_purged INTEGER;
+BEGIN
+    IF p_retention_days IS NULL OR p_retention_days < 7 THEN
+        RAISE EXCEPTION 'retention must be at least 7 days, got %', p_retention_days
+            USING ERRCODE = 'invalid_parameter_value';
+    END IF;
+    IF p_batch_size IS NULL OR p_batch_size < 1 THEN
+        RAISE EXCEPTION 'batch size must be positive, got %', p_batch_size
+            USING ERRCODE = 'invalid_parameter_value';
+    END IF;
+
+    WITH batch AS (
+        SELECT e.id
+        FROM emotions e
+        WHERE e.is_deleted = true
+          AND e.deleted_at < NOW() - make_interval(days => p_retention_days)
+        ORDER BY e.deleted_at
+        LIMIT p_batch_size
+        FOR UPDATE SKIP LOCKED
+    ),
+    moved_comment_likes AS (
+        DELETE FROM comment_likes cl
+        USING comments c, batch b
+        WHERE cl.comment_id = c.id AND c.emotion_id = b.id
+        RETURNING c.emotion_id, to_jsonb(cl) AS row_data
+    ),
+    moved_comments AS (
+        DELETE FROM comments c
+        USING batch b
+        WHERE c.emotion_id = b.id
+        RETURNING c.emotion_id, to_jsonb(c) AS row_data
+    ),
+    moved_likes AS (
+        DELETE FROM likes l
+        USING batch b
+        WHERE l.emotion_id = b.id
+        RETURNING l.emotion_id, to_jsonb(l) AS row_data
+    ),
+    moved_collections AS (
+        DELETE FROM collections c
+        USING batch b
+        WHERE c.emotion_id = b.id
+        RETURNING c.emotion_id, to_jsonb(c) AS row_data
+    ),
+    moved_emotions AS (
+        DELETE FROM emotions e
+        USING batch b
+        WHERE e.id = b.id
+        RETURNING e.id AS emotion_id, to_jsonb(e) AS row_data
+    ),
+    archived AS (
+        INSERT INTO archived_rows (source_table, emotion_id, row_data)
+        SELECT 'comment_likes', emotion_id::TEXT, row_data FROM moved_comment_likes
+        UNION ALL
+        SELECT 'comments', emotion_id::TEXT, row_data FROM moved_comments
+        UNION ALL
+        SELECT 'likes', emotion_id::TEXT, row_data FROM moved_likes
+        UNION ALL
+        SELECT 'collections', emotion_id::TEXT, row_data FROM moved_collections
+        UNION ALL
+        SELECT 'emotions', emotion_id::TEXT, row_data FROM moved_emotions
+        RETURNING 1
+    )
+    SELECT count(*)::INTEGER INTO v_purged FROM moved_emotions;
+
+    RETURN v_purged;
+END;
+$$ LANGUAGE plpgsql VOLATILE;
+
+-- 4. 授权（只由服务端使用service role调用）
+--    Supabase的默认权限会把新函数直接授予anon和authenticated，只撤销PUBLIC不够
+REVOKE EXECUTE ON FUNCTION purge_deleted_emotions(INTEGER, INTEGER) FROM PUBLIC;
+REVOKE EXECUTE ON FUNCTION purge_deleted_emotions(INTEGER, INTEGER) FROM anon, authenticated;
+GRANT EXECUTE ON FUNCTION purge_deleted_emotions(INTEGER, INTEGER) TO service_role;
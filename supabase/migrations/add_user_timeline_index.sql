@@ -0,0 +1,9 @@
+-- 为用户情绪时间线(/api/user/emotions)添加复合索引
+-- 查询形态: WHERE user_id = ? AND is_deleted = false ORDER BY created_at DESC LIMIT ? OFFSET ?
+
+-- 1. 创建复合索引，覆盖过滤条件和排序
+CREATE INDEX IF NOT EXISTS idx_emotions_user_timeline
+    ON emotions(user_id, is_deleted, created_at DESC);
+
+-- 2. 单列user_id索引已被复合索引的前缀覆盖，删除以减少写入开销
+DROP INDEX IF EXISTS idx_emotions_user_id;
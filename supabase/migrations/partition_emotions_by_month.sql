@@ -0,0 +1,351 @@
+-- 按月对emotions表做范围分区（分区键created_at）
+-- 时间过滤查询（今天/本周/本月、地图的1h/6h/24h/7d）只扫描相关月份的分区；
+-- 旧数据归档变为分离(DETACH)分区，再按需导出和DROP TABLE，不再需要大批量DELETE。
+--
+-- 注意：分区表的主键/唯一约束必须包含分区键，emotions的主键变为(id, created_at)，无法单独保证id唯一，
+-- 也不能再作为外键目标。新增emotion_ids表保存每个情绪的(id, created_at)，由触发器维护：
+-- 其主键保证id唯一，comments/likes/collections指向emotions(id)的外键改为指向emotion_ids(id)。
+-- 分区只能通过detach_emotion_partitions分离（会一并移走评论、点赞、收藏），不要直接DROP仍挂载的分区。
+
+BEGIN;
+
+LOCK TABLE emotions IN ACCESS EXCLUSIVE MODE;
+
+-- 1. 分区键不能为空
+UPDATE emotions SET created_at = COALESCE(updated_at, NOW()) WHERE created_at IS NULL;
+ALTER TABLE emotions ALTER COLUMN created_at SET NOT NULL;
+
+-- 2. 创建分区父表（列、默认值、CHECK约束与原表一致）
+CREATE TABLE emotions_partitioned (
+    LIKE emotions INCLUDING DEFAULTS INCLUDING CONSTRAINTS INCLUDING IDENTITY INCLUDING GENERATED INCLUDING STORAGE INCLUDING COMMENTS
+) PARTITION BY RANGE (created_at);
+
+ALTER TABLE emotions_partitioned ADD PRIMARY KEY (id, created_at);
+
+-- 3. 复制原表的权限和行级安全策略
+DO $$
+DECLARE
+    item RECORD;
+    row_security RECORD;
+BEGIN
+    -- 新表先撤销默认权限（Supabase会把新表直接授权给API角色），再逐条复制原表的授权
+    FOR item IN
+        SELECT DISTINCT a.grantee
+        FROM pg_class c, aclexplode(c.relacl) a
+        WHERE c.oid = 'emotions_partitioned'::regclass AND a.grantee <> c.relowner
+    LOOP
+        EXECUTE format(
+            'REVOKE ALL ON emotions_partitioned FROM %s',
+            CASE WHEN item.grantee = 0 THEN 'PUBLIC' ELSE quote_ident(pg_get_userbyid(item.grantee)) END
+        );
+    END LOOP;
+
+    FOR item IN
+        SELECT a.grantee, a.privilege_type, a.is_grantable
+        FROM pg_class c, aclexplode(c.relacl) a
+        WHERE c.oid = 'emotions'::regclass AND a.grantee <> c.relowner
+    LOOP
+        EXECUTE format(
+            'GRANT %s ON emotions_partitioned TO %s%s',
+            item.privilege_type,
+            CASE WHEN item.grantee = 0 THEN 'PUBLIC' ELSE quote_ident(pg_get_userbyid(item.grantee)) END,
+            CASE WHEN item.is_grantable THEN ' WITH GRANT OPTION' ELSE '' END
+        );
+    END LOOP;
+
+    SELECT relrowsecurity, relforcerowsecurity INTO row_security
+    FROM pg_class
+    WHERE oid = 'emotions'::regclass;
+    IF row_security.relrowsecurity THEN
+        ALTER TABLE emotions_partitioned ENABLE ROW LEVEL SECURITY;
+    END IF;
+    IF row_security.relforcerowsecurity THEN
+        ALTER TABLE emotions_partitioned FORCE ROW LEVEL SECURITY;
+    END IF;
+
+    FOR item IN
+        SELECT
+            pol.polname AS name,
+            CASE WHEN pol.polpermissive THEN 'PERMISSIVE' ELSE 'RESTRICTIVE' END AS kind,
+            CASE pol.polcmd WHEN 'r' THEN 'SELECT' WHEN 'a' THEN 'INSERT' WHEN 'w' THEN 'UPDATE'
+                WHEN 'd' THEN 'DELETE' ELSE 'ALL' END AS command,
+            CASE WHEN pol.polroles = '{0}' THEN 'PUBLIC'
+                ELSE (SELECT string_agg(quote_ident(pg_get_userbyid(r)), ', ') FROM unnest(pol.polroles) AS r) END AS roles,
+            pg_get_expr(pol.polqual, pol.polrelid) AS using_expr,
+            pg_get_expr(pol.polwithcheck, pol.polrelid) AS check_expr
+        FROM pg_policy pol
+        WHERE pol.polrelid = 'emotions'::regclass
+    LOOP
+        EXECUTE format('CREATE POLICY %I ON emotions_partitioned AS %s FOR %s TO %s', item.name, item.kind, item.command, item.roles)
+            || COALESCE(' USING (' || item.using_expr || ')', '')
+            || COALESCE(' WITH CHECK (' || item.check_expr || ')', '');
+    END LOOP;
+END $$;
+
+-- 4. 情绪ID表：id唯一约束和外键目标
+CREATE TABLE emotion_ids (
+    id BIGINT PRIMARY KEY,
+    created_at TIMESTAMP WITH TIME ZONE NOT NULL
+);
+
+INSERT INTO emotion_ids (id, created_at)
+SELECT id, created_at FROM emotions;
+
+-- 只由触发器写入，不对API角色开放
+REVOKE ALL ON emotion_ids FROM PUBLIC;
+REVOKE ALL ON emotion_ids FROM anon, authenticated;
+
+-- 5. 迁移索引和外键
+DO $$
+DECLARE
+    item RECORD;
+BEGIN
+    -- 原表的普通索引（主键和唯一索引除外）在父表上同名重建，自动应用到每个分区
+    FOR item IN
+        SELECT c.relname AS name, pg_get_indexdef(i.indexrelid) AS definition
+        FROM pg_index i
+        JOIN pg_class c ON c.oid = i.indexrelid
+        WHERE i.indrelid = 'emotions'::regclass
+          AND NOT i.indisprimary
+          AND NOT i.indisunique
+    LOOP
+        EXECUTE format('DROP INDEX %I', item.name);
+        EXECUTE regexp_replace(item.definition, ' ON (ONLY )?(\S+\.)?emotions ', ' ON \2emotions_partitioned ');
+    END LOOP;
+
+    -- emotions指向其他表的外键（如user_id）原样复制
+    FOR item IN
+        SELECT conname AS name, pg_get_constraintdef(oid) AS definition
+        FROM pg_constraint
+        WHERE conrelid = 'emotions'::regclass AND contype = 'f'
+    LOOP
+        EXECUTE format('ALTER TABLE emotions DROP CONSTRAINT %I', item.name);
+        EXECUTE format('ALTER TABLE emotions_partitioned ADD CONSTRAINT %I %s', item.name, item.definition);
+    END LOOP;
+
+    -- 其他表指向emotions(id)的外键改为指向emotion_ids(id)，删除行为等定义不变
+    FOR item IN
+        SELECT conrelid::regclass AS source, conname AS name, pg_get_constraintdef(oid) AS definition
+        FROM pg_constraint
+        WHERE confrelid = 'emotions'::regclass AND contype = 'f'
+    LOOP
+        EXECUTE format('ALTER TABLE %s DROP CONSTRAINT %I', item.source, item.name);
+        EXECUTE format(
+            'ALTER TABLE %s ADD CONSTRAINT %I %s',
+            item.source, item.name,
+            regexp_replace(item.definition, 'REFERENCES (\S+\.)?emotions\(', 'REFERENCES \1emotion_ids(')
+        );
+    END LOOP;
+END $$;
+
+-- 6. 自增ID序列交给新表
+DO $$
+DECLARE
+    id_sequence TEXT := pg_get_serial_sequence('emotions', 'id');
+    is_identity BOOLEAN;
+BEGIN
+    SELECT attidentity <> '' INTO is_identity
+    FROM pg_attribute
+    WHERE attrelid = 'emotions'::regclass AND attname = 'id';
+
+    IF is_identity THEN
+        -- 标识列在新表上有独立的序列，从原表的最大ID继续
+        EXECUTE format(
+            'SELECT setval(%L, GREATEST((SELECT MAX(id) FROM emotions), 1))',
+            pg_get_serial_sequence('emotions_partitioned', 'id')
+        );
+    ELSIF id_sequence IS NOT NULL THEN
+        -- SERIAL列的默认值已复制到新表，只需转移序列的归属，避免随原表删除
+        EXECUTE format('ALTER SEQUENCE %s OWNED BY emotions_partitioned.id', id_sequence);
+    END IF;
+END $$;
+
+-- 7. 替换原表
+ALTER TABLE emotions RENAME TO emotions_unpartitioned;
+ALTER TABLE emotions_partitioned RENAME TO emotions;
+
+-- 8. 分区管理函数（由服务端定期调用；以表所有者身份执行，ATTACH/DETACH需要表的所有权）
+-- 创建p_month所在月份（UTC）的分区，已存在时返回NULL
+-- 默认分区中落在该月的数据会被移入新分区；分区只通过父表访问，不对API角色开放
+CREATE OR REPLACE FUNCTION create_emotion_partition(p_month DATE)
+RETURNS TEXT AS $$
+DECLARE
+    month_start DATE := date_trunc('month', p_month)::DATE;
+    range_start TIMESTAMP WITH TIME ZONE := month_start::TIMESTAMP AT TIME ZONE 'UTC';
+    range_end TIMESTAMP WITH TIME ZONE := (month_start + INTERVAL '1 month')::TIMESTAMP AT TIME ZONE 'UTC';
+    partition_name TEXT := 'emotions_p' || to_char(month_start, 'YYYY_MM');
+BEGIN
+    IF to_regclass(partition_name) IS NOT NULL THEN
+        RETURN NULL;
+    END IF;
+
+    -- 先建独立表并填充数据，再挂载为分区（ATTACH只需SHARE UPDATE EXCLUSIVE锁，不阻塞读写）
+    EXECUTE format(
+        'CREATE TABLE %I (LIKE emotions INCLUDING DEFAULTS INCLUDING CONSTRAINTS INCLUDING STORAGE)',
+        partition_name
+    );
+    EXECUTE format('REVOKE ALL ON %I FROM PUBLIC, anon, authenticated', partition_name);
+    IF to_regclass('emotions_default') IS NOT NULL THEN
+        -- 数据只是在分区之间移动，暂停默认分区上的用户触发器，避免emotion_ids被同步删除
+        ALTER TABLE emotions_default DISABLE TRIGGER USER;
+        EXECUTE format(
+            'WITH moved AS (DELETE FROM emotions_default WHERE created_at >= %L AND created_at < %L RETURNING *) '
+            'INSERT INTO %I SELECT * FROM moved',
+            range_start, range_end, partition_name
+        );
+        ALTER TABLE emotions_default ENABLE TRIGGER USER;
+    END IF;
+    EXECUTE format(
+        'ALTER TABLE emotions ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)',
+        partition_name, range_start, range_end
+    );
+    RETURN partition_name;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+-- 创建从当前月份起未来p_months_ahead个月的分区，返回新建的分区名
+CREATE OR REPLACE FUNCTION ensure_emotion_partitions(p_months_ahead INTEGER DEFAULT 3)
+RETURNS SETOF TEXT AS $$
+DECLARE
+    current_month DATE := date_trunc('month', NOW() AT TIME ZONE 'UTC')::DATE;
+    created TEXT;
+BEGIN
+    FOR offset_months IN 0..p_months_ahead LOOP
+        created := create_emotion_partition((current_month + make_interval(months => offset_months))::DATE);
+        IF created IS NOT NULL THEN
+            RETURN NEXT created;
+        END IF;
+    END LOOP;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+-- 分离早于最近p_keep_months个月的分区，返回分离的分区名
+-- 分离后的表保留原名；其情绪的评论点赞、评论、点赞、收藏移入<分区名>_comment_likes等表，
+-- 并从emotion_ids中删除，之后可把这几张表一起导出归档再DROP TABLE
+CREATE OR REPLACE FUNCTION detach_emotion_partitions(p_keep_months INTEGER)
+RETURNS SETOF TEXT AS $$
+DECLARE
+    cutoff DATE := (date_trunc('month', NOW() AT TIME ZONE 'UTC') - make_interval(months => p_keep_months))::DATE;
+    item RECORD;
+    child TEXT;
+BEGIN
+    FOR item IN
+        SELECT c.relname AS name, to_date(substring(c.relname FROM 'emotions_p(\d{4}_\d{2})$'), 'YYYY_MM') AS month_start
+        FROM pg_inherits inh
+        JOIN pg_class c ON c.oid = inh.inhrelid
+        WHERE inh.inhparent = 'emotions'::regclass
+          AND c.relname ~ '^emotions_p\d{4}_\d{2}$'
+        ORDER BY 2
+    LOOP
+        IF item.month_start < cutoff THEN
+            -- 评论点赞经由评论关联到情绪，先于评论移走
+            EXECUTE format(
+                'CREATE TABLE %I (LIKE comment_likes INCLUDING DEFAULTS)', item.name || '_comment_likes'
+            );
+            EXECUTE format(
+                'WITH moved AS (DELETE FROM comment_likes cl USING comments c, %I e '
+                'WHERE cl.comment_id = c.id AND c.emotion_id = e.id RETURNING cl.*) '
+                'INSERT INTO %I SELECT * FROM moved',
+                item.name, item.name || '_comment_likes'
+            );
+            EXECUTE format('REVOKE ALL ON %I FROM PUBLIC, anon, authenticated', item.name || '_comment_likes');
+
+            FOREACH child IN ARRAY ARRAY['comments', 'likes', 'collections'] LOOP
+                EXECUTE format('CREATE TABLE %I (LIKE %I INCLUDING DEFAULTS)', item.name || '_' || child, child);
+                EXECUTE format(
+                    'WITH moved AS (DELETE FROM %I c USING %I e WHERE c.emotion_id = e.id RETURNING c.*) '
+                    'INSERT INTO %I SELECT * FROM moved',
+                    child, item.name, item.name || '_' || child
+                );
+                EXECUTE format('REVOKE ALL ON %I FROM PUBLIC, anon, authenticated', item.name || '_' || child);
+            END LOOP;
+
+            EXECUTE format('DELETE FROM emotion_ids i USING %I e WHERE i.id = e.id', item.name);
+            EXECUTE format('ALTER TABLE emotions DETACH PARTITION %I', item.name);
+            RETURN NEXT item.name;
+        END IF;
+    END LOOP;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+-- 定期维护：预建未来分区，p_keep_months大于0时分离过期分区
+CREATE OR REPLACE FUNCTION maintain_emotion_partitions(
+    p_months_ahead INTEGER DEFAULT 3,
+    p_keep_months INTEGER DEFAULT 0
+)
+RETURNS JSONB AS $$
+    SELECT jsonb_build_object(
+        'created', COALESCE((SELECT jsonb_agg(name) FROM ensure_emotion_partitions(p_months_ahead) AS name), '[]'::JSONB),
+        'detached', CASE WHEN p_keep_months > 0
+            THEN COALESCE((SELECT jsonb_agg(name) FROM detach_emotion_partitions(p_keep_months) AS name), '[]'::JSONB)
+            ELSE '[]'::JSONB END
+    );
+$$ LANGUAGE sql VOLATILE SECURITY DEFINER SET search_path = public;
+
+-- Supabase的默认权限会把新函数直接授予anon和authenticated，只撤销PUBLIC不够
+REVOKE EXECUTE ON FUNCTION create_emotion_partition(DATE) FROM PUBLIC;
+REVOKE EXECUTE ON FUNCTION ensure_emotion_partitions(INTEGER) FROM PUBLIC;
+REVOKE EXECUTE ON FUNCTION detach_emotion_partitions(INTEGER) FROM PUBLIC;
+REVOKE EXECUTE ON FUNCTION maintain_emotion_partitions(INTEGER, INTEGER) FROM PUBLIC;
+REVOKE EXECUTE ON FUNCTION create_emotion_partition(DATE) FROM anon, authenticated;
+REVOKE EXECUTE ON FUNCTION ensure_emotion_partitions(INTEGER) FROM anon, authenticated;
+REVOKE EXECUTE ON FUNCTION detach_emotion_partitions(INTEGER) FROM anon, authenticated;
+REVOKE EXECUTE ON FUNCTION maintain_emotion_partitions(INTEGER, INTEGER) FROM anon, authenticated;
+GRANT EXECUTE ON FUNCTION create_emotion_partition(DATE) TO service_role;
+GRANT EXECUTE ON FUNCTION ensure_emotion_partitions(INTEGER) TO service_role;
+GRANT EXECUTE ON FUNCTION detach_emotion_partitions(INTEGER) TO service_role;
+GRANT EXECUTE ON FUNCTION maintain_emotion_partitions(INTEGER, INTEGER) TO service_role;
+
+-- 9. 为历史数据和未来3个月创建分区，范围外的数据进入默认分区
+CREATE TABLE emotions_default PARTITION OF emotions DEFAULT;
+REVOKE ALL ON emotions_default FROM PUBLIC, anon, authenticated;
+
+SELECT create_emotion_partition(month::DATE)
+FROM generate_series(
+    date_trunc('month', (SELECT MIN(created_at) FROM emotions_unpartitioned) AT TIME ZONE 'UTC'),
+    date_trunc('month', NOW() AT TIME ZONE 'UTC'),
+    INTERVAL '1 month'
+) AS month;
+
+SELECT ensure_emotion_partitions(3);
+
+-- 10. 复制数据并删除原表
+INSERT INTO emotions OVERRIDING SYSTEM VALUE SELECT * FROM emotions_unpartitioned;
+
+DROP TABLE emotions_unpartitioned;
+ALTER TABLE emotions RENAME CONSTRAINT emotions_partitioned_pkey TO emotions_pkey;
+
+-- 11. updated_at触发器
+DROP TRIGGER IF EXISTS update_emotions_updated_at ON emotions;
+CREATE TRIGGER update_emotions_updated_at
+    BEFORE UPDATE ON emotions
+    FOR EACH ROW
+    EXECUTE FUNCTION update_updated_at_column();
+
+-- 12. 情绪插入、删除和修改id/created_at时同步emotion_ids
+--     插入重复id时emotion_ids主键冲突，整条插入失败；删除仍有评论/点赞/收藏的情绪时外键按原定义检查
+--     触发器以表所有者身份写入emotion_ids，API角色没有该表的权限
+CREATE OR REPLACE FUNCTION sync_emotion_ids()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO emotion_ids (id, created_at) VALUES (NEW.id, NEW.created_at);
+    ELSIF TG_OP = 'UPDATE' THEN
+        UPDATE emotion_ids SET id = NEW.id, created_at = NEW.created_at WHERE id = OLD.id;
+    ELSE
+        DELETE FROM emotion_ids WHERE id = OLD.id;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+DROP TRIGGER IF EXISTS sync_emotion_ids ON emotions;
+CREATE TRIGGER sync_emotion_ids
+    AFTER INSERT OR DELETE OR UPDATE OF id, created_at ON emotions
+    FOR EACH ROW
+    EXECUTE FUNCTION sync_emotion_ids();
+
+COMMIT;
+
+-- 13. 更新统计信息
+ANALYZE emotions;
@@ -0,0 +1,130 @@
+# 测试公共配置：把项目根目录加入导入路径（模块平铺在根目录）
+import os
+import sys
+import uuid
+from types import SimpleNamespace
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+MIGRATIONS_DIR = os.path.join(ROOT, 'supabase', 'migrations')
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+
+def run_sql_file(conn, path):
+    """执行一个SQL脚本（脚本自行管理事务）"""
+    with open(path, encoding='utf-8') as f:
+        sql = f.read()
+    with conn.cursor() as cursor:
+        cursor.execute(sql)
+
+
+@pytest.fixture
+def database():
+    """在TEST_DATABASE_URL指向的PostgreSQL中创建独立的临时数据库并建好线上表结构，返回自动提交的连接
+    apply(*names)按顺序执行supabase/migrations中的迁移脚本"""
+    url = os.environ.get('TEST_DATABASE_URL')
+    if not url:
+        pytest.skip('需要设置TEST_DATABASE_URL（可写的PostgreSQL）')
+    psycopg2 = pytest.importorskip('psycopg2')
+    from psycopg2.extensions import make_dsn
+
+    name = f'emotion_test_{uuid.uuid4().hex[:12]}'
+    admin = psycopg2.connect(url)
+    admin.autocommit = True
+    with admin.cursor() as cursor:
+        cursor.execute(f'CREATE DATABASE {name}')
+
+    class MigratedConnection(psycopg2.extensions.connection):
+        def apply(self, *names):
+            for migration in names:
+                run_sql_file(self, os.path.join(MIGRATIONS_DIR, f'{migration}.sql'))
+
+    conn = psycopg2.connect(make_dsn(url, dbname=name), connection_factory=MigratedConnection)
+    conn.autocommit = True
+    try:
+        run_sql_file(conn, os.path.join(FIXTURES_DIR, 'supabase_schema.sql'))
+        yield conn
+    finally:
+        conn.close()
+        with admin.cursor() as cursor:
+            cursor.execute(f'DROP DATABASE IF EXISTS {name} WITH (FORCE)')
+        admin.close()
+
+
+class FakeQuery:
+    """内存表上的Supabase查询构造器，支持API中用到的过滤、排序和分页"""
+
+    def __init__(self, client, table):
+        self.client = client
+        self.table = table
+        self.filters = []
+        self.orders = []
+        self.offset = 0
+        self.count_limit = None
+        self.want_count = False
+
+    def select(self, columns='*', count=None):
+        self.want_count = count is not None
+        return self
+
+    def _filter(self, predicate):
+        self.filters.append(predicate)
+        return self
+
+    def eq(self, column, value):
+        return self._filter(lambda row: row.get(column) == value)
+
+    def gt(self, column, value):
+        return self._filter(lambda row: row.get(column) > value)
+
+    def gte(self, column, value):
+        return self._filter(lambda row: row.get(column) >= value)
+
+    def in_(self, column, values):
+        values = set(values)
+        return self._filter(lambda row: row.get(column) in values)
+
+    def order(self, column, desc=False):
+        self.orders.append((column, desc))
+        return self
+
+    def limit(self, count):
+        self.count_limit = count
+        return self
+
+    def range(self, start, end):
+        self.offset = start
+        self.count_limit = end - start + 1
+        return self
+
+    def execute(self):
+        self.client.calls.append(('table', self.table))
+        rows = [row for row in self.client.tables.get(self.table, []) if all(f(row) for f in self.filters)]
+        for column, desc in reversed(self.orders):
+            rows.sort(key=lambda row: row[column], reverse=desc)
+        total = len(rows)
+        rows = rows[self.offset:]
+        if self.count_limit is not None:
+            rows = rows[:self.count_limit]
+        return SimpleNamespace(data=[dict(row) for row in rows], count=total if self.want_count else None)
+
+
+class FakeSupabase:
+    """替代Supabase客户端：tables为表名 -> 行列表，rpcs为函数名 -> handler(params)，calls记录每次请求"""
+
+    def __init__(self, tables=None, rpcs=None):
+        self.tables = tables or {}
+        self.rpcs = rpcs or {}
+        self.calls = []
+
+    def table(self, name):
+        return FakeQuery(self, name)
+
+    def rpc(self, name, params):
+        self.calls.append(('rpc', name))
+        data = self.rpcs[name](params)
+        return SimpleNamespace(execute=lambda: SimpleNamespace(data=data, count=None))
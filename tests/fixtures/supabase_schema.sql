@@ -0,0 +1,121 @@
+-- 测试用的线上表结构：情绪、评论、点赞、收藏的主键为BIGINT自增（迁移脚本中的函数按BIGINT编写），
+-- 列与init_database.sql及之后的fix_*/add_*迁移叠加后的结果一致；同时重建Supabase的角色和默认权限
+
+-- Supabase的API角色（集群级，已存在时跳过）
+DO $$
+DECLARE
+    role_name TEXT;
+BEGIN
+    FOREACH role_name IN ARRAY ARRAY['anon', 'authenticated', 'service_role'] LOOP
+        IF NOT EXISTS (SELECT 1 FROM pg_roles WHERE rolname = role_name) THEN
+            EXECUTE format('CREATE ROLE %I NOLOGIN', role_name);
+        END IF;
+    END LOOP;
+END $$;
+
+-- Supabase默认把public中新建的表、序列和函数直接授权给三个API角色
+GRANT USAGE ON SCHEMA public TO anon, authenticated, service_role;
+ALTER DEFAULT PRIVILEGES IN SCHEMA public GRANT ALL ON TABLES TO anon, authenticated, service_role;
+ALTER DEFAULT PRIVILEGES IN SCHEMA public GRANT ALL ON SEQUENCES TO anon, authenticated, service_role;
+ALTER DEFAULT PRIVILEGES IN SCHEMA public GRANT ALL ON FUNCTIONS TO anon, authenticated, service_role;
+
+CREATE TABLE users (
+    user_id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+    github_username VARCHAR(255) UNIQUE NOT NULL,
+    username VARCHAR(255) UNIQUE,
+    display_name VARCHAR(255),
+    avatar_url TEXT,
+    bio TEXT DEFAULT '',
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+CREATE TABLE emotions (
+    id BIGSERIAL PRIMARY KEY,
+    user_id UUID REFERENCES users(user_id) ON DELETE SET NULL,
+    latitude DECIMAL(10, 8) NOT NULL,
+    longitude DECIMAL(11, 8) NOT NULL,
+    emotion_type VARCHAR(50) NOT NULL,
+    custom_emoji TEXT,
+    intensity INTEGER DEFAULT 5 CHECK (intensity >= 1 AND intensity <= 10),
+    content TEXT CHECK (LENGTH(content) <= 200),
+    place_name TEXT,
+    privacy_setting VARCHAR(20) DEFAULT 'public' CHECK (privacy_setting IN ('public', 'private')),
+    is_deleted BOOLEAN DEFAULT false,
+    deleted_at TIMESTAMP WITH TIME ZONE,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+CREATE INDEX idx_emotions_user_id ON emotions(user_id);
+CREATE INDEX idx_emotions_created_at ON emotions(created_at DESC);
+CREATE INDEX idx_emotions_location ON emotions(latitude, longitude);
+CREATE INDEX idx_emotions_type ON emotions(emotion_type);
+
+CREATE OR REPLACE FUNCTION update_updated_at_column()
+RETURNS TRIGGER AS $$
+BEGIN
+    NEW.updated_at = NOW();
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER update_emotions_updated_at
+    BEFORE UPDATE ON emotions
+    FOR EACH ROW
+    EXECUTE FUNCTION update_updated_at_column();
+
+CREATE TABLE comments (
+    id BIGSERIAL PRIMARY KEY,
+    emotion_id BIGINT NOT NULL REFERENCES emotions(id),
+    user_id UUID NOT NULL REFERENCES users(user_id) ON DELETE CASCADE,
+    parent_id BIGINT REFERENCES comments(id) ON DELETE CASCADE,
+    content TEXT NOT NULL CHECK (LENGTH(content) <= 500),
+    is_deleted BOOLEAN DEFAULT false,
+    deleted_at TIMESTAMP WITH TIME ZONE,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+CREATE INDEX idx_comments_emotion_id ON comments(emotion_id);
+CREATE INDEX idx_comments_user_id ON comments(user_id);
+CREATE INDEX idx_comments_parent_id ON comments(parent_id);
+CREATE INDEX idx_comments_created_at ON comments(created_at DESC);
+
+CREATE TABLE likes (
+    id BIGSERIAL PRIMARY KEY,
+    emotion_id BIGINT NOT NULL REFERENCES emotions(id),
+    user_id UUID NOT NULL REFERENCES users(user_id) ON DELETE CASCADE,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    UNIQUE (emotion_id, user_id)
+);
+
+CREATE INDEX idx_likes_emotion_id ON likes(emotion_id);
+CREATE INDEX idx_likes_user_id ON likes(user_id);
+
+CREATE TABLE collections (
+    id BIGSERIAL PRIMARY KEY,
+    emotion_id BIGINT NOT NULL REFERENCES emotions(id),
+    user_id UUID NOT NULL REFERENCES users(user_id) ON DELETE CASCADE,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    UNIQUE (emotion_id, user_id)
+);
+
+CREATE INDEX idx_collections_emotion_id ON collections(emotion_id);
+CREATE INDEX idx_collections_user_id ON collections(user_id);
+CREATE INDEX idx_collections_created_at ON collections(created_at DESC);
+
+CREATE TABLE comment_likes (
+    id BIGSERIAL PRIMARY KEY,
+    comment_id BIGINT NOT NULL REFERENCES comments(id) ON DELETE CASCADE,
+    user_id UUID NOT NULL REFERENCES users(user_id) ON DELETE CASCADE,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    UNIQUE (comment_id, user_id)
+);
+
+CREATE INDEX idx_comment_likes_comment_id ON comment_likes(comment_id);
+CREATE INDEX idx_comment_likes_user_id ON comment_likes(user_id);
+
+-- 与init_database.sql相同的表权限
+GRANT SELECT ON users, emotions, comments, likes, collections, comment_likes TO anon;
+GRANT ALL PRIVILEGES ON users, emotions, comments, likes, collections, comment_likes TO authenticated;
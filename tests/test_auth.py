@@ -0,0 +1,208 @@
+# GitHub登录测试：本地模拟GitHub OAuth和API服务
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+from flask import Flask
+
+import auth as auth_module
+from auth import GitHubAuth, is_transient_github_error, open_access_token, seal_access_token
+from config import Config
+
+
+# 模拟GitHub每个请求的网络延迟（秒）
+LATENCY = 0.3
+
+
+class StubGitHub(BaseHTTPRequestHandler):
+    """按路径返回预设响应的GitHub模拟服务，每个请求延迟LATENCY秒并记录同时处理的最大请求数"""
+
+    # 路径 -> (状态码, 响应体, 响应头)
+    routes = {}
+    requests_seen = []
+    lock = threading.Lock()
+    in_flight = 0
+    peak_in_flight = 0
+
+    def _respond(self):
+        self.requests_seen.append((self.command, self.path, dict(self.headers)))
+        with self.lock:
+            StubGitHub.in_flight += 1
+            StubGitHub.peak_in_flight = max(StubGitHub.peak_in_flight, StubGitHub.in_flight)
+        try:
+            time.sleep(LATENCY)
+        finally:
+            with self.lock:
+                StubGitHub.in_flight -= 1
+        status, body, headers = self.routes.get(self.path.split('?')[0], (404, {'message': 'Not Found'}, {}))
+        if callable(body):
+            status, body, headers = body(self)
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        if body is not None:
+            self.wfile.write(json.dumps(body).encode())
+
+    do_GET = _respond
+    do_POST = _respond
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def github(monkeypatch):
+    StubGitHub.routes = {
+        '/login/oauth/access_token': (200, {'access_token': 'gho_test', 'token_type': 'bearer'}, {}),
+        '/user': (200, {'id': 1, 'login': 'octo', 'name': 'Octo Cat', 'avatar_url': 'a', 'html_url': 'h'}, {'ETag': '"u1"'}),
+        '/user/emails': (200, [{'email': 'octo@example.com', 'primary': True}], {})
+    }
+    StubGitHub.requests_seen = []
+    StubGitHub.in_flight = StubGitHub.peak_in_flight = 0
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubGitHub)
+    thread = threading.Thread(target=server.serve_forever, kwargs={'poll_interval': 0.05}, daemon=True)
+    thread.start()
+    url = f'http://127.0.0.1:{server.server_port}'
+    monkeypatch.setattr(Config, 'GITHUB_API_URL', url)
+    monkeypatch.setattr(Config, 'GITHUB_OAUTH_URL', url)
+    monkeypatch.setattr(Config, 'GITHUB_CLIENT_ID', 'client-id')
+    monkeypatch.setattr(Config, 'GITHUB_CLIENT_SECRET', 'client-secret')
+    yield StubGitHub
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def client_and_auth(monkeypatch):
+    app = Flask(__name__)
+    app.secret_key = 'test'
+    github_auth = GitHubAuth(app)
+    users = []
+
+    def create_or_update_user(user_info, access_token):
+        users.append(user_info)
+        return {
+            'id': '00000000-0000-0000-0000-000000000001',
+            'username': user_info['username'],
+            'display_name': user_info['display_name'],
+            'email': user_info.get('email'),
+            'avatar_url': user_info.get('avatar_url'),
+            'github_url': user_info.get('github_url'),
+            'created_at': None
+        }
+
+    monkeypatch.setattr(github_auth, 'create_or_update_user', create_or_update_user)
+    enqueued = []
+    monkeypatch.setattr(auth_module.job_runner, 'enqueue', lambda name, payload=None, delay=0: enqueued.append((name, payload)))
+    return app.test_client(), github_auth, users, enqueued
+
+
+def login(client):
+    with client.session_transaction() as session:
+        session['oauth_state'] = 'state-1'
+    return client.get('/login/github/authorized?state=state-1&code=code-1')
+
+
+def test_callback_logs_in_with_stub_github(github, client_and_auth):
+    client, _, users, enqueued = client_and_auth
+    response = login(client)
+    assert response.status_code == 302
+    assert users[0]['username'] == 'octo'
+    assert users[0]['email'] == 'octo@example.com'
+    assert enqueued == []
+    authorization = [headers.get('Authorization') for _, path, headers in github.requests_seen if path == '/user']
+    assert authorization == ['Bearer gho_test']
+
+
+def test_user_and_emails_are_fetched_in_parallel(github, client_and_auth):
+    _, github_auth, _, _ = client_and_auth
+    started = time.monotonic()
+    user_info = github_auth.get_github_user_info('gho_test')
+    elapsed = time.monotonic() - started
+    assert user_info['email'] == 'octo@example.com'
+    # 串行需要2 * LATENCY
+    assert elapsed < 1.5 * LATENCY
+    assert github.peak_in_flight == 2
+
+
+def test_callback_fetches_profile_in_parallel(github, client_and_auth):
+    client, _, users, _ = client_and_auth
+    started = time.monotonic()
+    assert login(client).status_code == 302
+    elapsed = time.monotonic() - started
+    assert users[0]['email'] == 'octo@example.com'
+    # 换取令牌之后/user和/user/emails同时请求，串行需要3 * LATENCY
+    assert elapsed < 2.5 * LATENCY
+    assert github.peak_in_flight == 2
+    assert [path for _, path, _ in github.requests_seen][0] == '/login/oauth/access_token'
+
+
+def test_transient_email_failure_enqueues_sealed_retry(github, client_and_auth):
+    github.routes['/user/emails'] = (503, {'message': 'unavailable'}, {})
+    client, _, _, enqueued = client_and_auth
+    assert login(client).status_code == 302
+    assert len(enqueued) == 1
+    name, payload = enqueued[0]
+    assert name == 'sync_github_profile'
+    # 任务参数中不保存明文令牌
+    assert 'gho_test' not in json.dumps(payload)
+    assert open_access_token(payload['sealed_token']) == 'gho_test'
+
+
+@pytest.mark.parametrize('status', [403, 404])
+def test_permanent_email_failure_is_not_retried(github, client_and_auth, status):
+    github.routes['/user/emails'] = (status, {'message': 'denied'}, {})
+    client, _, users, enqueued = client_and_auth
+    assert login(client).status_code == 302
+    assert users[0]['email'] is None
+    assert enqueued == []
+
+
+def test_rate_limited_403_is_transient(github, client_and_auth):
+    github.routes['/user/emails'] = (403, {'message': 'rate limited'}, {'X-RateLimit-Remaining': '0'})
+    client, _, _, enqueued = client_and_auth
+    assert login(client).status_code == 302
+    assert [name for name, _ in enqueued] == ['sync_github_profile']
+
+
+def test_sync_job_raises_only_on_transient_failure(github, client_and_auth):
+    _, github_auth, users, _ = client_and_auth
+    payload = {'user_id': 'u', 'sealed_token': seal_access_token('gho_test')}
+
+    github.routes['/user/emails'] = (502, {'message': 'bad gateway'}, {})
+    with pytest.raises(requests.HTTPError):
+        github_auth.sync_github_profile(payload)
+
+    github.routes['/user/emails'] = (404, {'message': 'Not Found'}, {})
+    assert github_auth.sync_github_profile(payload) is None
+
+    github.routes['/user/emails'] = (200, [{'email': 'octo@example.com', 'primary': True}], {})
+    github_auth.sync_github_profile(payload)
+    assert users[-1]['email'] == 'octo@example.com'
+
+    # 无法解密的令牌不再重试
+    assert github_auth.sync_github_profile({'user_id': 'u', 'sealed_token': 'garbage'}) is None
+
+
+def test_etag_revalidation_uses_cached_response(github, client_and_auth):
+    _, github_auth, _, _ = client_and_auth
+
+    def not_modified(handler):
+        if handler.headers.get('If-None-Match') == '"u1"':
+            return 304, None, {}
+        return 200, {'id': 1, 'login': 'octo'}, {'ETag': '"u1"'}
+
+    github.routes['/user'] = (200, not_modified, {})
+    assert github_auth.fetch_github_user('gho_test')['username'] == 'octo'
+    assert github_auth.fetch_github_user('gho_test')['username'] == 'octo'
+    assert [headers.get('If-None-Match') for _, path, headers in github.requests_seen if path == '/user'] == [None, '"u1"']
+
+
+def test_timeout_is_transient():
+    assert is_transient_github_error(requests.Timeout())
+    assert not is_transient_github_error(requests.RequestException())
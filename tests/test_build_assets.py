@@ -0,0 +1,51 @@
+# 静态资源构建：JS压缩和CDN回退标签
+import pytest
+from flask import Flask, render_template_string
+
+from assets import VENDOR_FILES, AssetManifest, cdn_attrs
+from build_assets import minify_js
+
+
+@pytest.mark.parametrize('source, expected', [
+    # ++/--之后的/是除号
+    ('b++ / 2; x / y / z', 'b++/2;x/y/z\n'),
+    ('a = b-- / 2 / c\nd = /re/g.test(x)', 'a=b--/2/c\nd=/re/g.test(x)\n'),
+    # 运算符之间必须保留空格
+    ('a - --b', 'a- --b\n'),
+    ('x = a+ +b', 'x=a+ +b\n'),
+    # 括号、逗号和关键字之后的/是正则表达式
+    ('f(/a\\/b/g, c)', 'f(/a\\/b/g,c)\n'),
+    ('return /x/.test(s)', 'return/x/.test(s)\n'),
+    ('(a) / 2', '(a)/2\n'),
+])
+def test_minify_js_regex_or_division(source, expected):
+    assert minify_js(source) == expected
+
+
+def test_minify_js_keeps_strings_and_templates():
+    source = 'const a = "// not a comment"; // comment\nconst b = `${x / 2} /* kept */ ${ {a: 1}.a }`;'
+    assert minify_js(source) == 'const a="// not a comment";\nconst b=`${x/2} /* kept */ ${{a:1}.a}`;\n'
+
+
+@pytest.fixture
+def app(tmp_path):
+    app = Flask(__name__, static_folder=str(tmp_path))
+    AssetManifest(app)
+    return app
+
+
+def test_cdn_fallback_tags_carry_integrity(app):
+    leaflet_url, leaflet_integrity = VENDOR_FILES['vendor/leaflet-1.9.4/leaflet.js']
+    cluster_url = VENDOR_FILES['vendor/leaflet.markercluster-1.4.1/leaflet.markercluster.js'][0]
+    template = '{% for src in asset_urls("js/vendor.js") %}<script src="{{ src }}"{{ cdn_attrs(src) }}></script>{% endfor %}'
+    with app.test_request_context():
+        html = render_template_string(template)
+    assert html == (
+        f'<script src="{leaflet_url}" integrity="{leaflet_integrity}" crossorigin="anonymous"></script>'
+        f'<script src="{cluster_url}" crossorigin="anonymous"></script>'
+    )
+
+
+def test_local_assets_have_no_cdn_attrs(app):
+    with app.test_request_context():
+        assert cdn_attrs('/static/js/map.js') == ''
@@ -0,0 +1,92 @@
+# 情绪详情缓存：公共部分按情绪共享，点赞/收藏状态按查看者单独查询
+import json
+
+import pytest
+from flask import Flask, g, request
+
+import api
+from conftest import FakeSupabase
+
+AUTHOR = '00000000-0000-0000-0000-000000000001'
+VIEWERS = ['00000000-0000-0000-0000-00000000000%d' % n for n in range(2, 6)]
+
+
+def emotion_detail_rpc(params):
+    # 公共部分只应以p_viewer_id=None加载
+    assert params['p_viewer_id'] is None
+    return [{
+        'id': params['p_emotion_id'], 'user_id': AUTHOR, 'emotion_type': 'happy', 'content': 'hi',
+        'custom_emoji': None, 'intensity': 5, 'latitude': 30.0, 'longitude': 120.0,
+        'privacy_setting': 'public', 'created_at': '2026-01-01T00:00:00', 'updated_at': '2026-01-01T00:00:00',
+        'username': 'alice', 'display_name': 'Alice', 'avatar_url': None,
+        'likes_count': 1, 'collections_count': 1, 'comments_count': 0,
+        'is_liked': False, 'is_collected': False
+    }]
+
+
+@pytest.fixture
+def client(monkeypatch):
+    fake = FakeSupabase(
+        tables={
+            'likes': [{'emotion_id': 7, 'user_id': VIEWERS[0]}],
+            'collections': [{'emotion_id': 7, 'user_id': VIEWERS[1]}]
+        },
+        rpcs={'emotion_detail': emotion_detail_rpc}
+    )
+    monkeypatch.setattr(api, 'supabase', fake)
+    monkeypatch.setattr(api, 'toggle_buffer', None)
+    api.emotion_detail_cache.clear()
+    api.emotion_viewer_cache.clear()
+
+    app = Flask(__name__)
+    app.register_blueprint(api.api_bp)
+
+    @app.before_request
+    def load_user():
+        user_id = request.headers.get('X-User')
+        g.current_user = {'id': user_id} if user_id else None
+
+    yield app.test_client(), fake
+    api.emotion_detail_cache.clear()
+    api.emotion_viewer_cache.clear()
+
+
+def get_stats(client, viewer=None):
+    response = client.get('/api/emotions/7', headers={'X-User': viewer} if viewer else {})
+    assert response.status_code == 200
+    return json.loads(response.data)['emotion']['stats']
+
+
+def test_viewers_share_one_detail_load(client):
+    client, fake = client
+    assert get_stats(client, VIEWERS[0])['is_liked'] is True
+    assert get_stats(client, VIEWERS[1])['is_collected'] is True
+    stats = get_stats(client, VIEWERS[2])
+    assert (stats['is_liked'], stats['is_collected']) == (False, False)
+    assert get_stats(client)['likes_count'] == 1
+
+    # 多个登录用户只触发一次完整的详情查询，其余为每人的点赞/收藏存在性查询
+    assert fake.calls.count(('rpc', 'emotion_detail')) == 1
+    assert fake.calls.count(('table', 'likes')) == 3
+    assert fake.calls.count(('table', 'collections')) == 3
+
+
+def test_viewer_flags_do_not_rewrite_shared_detail(client):
+    client, fake = client
+    get_stats(client, VIEWERS[0])
+    shared = api.emotion_detail_cache.get(7)
+    get_stats(client, VIEWERS[1])
+    assert api.emotion_detail_cache.get(7) is shared
+
+    # 缓存命中时不再查询
+    get_stats(client, VIEWERS[0])
+    assert fake.calls.count(('table', 'likes')) == 2
+
+
+def test_invalidating_viewer_refetches_only_flags(client):
+    client, fake = client
+    get_stats(client, VIEWERS[2])
+    fake.tables['likes'].append({'emotion_id': 7, 'user_id': VIEWERS[2]})
+    api.emotion_viewer_cache.delete((7, VIEWERS[2]))
+    assert get_stats(client, VIEWERS[2])['is_liked'] is True
+    assert fake.calls.count(('rpc', 'emotion_detail')) == 1
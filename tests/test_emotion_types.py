@@ -0,0 +1,83 @@
+# 情绪类型注册表和/api/emotion-types接口
+import json
+import os
+import re
+
+import pytest
+from flask import Flask
+
+from conftest import MIGRATIONS_DIR
+from emotion_types import EMOTION_TYPE_DEFINITIONS, EmotionTypeRegistry, emotion_types
+
+
+def constraint_codes():
+    """数据库约束emotions_emotion_type_check允许的类型代码"""
+    with open(os.path.join(MIGRATIONS_DIR, 'update_emotion_type_constraint.sql'), encoding='utf-8') as f:
+        sql = f.read()
+    body = re.search(r'CHECK \(emotion_type IN \((.*?)\)\)', sql, re.S).group(1)
+    return set(re.findall(r"'(\w+)'", body))
+
+
+def test_registry_matches_database_constraint():
+    assert set(emotion_types) == constraint_codes()
+
+
+def test_ids_and_codes_round_trip():
+    codes = emotion_types.codes_by_id()
+    assert codes[0] is None
+    for code in emotion_types:
+        type_id = emotion_types.id_of(code)
+        assert 1 <= type_id <= 254
+        assert emotion_types.code_of(type_id) == code
+        assert codes[type_id] == code
+    assert emotion_types.id_of('peaceful') is None
+    assert 'peaceful' not in emotion_types
+
+
+def test_duplicate_definitions_are_rejected():
+    with pytest.raises(ValueError):
+        EmotionTypeRegistry(EMOTION_TYPE_DEFINITIONS + ((99, 'happy', 'x', 'x', '#000000'),))
+    with pytest.raises(ValueError):
+        EmotionTypeRegistry(EMOTION_TYPE_DEFINITIONS + ((1, 'other', 'x', 'x', '#000000'),))
+
+
+def test_version_follows_content():
+    same = EmotionTypeRegistry(EMOTION_TYPE_DEFINITIONS)
+    changed = EmotionTypeRegistry(EMOTION_TYPE_DEFINITIONS + ((14, 'bored', '无聊', '🥱', '#C0C0C0'),))
+    assert same.version == emotion_types.version
+    assert changed.version != emotion_types.version
+
+
+@pytest.fixture
+def client():
+    from api import api_bp
+
+    app = Flask(__name__)
+    app.register_blueprint(api_bp)
+    return app.test_client()
+
+
+def test_endpoint_serves_registry(client):
+    response = client.get('/api/emotion-types')
+    assert response.status_code == 200
+    data = json.loads(response.data)
+    assert data['version'] == emotion_types.version
+    assert [item['code'] for item in data['types']] == list(emotion_types)
+    assert data['emotion_types']['happy'] == '开心'
+    assert response.headers['ETag'] == f'"{emotion_types.version}"'
+    assert 'immutable' not in response.headers['Cache-Control']
+
+
+def test_versioned_url_is_cached_long_term(client):
+    response = client.get(f'/api/emotion-types?v={emotion_types.version}')
+    assert response.headers['Cache-Control'] == 'public, max-age=31536000, immutable'
+
+    # 旧版本号不能得到永久缓存，否则类型变化后客户端拿不到新列表
+    response = client.get('/api/emotion-types?v=outdated')
+    assert 'immutable' not in response.headers['Cache-Control']
+
+
+def test_matching_etag_returns_304(client):
+    response = client.get('/api/emotion-types', headers={'If-None-Match': f'"{emotion_types.version}"'})
+    assert response.status_code == 304
+    assert response.data == b''
@@ -0,0 +1,103 @@
+# 图标生成：内容哈希跳过、尺寸变体、精灵图和CSS定位
+import os
+import re
+
+import pytest
+
+pytest.importorskip('PIL')
+from PIL import Image
+
+import generate_icon
+from emotion_types import emotion_types
+
+ICONS = [
+    ('happy', '😊', (255, 200, 0, 255)),
+    ('sad', '😢', (0, 120, 255, 255)),
+    ('angry', '😠', (255, 60, 60, 255)),
+    ('calm', '😌', (120, 200, 120, 255)),
+    ('tired', '😴', (150, 150, 150, 255)),
+]
+
+
+@pytest.fixture
+def icon_set(tmp_path):
+    # 不指定字体，所有图标使用替代图标，结果与系统是否安装emoji字体无关
+    return {
+        'icons': list(ICONS),
+        'output': str(tmp_path / 'icons'),
+        'size': 32,
+        'sizes': [16],
+        'atlas': str(tmp_path / 'images' / 'sprite.png'),
+        'css': str(tmp_path / 'css' / 'sprite.css'),
+        'css_prefix': 'sprite',
+    }
+
+
+def generate(icon_set, **kwargs):
+    return {name: changed for name, changed, _ in generate_icon.generate(icon_set, jobs=1, **kwargs)}
+
+
+def test_icons_and_variants_are_written(icon_set):
+    results = generate_icon.generate(icon_set, jobs=1)
+    assert [(name, changed, fallback) for name, changed, fallback in results] == [
+        (name, True, True) for name, _, _ in ICONS
+    ]
+    for name, _, _ in ICONS:
+        with Image.open(os.path.join(icon_set['output'], f'{name}.png')) as img:
+            assert img.size == (32, 32)
+        with Image.open(os.path.join(icon_set['output'], f'{name}_16.png')) as img:
+            assert img.size == (16, 16)
+
+
+def test_atlas_cells_match_icons(icon_set):
+    generate(icon_set)
+    # 5个图标排成3列2行
+    with Image.open(icon_set['atlas']) as atlas:
+        atlas = atlas.convert('RGBA')
+    assert atlas.size == (3 * 32, 2 * 32)
+    for index, (name, _, _) in enumerate(ICONS):
+        with Image.open(os.path.join(icon_set['output'], f'{name}.png')) as icon:
+            icon = icon.convert('RGBA')
+        x, y = (index % 3) * 32, (index // 3) * 32
+        assert atlas.crop((x, y, x + 32, y + 32)).tobytes() == icon.tobytes(), name
+    # 最后一行的空位保持透明
+    assert atlas.crop((64, 32, 96, 64)).getbbox() is None
+
+
+def test_css_positions_address_each_cell(icon_set):
+    generate(icon_set)
+    with open(icon_set['css'], encoding='utf-8') as f:
+        css = f.read()
+    assert 'background-image:url(../images/sprite.png)' in css
+    assert 'background-size:300% 200%' in css
+    positions = dict(re.findall(r'\.sprite-(\w+)\{background-position:([^}]+)\}', css))
+    assert positions == {
+        'happy': '0% 0%', 'sad': '50% 0%', 'angry': '100% 0%',
+        'calm': '0% 100%', 'tired': '50% 100%',
+    }
+
+
+def test_unchanged_icons_are_skipped(icon_set):
+    generate(icon_set)
+    atlas_mtime = os.stat(icon_set['atlas']).st_mtime_ns
+    assert set(generate(icon_set).values()) == {False}
+    assert os.stat(icon_set['atlas']).st_mtime_ns == atlas_mtime
+    assert set(generate(icon_set, force=True).values()) == {True}
+
+
+def test_changed_icon_regenerates_icon_and_atlas(icon_set):
+    generate(icon_set)
+    with open(icon_set['atlas'], 'rb') as f:
+        before = f.read()
+
+    icon_set['icons'][1] = ('sad', '😭', (0, 60, 200, 255))
+    assert generate(icon_set) == {'happy': False, 'sad': True, 'angry': False, 'calm': False, 'tired': False}
+    with open(icon_set['atlas'], 'rb') as f:
+        assert f.read() != before
+
+
+def test_emotion_set_covers_registry():
+    icon_set = generate_icon.emotions_set()
+    assert [name for name, _, _ in icon_set['icons']] == list(emotion_types)
+    assert icon_set['css'] == 'static/css/emotion-sprite.css'
+
@@ -0,0 +1,74 @@
+# 热力图聚合：按ID幂等写入，类型、强度、位置变化时替换原有聚合
+from datetime import datetime, timezone
+
+from heatmap import HeatmapAggregator
+
+NOW = datetime.now(timezone.utc).isoformat()
+
+
+def emotion(emotion_id=1, emotion_type='happy', latitude=30.0, longitude=120.0, intensity=5, created_at=NOW):
+    return {
+        'id': emotion_id, 'emotion_type': emotion_type, 'latitude': latitude, 'longitude': longitude,
+        'intensity': intensity, 'created_at': created_at
+    }
+
+
+def world_tile(heatmap):
+    """z=0整张地图最近一小时的格子：(cx, cy) -> (数量, 主要类型, 平均强度)"""
+    buckets = heatmap.bucket_starts('hour', 1)
+    return {
+        (cell['cx'], cell['cy']): (cell['count'], cell['dominant_type'], cell['avg_intensity'])
+        for cell in heatmap.get_tile(0, 0, 0, 'hour', buckets)
+    }
+
+
+def test_add_is_idempotent():
+    heatmap = HeatmapAggregator(max_zoom=4)
+    heatmap.add(emotion())
+    etag = heatmap.tile_etag(0, 0, 0, 'hour', heatmap.bucket_starts('hour', 1))
+    heatmap.add(emotion())
+    assert list(world_tile(heatmap).values()) == [(1, 'happy', 5.0)]
+    # 未变化的重复写入不改变版本号
+    assert heatmap.tile_etag(0, 0, 0, 'hour', heatmap.bucket_starts('hour', 1)) == etag
+
+
+def test_type_and_intensity_change_replace_member():
+    heatmap = HeatmapAggregator(max_zoom=4)
+    heatmap.add(emotion())
+    heatmap.add(emotion(emotion_type='sad', intensity=8))
+    assert list(world_tile(heatmap).values()) == [(1, 'sad', 8.0)]
+
+
+def test_position_change_moves_member():
+    heatmap = HeatmapAggregator(max_zoom=4)
+    heatmap.add(emotion(latitude=30.0, longitude=120.0))
+    before = set(world_tile(heatmap))
+    heatmap.add(emotion(latitude=-30.0, longitude=-60.0))
+    after = world_tile(heatmap)
+    assert len(after) == 1
+    assert set(after).isdisjoint(before)
+    assert list(after.values()) == [(1, 'happy', 5.0)]
+
+
+def test_missing_position_and_remove_clear_member():
+    heatmap = HeatmapAggregator(max_zoom=4)
+    heatmap.add(emotion(1))
+    heatmap.add(emotion(2, emotion_type='sad'))
+    heatmap.add(emotion(1, latitude=None))
+    assert list(world_tile(heatmap).values()) == [(1, 'sad', 5.0)]
+    heatmap.remove(2)
+    assert world_tile(heatmap) == {}
+    assert heatmap._tiles == {}
+
+
+def test_rebuild_replaces_loaded_aggregation():
+    heatmap = HeatmapAggregator(max_zoom=4)
+    heatmap.rebuild(lambda since: [emotion(1)])
+    # 尚未加载时不处理
+    assert world_tile(heatmap) == {}
+
+    heatmap.ensure_loaded(lambda since: [emotion(1), emotion(2)])
+    assert list(world_tile(heatmap).values()) == [(2, 'happy', 5.0)]
+    # 物理删除的情绪在重建后消失
+    heatmap.rebuild(lambda since: [emotion(2)])
+    assert list(world_tile(heatmap).values()) == [(1, 'happy', 5.0)]
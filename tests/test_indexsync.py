@@ -0,0 +1,139 @@
+# 进程内索引同步：按updated_at水位线增量同步和定期后台重建
+import threading
+import time
+
+from indexsync import IndexSync
+
+
+class RowSource:
+    """模拟emotions表：fetch_changes(since)返回updated_at不早于since的行，并记录每次的since"""
+
+    def __init__(self):
+        self.rows = []
+        self.since = []
+        self.fail = False
+
+    def add(self, emotion_id, updated_at, **fields):
+        self.rows.append(dict(fields, id=emotion_id, updated_at=updated_at))
+
+    def fetch_changes(self, since):
+        self.since.append(since)
+        if self.fail:
+            raise RuntimeError('数据库不可用')
+        return sorted((row for row in self.rows if row['updated_at'] >= since), key=lambda row: row['updated_at'])
+
+
+def make_sync(source, applied, **kwargs):
+    kwargs.setdefault('interval', 0)
+    kwargs.setdefault('rebuild_interval', 0)
+    sync = IndexSync(source.fetch_changes, applied.append, overlap=60, **kwargs)
+    sync._watermark = 1000.0
+    return sync
+
+
+def wait_for_rebuild(sync, timeout=2):
+    deadline = time.monotonic() + timeout
+    while sync._rebuilding and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert not sync._rebuilding
+
+
+def test_sync_reads_from_watermark_minus_overlap():
+    source, applied = RowSource(), []
+    sync = make_sync(source, applied)
+    source.add(1, 900.0)
+    source.add(2, 950.0)
+    source.add(3, 1100.0)
+
+    assert sync.sync() == 2
+    assert source.since == [940.0]
+    assert [row['id'] for row in applied] == [2, 3]
+    assert sync._watermark == 1100.0
+
+    # 重叠窗口内的变化再次读取（应用必须幂等），更早的不再读取
+    source.add(4, 1150.0)
+    assert sync.sync() == 2
+    assert source.since[-1] == 1040.0
+    assert [row['id'] for row in applied[2:]] == [3, 4]
+    assert sync._watermark == 1150.0
+
+
+def test_watermark_never_moves_backwards():
+    source, applied = RowSource(), []
+    sync = make_sync(source, applied)
+    # 其他进程较晚提交、updated_at早于水位线的变化在重叠窗口内仍会被读到
+    source.add(1, 970.0)
+    assert sync.sync() == 1
+    assert sync._watermark == 1000.0
+
+
+def test_maybe_sync_waits_for_interval():
+    source, applied = RowSource(), []
+    sync = make_sync(source, applied, interval=30)
+    source.add(1, 1001.0)
+    assert sync.maybe_sync() == 0
+    assert source.since == []
+
+    sync._last_sync -= 30
+    assert sync.maybe_sync() == 1
+
+
+def test_maybe_sync_does_not_wait_for_running_sync():
+    source, applied = RowSource(), []
+    sync = make_sync(source, applied)
+    source.add(1, 1001.0)
+    with sync._sync_lock:
+        assert sync.maybe_sync() == 0
+    assert applied == []
+
+
+def test_failed_sync_keeps_watermark():
+    source, applied = RowSource(), []
+    sync = make_sync(source, applied)
+    source.add(1, 1001.0)
+    source.fail = True
+    assert sync.maybe_sync() == 0
+    assert sync._watermark == 1000.0
+
+    source.fail = False
+    assert sync.maybe_sync() == 1
+    assert source.since == [940.0, 940.0]
+
+
+def test_rebuild_runs_in_background_and_rewinds_watermark():
+    source, applied = RowSource(), []
+    sync = make_sync(source, applied, rebuild_interval=3600)
+    started = threading.Event()
+    release = threading.Event()
+    rebuilt = []
+
+    def slow_rebuild():
+        started.set()
+        release.wait(2)
+        rebuilt.append('slow')
+
+    def failing_rebuild():
+        raise RuntimeError('重建失败')
+
+    sync.register(slow_rebuild)
+    sync.register(failing_rebuild)
+    sync.register(lambda: rebuilt.append('fast'))
+
+    # 未到重建间隔
+    sync.maybe_sync()
+    assert not started.is_set()
+
+    sync._last_rebuild -= 3600
+    before = time.time()
+    source.add(1, before + 3600)
+    # 重建在后台线程进行，同步不等待重建完成
+    assert sync.maybe_sync() == 1
+    assert started.wait(2)
+    assert sync._watermark == before + 3600
+    release.set()
+    wait_for_rebuild(sync)
+
+    # 一个索引重建失败不影响其他索引
+    assert rebuilt == ['slow', 'fast']
+    # 重建读取的数据可能早于期间应用的增量，水位线退回到重建开始时
+    assert before <= sync._watermark <= time.time()
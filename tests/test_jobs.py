@@ -0,0 +1,109 @@
+# 后台任务队列测试
+import threading
+import time
+
+from jobs import JobRunner
+
+
+def make_runner(tmp_path, **kwargs):
+    return JobRunner(str(tmp_path / 'jobs.sqlite3'), **kwargs)
+
+
+def job_rows(runner):
+    conn = runner._connect()
+    try:
+        return conn.execute('SELECT name, status, attempts, worker_id FROM jobs ORDER BY id').fetchall()
+    finally:
+        conn.close()
+
+
+def test_run_pending_executes_and_deletes_job(tmp_path):
+    runner = make_runner(tmp_path)
+    seen = []
+    runner.register('echo', seen.append)
+    runner.enqueue('echo', {'value': 1})
+    assert runner.run_pending() == 1
+    assert seen == [{'value': 1}]
+    assert job_rows(runner) == []
+
+
+def test_start_does_not_reclaim_jobs_with_live_lease(tmp_path):
+    first = make_runner(tmp_path, lease_seconds=60)
+    first.enqueue('slow')
+    assert first._claim() is not None
+
+    # 另一个进程启动时不会把仍在执行的任务重新排队
+    second = make_runner(tmp_path, lease_seconds=60)
+    second.start()
+    try:
+        assert second._claim() is None
+        assert job_rows(second) == [('slow', 'running', 0, first.worker_id)]
+    finally:
+        second.stop()
+
+
+def test_expired_lease_is_reclaimed_and_stale_finish_ignored(tmp_path):
+    first = make_runner(tmp_path, lease_seconds=0.1)
+    first.enqueue('crashy')
+    job_id = first._claim()[0]
+    time.sleep(0.2)
+
+    second = make_runner(tmp_path, lease_seconds=60)
+    row = second._claim()
+    assert row[0] == job_id
+    # 租约过期计为一次中断的执行
+    assert row[3] == 1
+
+    # 原持有者恢复后提交结果不会覆盖新持有者的状态
+    first._finish(job_id, 1)
+    assert job_rows(second) == [('crashy', 'running', 1, second.worker_id)]
+    second._finish(job_id, 2)
+    assert job_rows(second) == []
+
+
+def test_repeatedly_interrupted_job_fails(tmp_path):
+    runner = make_runner(tmp_path, lease_seconds=0.01, max_attempts=2)
+    runner.enqueue('crashy')
+    runner._claim()
+    time.sleep(0.05)
+    runner._claim()
+    time.sleep(0.05)
+    assert runner._claim() is None
+    assert job_rows(runner)[0][:3] == ('crashy', 'failed', 2)
+
+
+def test_heartbeat_keeps_long_job_leased(tmp_path):
+    runner = make_runner(tmp_path, lease_seconds=0.3)
+    release = threading.Event()
+    runner.register('long', lambda payload: release.wait(5))
+    runner.enqueue('long')
+    runner.start()
+    try:
+        time.sleep(1.0)
+        other = make_runner(tmp_path, lease_seconds=0.3)
+        assert other._claim() is None
+    finally:
+        release.set()
+        runner.stop()
+
+
+def test_enqueue_unique_is_atomic_across_connections(tmp_path):
+    runners = [make_runner(tmp_path) for _ in range(8)]
+    runners[0]._connect().close()
+    barrier = threading.Barrier(len(runners))
+    results = []
+
+    def enqueue(runner):
+        barrier.wait()
+        results.append(runner.enqueue_unique('periodic'))
+
+    threads = [threading.Thread(target=enqueue, args=(runner,)) for runner in runners]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results.count(True) == 1
+    assert len(job_rows(runners[0])) == 1
+    # 执行中的同名任务同样阻止入队
+    runners[0]._claim()
+    assert runners[1].enqueue_unique('periodic') is False
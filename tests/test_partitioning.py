@@ -0,0 +1,179 @@
+# 按月分区迁移：权限、行级安全、id唯一、评论/点赞/收藏的引用完整性和分区维护
+import pytest
+
+psycopg2 = pytest.importorskip('psycopg2')
+
+USER = '00000000-0000-0000-0000-000000000001'
+
+ROLES = ('anon', 'authenticated', 'service_role')
+PRIVILEGES = ('SELECT', 'INSERT', 'UPDATE', 'DELETE', 'TRUNCATE', 'REFERENCES', 'TRIGGER')
+
+
+def table_privileges(cursor, table):
+    """返回API角色在表上拥有的(角色, 权限)集合"""
+    granted = set()
+    for role in ROLES:
+        for privilege in PRIVILEGES:
+            cursor.execute('SELECT has_table_privilege(%s, %s, %s)', (role, table, privilege))
+            if cursor.fetchone()[0]:
+                granted.add((role, privilege))
+    return granted
+
+
+@pytest.fixture
+def partitioned_database(database):
+    with database.cursor() as cursor:
+        cursor.execute("INSERT INTO users (user_id, github_username) VALUES (%s, 'alice')", (USER,))
+        cursor.execute("""
+            INSERT INTO emotions (id, user_id, latitude, longitude, emotion_type, privacy_setting, created_at)
+            VALUES (1, %(user)s, 30, 120, 'happy', 'public', NOW() - INTERVAL '14 months'),
+                   (2, %(user)s, 30, 120, 'sad', 'public', NOW()),
+                   (3, %(user)s, 30, 120, 'calm', 'private', NOW())
+        """, {'user': USER})
+        cursor.execute("SELECT setval(pg_get_serial_sequence('emotions', 'id'), 3)")
+        cursor.execute("INSERT INTO comments (id, emotion_id, user_id, content) VALUES (1, 1, %s, 'old'), (2, 2, %s, 'new')",
+                       (USER, USER))
+        cursor.execute("INSERT INTO comment_likes (comment_id, user_id) VALUES (1, %s), (2, %s)", (USER, USER))
+        cursor.execute("INSERT INTO likes (emotion_id, user_id) VALUES (1, %s), (2, %s)", (USER, USER))
+        cursor.execute("INSERT INTO collections (emotion_id, user_id) VALUES (1, %s)", (USER,))
+        # 线上可能配置的行级安全策略
+        cursor.execute('ALTER TABLE emotions ENABLE ROW LEVEL SECURITY')
+        cursor.execute("CREATE POLICY public_emotions ON emotions FOR SELECT TO anon USING (privacy_setting = 'public')")
+        cursor.execute('CREATE POLICY own_emotions ON emotions TO authenticated USING (true) WITH CHECK (true)')
+        privileges = table_privileges(cursor, 'emotions')
+    database.apply('partition_emotions_by_month', 'add_soft_delete_purge')
+    return database, privileges
+
+
+def month_partition(cursor, offset):
+    cursor.execute("SELECT 'emotions_p' || to_char(date_trunc('month', NOW() AT TIME ZONE 'UTC') "
+                   "+ make_interval(months => %s), 'YYYY_MM')", (offset,))
+    return cursor.fetchone()[0]
+
+
+def test_table_acl_and_policies_are_copied(partitioned_database):
+    database, original_privileges = partitioned_database
+    with database.cursor() as cursor:
+        cursor.execute('SELECT relkind, relrowsecurity FROM pg_class WHERE oid = %s::regclass', ('emotions',))
+        assert cursor.fetchone() == ('p', True)
+        cursor.execute("SELECT policyname FROM pg_policies WHERE tablename = 'emotions' ORDER BY 1")
+        assert [row[0] for row in cursor.fetchall()] == ['own_emotions', 'public_emotions']
+
+        assert table_privileges(cursor, 'emotions') == original_privileges
+        assert ('anon', 'SELECT') in original_privileges
+        # emotion_ids和各分区只通过父表和触发器访问
+        for table in ('emotion_ids', 'emotions_default', month_partition(cursor, 0)):
+            assert not table_privileges(cursor, table) - {('service_role', p) for p in PRIVILEGES}, table
+
+        cursor.execute('SET ROLE anon')
+        cursor.execute('SELECT id FROM emotions ORDER BY id')
+        assert [row[0] for row in cursor.fetchall()] == [1, 2]
+        cursor.execute('RESET ROLE')
+
+
+def test_partition_functions_are_service_role_only(partitioned_database):
+    functions = [
+        'create_emotion_partition(date)',
+        'ensure_emotion_partitions(integer)',
+        'detach_emotion_partitions(integer)',
+        'maintain_emotion_partitions(integer, integer)',
+    ]
+    database, _ = partitioned_database
+    with database.cursor() as cursor:
+        for function in functions:
+            for role, allowed in (('anon', False), ('authenticated', False), ('service_role', True)):
+                cursor.execute("SELECT has_function_privilege(%s, %s, 'EXECUTE')", (role, function))
+                assert cursor.fetchone()[0] is allowed, (role, function)
+
+
+def test_ids_stay_unique_across_partitions(partitioned_database):
+    database, _ = partitioned_database
+    with database.cursor() as cursor:
+        with pytest.raises(psycopg2.errors.UniqueViolation):
+            cursor.execute("""
+                INSERT INTO emotions (id, user_id, latitude, longitude, emotion_type, created_at)
+                VALUES (2, %s, 30, 120, 'happy', NOW() - INTERVAL '13 months')
+            """, (USER,))
+
+        cursor.execute("""
+            INSERT INTO emotions (user_id, latitude, longitude, emotion_type)
+            VALUES (%s, 30, 120, 'happy') RETURNING id
+        """, (USER,))
+        new_id = cursor.fetchone()[0]
+        cursor.execute('SELECT id FROM emotion_ids ORDER BY id')
+        assert [row[0] for row in cursor.fetchall()] == [1, 2, 3, new_id]
+
+
+def test_child_rows_keep_referential_checks(partitioned_database):
+    database, _ = partitioned_database
+    with database.cursor() as cursor:
+        with pytest.raises(psycopg2.errors.ForeignKeyViolation):
+            cursor.execute('INSERT INTO likes (emotion_id, user_id) VALUES (999, %s)', (USER,))
+        # 与分区前的外键一致：仍有点赞的情绪不能直接物理删除
+        with pytest.raises(psycopg2.errors.ForeignKeyViolation):
+            cursor.execute('DELETE FROM emotions WHERE id = 2')
+
+        cursor.execute('DELETE FROM emotions WHERE id = 3')
+        cursor.execute('SELECT count(*) FROM emotion_ids WHERE id = 3')
+        assert cursor.fetchone()[0] == 0
+
+
+def test_purge_removes_children_and_ids(partitioned_database):
+    database, _ = partitioned_database
+    with database.cursor() as cursor:
+        cursor.execute("UPDATE emotions SET is_deleted = true, deleted_at = NOW() - INTERVAL '40 days' WHERE id = 2")
+        cursor.execute('SELECT purge_deleted_emotions(30, 500)')
+        assert cursor.fetchone()[0] == 1
+        cursor.execute('SELECT count(*) FROM emotion_ids WHERE id = 2')
+        assert cursor.fetchone()[0] == 0
+        cursor.execute('SELECT count(*) FROM likes WHERE emotion_id = 2')
+        assert cursor.fetchone()[0] == 0
+
+
+def test_detach_moves_children_with_the_partition(partitioned_database):
+    database, _ = partitioned_database
+    with database.cursor() as cursor:
+        old_partition = month_partition(cursor, -14)
+        cursor.execute('SET ROLE service_role')
+        cursor.execute('SELECT detach_emotion_partitions(12)')
+        assert [row[0] for row in cursor.fetchall()] == [old_partition, month_partition(cursor, -13)]
+        cursor.execute('RESET ROLE')
+
+        cursor.execute('SELECT id FROM emotions ORDER BY id')
+        assert [row[0] for row in cursor.fetchall()] == [2, 3]
+        cursor.execute('SELECT id FROM emotion_ids ORDER BY id')
+        assert [row[0] for row in cursor.fetchall()] == [2, 3]
+        for child, remaining in (('comments', 1), ('comment_likes', 1), ('likes', 1), ('collections', 0)):
+            cursor.execute(f'SELECT count(*) FROM {child}')
+            assert cursor.fetchone()[0] == remaining, child
+            cursor.execute(f'SELECT count(*) FROM {old_partition}_{child}')
+            assert cursor.fetchone()[0] == 1, child
+
+        # 分离后的分区和移出的子表可以直接删除，不留下悬空引用
+        cursor.execute(f'DROP TABLE {old_partition}, {old_partition}_comment_likes, {old_partition}_comments, '
+                       f'{old_partition}_likes, {old_partition}_collections')
+
+
+def test_creating_partition_moves_rows_out_of_default(partitioned_database):
+    database, _ = partitioned_database
+    with database.cursor() as cursor:
+        cursor.execute("""
+            INSERT INTO emotions (id, user_id, latitude, longitude, emotion_type, created_at)
+            VALUES (10, %s, 30, 120, 'happy', NOW() + INTERVAL '8 months')
+        """, (USER,))
+        cursor.execute('INSERT INTO likes (emotion_id, user_id) VALUES (10, %s)', (USER,))
+        cursor.execute('SELECT tableoid::regclass::TEXT FROM emotions WHERE id = 10')
+        assert cursor.fetchone()[0] == 'emotions_default'
+
+        cursor.execute("SELECT create_emotion_partition((NOW() + INTERVAL '8 months')::DATE)")
+        partition = cursor.fetchone()[0]
+        cursor.execute('SELECT tableoid::regclass::TEXT FROM emotions WHERE id = 10')
+        assert cursor.fetchone()[0] == partition
+        cursor.execute('SELECT count(*) FROM emotion_ids WHERE id = 10')
+        assert cursor.fetchone()[0] == 1
+        cursor.execute('SELECT count(*) FROM likes WHERE emotion_id = 10')
+        assert cursor.fetchone()[0] == 1
+
+        cursor.execute("SELECT tgenabled FROM pg_trigger WHERE tgrelid = 'emotions_default'::regclass "
+                       "AND tgname = 'sync_emotion_ids'")
+        assert cursor.fetchone()[0] == 'O'
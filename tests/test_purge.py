@@ -0,0 +1,64 @@
+# 软删除清理函数：归档、授权和保留期下限
+import pytest
+
+psycopg2 = pytest.importorskip('psycopg2')
+
+USER = '00000000-0000-0000-0000-000000000001'
+
+
+@pytest.fixture
+def purge_database(database):
+    database.apply('add_soft_delete_purge')
+    with database.cursor() as cursor:
+        cursor.execute("INSERT INTO users (user_id, github_username) VALUES (%s, 'alice')", (USER,))
+        cursor.execute("""
+            INSERT INTO emotions (id, user_id, latitude, longitude, emotion_type, is_deleted, deleted_at)
+            VALUES (1, %(user)s, 30, 120, 'happy', true, NOW() - INTERVAL '40 days'),
+                   (2, %(user)s, 30, 120, 'sad', true, NOW() - INTERVAL '2 days'),
+                   (3, %(user)s, 30, 120, 'calm', false, NULL)
+        """, {'user': USER})
+        cursor.execute("INSERT INTO comments (id, emotion_id, user_id, content) VALUES (1, 1, %s, 'hi')", (USER,))
+        cursor.execute("INSERT INTO comment_likes (comment_id, user_id) VALUES (1, %s)", (USER,))
+        cursor.execute("INSERT INTO likes (emotion_id, user_id) VALUES (1, %s), (2, %s)", (USER, USER))
+        cursor.execute("INSERT INTO collections (emotion_id, user_id) VALUES (1, %s)", (USER,))
+    return database
+
+
+def test_purge_archives_expired_emotions_and_children(purge_database):
+    with purge_database.cursor() as cursor:
+        cursor.execute('SELECT purge_deleted_emotions(30, 500)')
+        assert cursor.fetchone()[0] == 1
+
+        cursor.execute('SELECT id FROM emotions ORDER BY id')
+        assert [row[0] for row in cursor.fetchall()] == [2, 3]
+        cursor.execute('SELECT count(*) FROM likes')
+        assert cursor.fetchone()[0] == 1
+
+        cursor.execute('SELECT source_table, emotion_id FROM archived_rows ORDER BY source_table')
+        assert cursor.fetchall() == [
+            ('collections', '1'), ('comment_likes', '1'), ('comments', '1'), ('emotions', '1'), ('likes', '1')
+        ]
+
+
+def test_purge_is_service_role_only(purge_database):
+    with purge_database.cursor() as cursor:
+        for role, allowed in (('anon', False), ('authenticated', False), ('service_role', True)):
+            cursor.execute(
+                "SELECT has_function_privilege(%s, 'purge_deleted_emotions(integer, integer)', 'EXECUTE')",
+                (role,)
+            )
+            assert cursor.fetchone()[0] is allowed, role
+
+        cursor.execute('SET ROLE anon')
+        with pytest.raises(psycopg2.errors.InsufficientPrivilege):
+            cursor.execute('SELECT purge_deleted_emotions(30, 500)')
+        cursor.execute('RESET ROLE')
+
+
+@pytest.mark.parametrize('retention_days', [0, 6, None])
+def test_purge_rejects_short_retention(purge_database, retention_days):
+    with purge_database.cursor() as cursor:
+        with pytest.raises(psycopg2.errors.InvalidParameterValue):
+            cursor.execute('SELECT purge_deleted_emotions(%s, 500)', (retention_days,))
+        cursor.execute('SELECT count(*) FROM emotions')
+        assert cursor.fetchone()[0] == 3
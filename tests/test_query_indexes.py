@@ -0,0 +1,133 @@
+# 查询形态索引：在有代表性数据量的表上用EXPLAIN确认每种API查询走对应的索引
+import json
+
+import pytest
+
+USER = '00000000-0000-0000-0000-000000000001'
+
+SEED_SQL = """
+INSERT INTO users (user_id, github_username)
+SELECT ('00000000-0000-0000-0000-' || lpad(to_hex(n), 12, '0'))::UUID, 'user' || n
+FROM generate_series(1, 200) AS n;
+
+INSERT INTO emotions (user_id, latitude, longitude, emotion_type, privacy_setting, is_deleted, created_at, updated_at)
+SELECT ('00000000-0000-0000-0000-' || lpad(to_hex(n % 200 + 1), 12, '0'))::UUID,
+       30 + (n % 1000) / 100.0, 120 + (n % 700) / 100.0,
+       CASE WHEN n % 97 = 0 THEN 'tired'
+            ELSE (ARRAY['happy', 'sad', 'angry', 'calm', 'anxious', 'excited', 'love'])[n % 7 + 1] END,
+       CASE WHEN n % 10 = 0 THEN 'private' ELSE 'public' END,
+       n % 25 = 0,
+       NOW() - n * INTERVAL '1 minute',
+       NOW() - n * INTERVAL '1 minute'
+FROM generate_series(1, 40000) AS n;
+
+INSERT INTO comments (emotion_id, user_id, parent_id, content, is_deleted, created_at)
+SELECT n % 400 + 1, ('00000000-0000-0000-0000-' || lpad(to_hex(n % 200 + 1), 12, '0'))::UUID,
+       NULL, 'c' || n, n % 20 = 0, NOW() - n * INTERVAL '1 minute'
+FROM generate_series(1, 20000) AS n;
+
+INSERT INTO comments (emotion_id, user_id, parent_id, content, created_at)
+SELECT emotion_id, user_id, id, 'r' || id, created_at + INTERVAL '1 second'
+FROM comments WHERE id % 2 = 0;
+
+INSERT INTO likes (emotion_id, user_id)
+SELECT e, ('00000000-0000-0000-0000-' || lpad(to_hex(u), 12, '0'))::UUID
+FROM generate_series(1, 2000) AS e, generate_series(1, 20) AS u;
+
+INSERT INTO collections (emotion_id, user_id, created_at)
+SELECT e, ('00000000-0000-0000-0000-' || lpad(to_hex(u), 12, '0'))::UUID, NOW() - e * INTERVAL '1 minute'
+FROM generate_series(1, 2000) AS e, generate_series(1, 20) AS u;
+"""
+
+# (说明, 查询, 期望使用的索引)
+# 常见类型足够密集时，规划器沿不分类型的索引扫描并过滤也能很快凑满一页，类型索引针对的是较少见的类型
+QUERY_SHAPES = [
+    ('公开情绪列表',
+     "SELECT * FROM emotions WHERE is_deleted = false AND privacy_setting = 'public' "
+     "ORDER BY created_at DESC LIMIT 20 OFFSET 40",
+     'idx_emotions_public_feed'),
+    ('公开情绪列表（时间过滤）',
+     "SELECT * FROM emotions WHERE is_deleted = false AND privacy_setting = 'public' "
+     "AND created_at >= NOW() - INTERVAL '24 hours' ORDER BY created_at DESC LIMIT 20",
+     'idx_emotions_public_feed'),
+    ('公开情绪列表（类型过滤）',
+     "SELECT * FROM emotions WHERE is_deleted = false AND privacy_setting = 'public' "
+     "AND emotion_type = 'tired' ORDER BY created_at DESC LIMIT 20",
+     'idx_emotions_public_type_feed'),
+    ('用户情绪时间线',
+     f"SELECT * FROM emotions WHERE user_id = '{USER}' AND is_deleted = false "
+     "ORDER BY created_at DESC LIMIT 20",
+     'idx_emotions_user_timeline'),
+    ('按updated_at同步',
+     "SELECT * FROM emotions WHERE updated_at >= NOW() - INTERVAL '10 minutes' ORDER BY updated_at, id",
+     'idx_emotions_updated_at'),
+    ('评论列表',
+     "SELECT * FROM comments WHERE emotion_id = 7 AND is_deleted = false ORDER BY created_at DESC LIMIT 20",
+     'idx_comments_emotion_created'),
+    ('顶层评论分页',
+     "SELECT * FROM comments WHERE emotion_id = 7 AND parent_id IS NULL AND is_deleted = false "
+     "ORDER BY created_at DESC LIMIT 20",
+     'idx_comments_emotion_roots'),
+    ('评论回复',
+     "SELECT * FROM comments WHERE parent_id = 8 AND is_deleted = false ORDER BY created_at",
+     'idx_comments_parent_created'),
+    ('用户收藏列表',
+     f"SELECT * FROM collections WHERE user_id = '{USER}' ORDER BY created_at DESC LIMIT 20",
+     'idx_collections_user_created'),
+    ('点赞状态',
+     f"SELECT 1 FROM likes WHERE emotion_id = 7 AND user_id = '{USER}'",
+     'likes_emotion_id_user_id_key'),
+    ('点赞计数',
+     "SELECT count(*) FROM likes WHERE emotion_id = 7",
+     'likes_emotion_id_user_id_key'),
+    ('收藏状态',
+     f"SELECT 1 FROM collections WHERE emotion_id = 7 AND user_id = '{USER}'",
+     'collections_emotion_id_user_id_key'),
+    ('收藏计数',
+     "SELECT count(*) FROM collections WHERE emotion_id = 7",
+     'collections_emotion_id_user_id_key'),
+]
+
+
+def scanned_indexes(plan):
+    """返回计划树中所有索引扫描节点的(节点类型, 索引名)"""
+    found = []
+    if 'Index Name' in plan:
+        found.append((plan['Node Type'], plan['Index Name']))
+    for child in plan.get('Plans', []):
+        found.extend(scanned_indexes(child))
+    return found
+
+
+@pytest.fixture
+def indexed_database(database):
+    database.apply('add_user_timeline_index', 'add_emotion_updated_at_index',
+                   'add_comment_threads', 'add_query_shape_indexes')
+    with database.cursor() as cursor:
+        cursor.execute(SEED_SQL)
+        # 与线上autovacuum之后的状态一致：统计信息最新，可见性映射允许仅索引扫描
+        cursor.execute('VACUUM ANALYZE')
+    return database
+
+
+def test_query_shapes_use_their_indexes(indexed_database):
+    with indexed_database.cursor() as cursor:
+        for label, query, index in QUERY_SHAPES:
+            cursor.execute(f'EXPLAIN (FORMAT JSON) {query}')
+            plan = cursor.fetchone()[0]
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            scans = scanned_indexes(plan[0]['Plan'])
+            assert any(
+                node in ('Index Scan', 'Index Only Scan') and name == index for node, name in scans
+            ), f'{label}没有使用{index}: {scans}'
+
+
+def test_superseded_indexes_are_dropped(indexed_database):
+    with indexed_database.cursor() as cursor:
+        cursor.execute("SELECT indexname FROM pg_indexes WHERE schemaname = 'public'")
+        names = {row[0] for row in cursor.fetchall()}
+    assert 'idx_emotions_user_id' not in names
+    assert 'idx_likes_emotion_id' not in names
+    assert 'idx_collections_emotion_id' not in names
+    assert 'idx_collections_user_id' not in names
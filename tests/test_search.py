@@ -0,0 +1,166 @@
+# 全文搜索：中文双字切分、BM25排序、索引维护和搜索结果按数据库当前状态核对
+import json
+
+import pytest
+from flask import Flask
+
+import api
+from conftest import FakeSupabase
+from search import SearchIndex, tokenize
+
+USER = '00000000-0000-0000-0000-000000000001'
+
+
+def emotion(emotion_id, content, emotion_type='happy', privacy='public', minute=0, **extra):
+    row = {
+        'id': emotion_id, 'user_id': USER, 'emotion_type': emotion_type, 'content': content,
+        'custom_emoji': None, 'intensity': 5, 'latitude': 30.0, 'longitude': 120.0,
+        'privacy_setting': privacy, 'is_deleted': False,
+        'created_at': f'2026-10-19T10:{minute:02d}:00+00:00'
+    }
+    row.update(extra)
+    return row
+
+
+def ids(results):
+    return [item['id'] for item in results]
+
+
+def test_tokenize_cjk_bigrams():
+    assert tokenize('今天很开心') == ['今', '天', '很', '开', '心', '今天', '天很', '很开', '开心']
+    # 查询时中文只用双字，单字片段保持原样
+    assert tokenize('很开心', for_query=True) == ['很开', '开心']
+    assert tokenize('心', for_query=True) == ['心']
+    assert tokenize('Happy 2026年!', for_query=True) == ['happy', '2026', '年']
+
+
+def test_query_requires_adjacent_characters():
+    index = SearchIndex()
+    index.add(emotion(1, '今天很开心'))
+    index.add(emotion(2, '开门时心情不好'))
+    results, total = index.search('开心')
+    assert (ids(results), total) == ([1], 1)
+
+
+def test_bm25_ranks_frequent_and_short_documents_first():
+    index = SearchIndex()
+    index.add(emotion(1, '开心', minute=1))
+    index.add(emotion(2, '开心开心开心', minute=2))
+    index.add(emotion(3, '今天下午和朋友一起去公园散步，很开心', minute=3))
+    index.add(emotion(4, '下雨了', minute=4))
+    results, total = index.search('开心')
+    assert total == 3
+    assert ids(results) == [2, 1, 3]
+    assert results[0]['score'] > results[1]['score'] > results[2]['score']
+
+
+def test_equal_scores_put_newer_first_and_paginate():
+    index = SearchIndex()
+    for emotion_id in range(1, 6):
+        index.add(emotion(emotion_id, '开心', minute=emotion_id))
+    results, total = index.search('开心', page=2, limit=2)
+    assert (ids(results), total) == ([3, 2], 5)
+
+
+def test_accept_filters_before_counting():
+    index = SearchIndex()
+    index.add(emotion(1, '开心', emotion_type='happy'))
+    index.add(emotion(2, '开心', emotion_type='sad'))
+    results, total = index.search('开心', accept=lambda meta: meta['emotion_type'] == 'sad')
+    assert (ids(results), total) == ([2], 1)
+
+
+def test_reindex_and_remove_update_postings():
+    index = SearchIndex()
+    index.add(emotion(1, '开心'))
+    index.add(emotion(1, '难过'))
+    assert index.search('开心') == ([], 0)
+    assert ids(index.search('难过')[0]) == [1]
+    index.remove(1)
+    assert len(index) == 0
+    assert index.search('难过') == ([], 0)
+    assert index._total_length == 0
+
+
+def test_rebuild_replaces_loaded_index_only():
+    index = SearchIndex()
+    index.rebuild(lambda: [emotion(1, '开心')])
+    # 尚未加载时不处理，首次查询时再加载
+    assert len(index) == 0
+
+    index.ensure_loaded(lambda: [emotion(1, '开心'), emotion(2, '开心')])
+    index.rebuild(lambda: [emotion(2, '开心'), emotion(3, '开心')])
+    assert sorted(ids(index.search('开心')[0])) == [2, 3]
+
+
+@pytest.fixture
+def search_client(monkeypatch):
+    rows = [emotion(1, '今天很开心', minute=1), emotion(2, '开心的一天', minute=2), emotion(3, '开心', minute=3)]
+    fake = FakeSupabase(tables={'emotions': rows})
+    index = SearchIndex()
+    monkeypatch.setattr(api, 'supabase', fake)
+    monkeypatch.setattr(api, 'search_index', index)
+    monkeypatch.setattr(api.index_sync, 'maybe_sync', lambda: 0)
+    monkeypatch.setattr(api, 'index_emotion', index.add)
+    monkeypatch.setattr(api, 'unindex_emotion', index.remove)
+
+    app = Flask(__name__)
+    app.register_blueprint(api.api_bp)
+    return app.test_client(), rows, index
+
+
+def search(client, query=''):
+    response = client.get('/api/emotions/search?q=' + query)
+    assert response.status_code == 200
+    return json.loads(response.data)
+
+
+def test_search_route_returns_ranked_hits(search_client):
+    client, _, index = search_client
+    data = search(client, '开心')
+    assert ids(data['emotions']) == [3, 2, 1]
+    assert data['total'] == 3
+    assert len(index) == 3
+
+
+def test_soft_deleted_hit_is_dropped_and_unindexed(search_client):
+    client, rows, index = search_client
+    search(client, '开心')
+    # 其他进程软删除，本进程的索引尚未同步
+    rows[1]['is_deleted'] = True
+    data = search(client, '开心')
+    assert ids(data['emotions']) == [3, 1]
+    assert data['total'] == 2
+    assert 2 not in index._docs
+
+
+def test_hit_made_private_is_dropped_and_reindexed(search_client):
+    client, rows, index = search_client
+    search(client, '开心')
+    rows[0]['privacy_setting'] = 'private'
+    data = search(client, '开心')
+    assert ids(data['emotions']) == [3, 2]
+    assert data['total'] == 2
+    # 索引已更新为私密，再次搜索时直接由索引过滤
+    assert index._docs[1][2]['privacy_setting'] == 'private'
+    assert search(client, '开心')['total'] == 2
+
+
+def test_hit_with_changed_type_is_filtered(search_client):
+    client, rows, index = search_client
+    search(client, '开心&type=happy')
+    rows[2]['emotion_type'] = 'sad'
+    data = search(client, '开心&type=happy')
+    assert ids(data['emotions']) == [2, 1]
+    assert index._docs[3][2]['emotion_type'] == 'sad'
+    assert ids(search(client, '开心&type=sad')['emotions']) == [3]
+
+
+def test_changed_content_is_returned_from_database(search_client):
+    client, rows, index = search_client
+    search(client, '开心')
+    rows[1]['content'] = '开心，但是有点累'
+    data = search(client, '开心')
+    contents = {item['id']: item['content'] for item in data['emotions']}
+    assert contents[2] == '开心，但是有点累'
+    assert ids(index.search('有点累')[0]) == [2]
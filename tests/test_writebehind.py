@@ -0,0 +1,161 @@
+# 点赞/收藏写回缓冲测试
+import json
+import os
+import signal
+import sqlite3
+import subprocess
+import sys
+
+import pytest
+
+from conftest import ROOT
+from writebehind import WriteBehindBuffer
+
+# 子进程：批量写入第一行后被SIGKILL杀死，模拟刷写过程中进程崩溃
+KILLED_CHILD = """
+import os, signal, sqlite3, sys
+sys.path.insert(0, {root!r})
+from writebehind import WriteBehindBuffer
+
+db_path, journal_path = sys.argv[1], sys.argv[2]
+
+def flusher(table, inserts, deletes):
+    conn = sqlite3.connect(db_path)
+    for emotion_id, user_id, _ in inserts:
+        conn.execute('INSERT OR IGNORE INTO likes VALUES (?, ?)', (emotion_id, user_id))
+        conn.commit()
+        os.kill(os.getpid(), signal.SIGKILL)
+
+buffer = WriteBehindBuffer(journal_path, flusher, interval_ms=60000)
+buffer.start()
+empty = lambda table, emotion_id, user_id: (False, 0)
+for user_id in ('a', 'b', 'c'):
+    buffer.toggle('likes', 1, user_id, empty)
+# 同一刷写窗口内点赞又取消
+buffer.toggle('likes', 2, 'a', empty)
+buffer.toggle('likes', 2, 'a', empty)
+buffer.flush()
+"""
+
+
+def create_db(path):
+    with sqlite3.connect(path) as conn:
+        conn.execute('CREATE TABLE likes (emotion_id INTEGER, user_id TEXT, PRIMARY KEY (emotion_id, user_id))')
+
+
+def sqlite_flusher(db_path, calls=None):
+    """按幂等语义把批量切换写入SQLite"""
+    def flusher(table, inserts, deletes):
+        if calls is not None:
+            calls.append((table, sorted(inserts), sorted(deletes)))
+        with sqlite3.connect(db_path) as conn:
+            conn.executemany('INSERT OR IGNORE INTO likes VALUES (?, ?)', [(e, u) for e, u, _ in inserts])
+            conn.executemany('DELETE FROM likes WHERE emotion_id = ? AND user_id = ?', [(e, u) for e, u, _ in deletes])
+    return flusher
+
+
+def rows(db_path):
+    with sqlite3.connect(db_path) as conn:
+        return sorted(conn.execute('SELECT emotion_id, user_id FROM likes').fetchall())
+
+
+def test_recovers_after_kill_mid_flush(tmp_path):
+    db_path = str(tmp_path / 'db.sqlite3')
+    journal_path = str(tmp_path / 'toggles.journal')
+    create_db(db_path)
+
+    child = subprocess.run(
+        [sys.executable, '-c', KILLED_CHILD.format(root=ROOT), db_path, journal_path],
+        capture_output=True, text=True, timeout=30
+    )
+    assert child.returncode == -signal.SIGKILL, child.stderr
+    # 被杀死时只写入了一部分
+    assert len(rows(db_path)) == 1
+
+    buffer = WriteBehindBuffer(journal_path, sqlite_flusher(db_path), interval_ms=60000)
+    buffer.start()
+    try:
+        assert rows(db_path) == [(1, 'a'), (1, 'b'), (1, 'c')]
+        assert buffer.pending_delta('likes', 1) == 0
+    finally:
+        buffer.stop()
+
+    # 恢复后的刷写记录了检查点，再次启动不会重复写入
+    calls = []
+    buffer = WriteBehindBuffer(journal_path, sqlite_flusher(db_path, calls), interval_ms=60000)
+    buffer.start()
+    buffer.stop()
+    assert calls == []
+
+
+def test_like_then_unlike_in_one_window_leaves_count_unchanged(tmp_path):
+    buffer = WriteBehindBuffer(str(tmp_path / 'toggles.journal'), lambda *args: None, interval_ms=60000)
+    buffer.start()
+    try:
+        assert buffer.toggle('likes', 1, 'a', lambda *args: (False, 10)) == (True, 11)
+        assert buffer.toggle('likes', 1, 'a', lambda *args: (False, 10)) == (False, 10)
+        assert buffer.pending_delta('likes', 1) == 0
+        # 数据库中已点赞的用户取消后又点赞
+        assert buffer.toggle('likes', 2, 'b', lambda *args: (True, 5)) == (False, 4)
+        assert buffer.toggle('likes', 2, 'b', lambda *args: (True, 5)) == (True, 5)
+        assert buffer.pending_delta('likes', 2) == 0
+        assert buffer.toggle('likes', 2, 'c', lambda *args: (False, 5)) == (True, 6)
+        assert buffer.pending_delta('likes', 2) == 1
+    finally:
+        buffer.stop()
+
+
+def test_failed_flush_keeps_original_base(tmp_path):
+    available = []
+
+    def flusher(table, inserts, deletes):
+        if not available:
+            raise RuntimeError('database unavailable')
+
+    buffer = WriteBehindBuffer(str(tmp_path / 'toggles.journal'), flusher, interval_ms=60000)
+    buffer.start()
+    try:
+        buffer.toggle('likes', 1, 'a', lambda *args: (False, 0))
+        with pytest.raises(RuntimeError):
+            buffer.flush()
+        buffer.toggle('likes', 1, 'a', lambda *args: (False, 0))
+        assert buffer.pending_delta('likes', 1) == 0
+    finally:
+        available.append(True)
+        buffer.stop()
+
+
+def test_processes_use_separate_journals(tmp_path):
+    journal_path = str(tmp_path / 'toggles.journal')
+    first = WriteBehindBuffer(journal_path, lambda *args: None, interval_ms=60000)
+    second = WriteBehindBuffer(journal_path, lambda *args: None, interval_ms=60000)
+    first.start()
+    second.start()
+    try:
+        assert first.slot_path != second.slot_path
+        first.toggle('likes', 1, 'a', lambda *args: (False, 0))
+        second.toggle('likes', 1, 'b', lambda *args: (False, 0))
+        with open(first.slot_path, encoding='utf-8') as journal:
+            users = [json.loads(line).get('user_id') for line in journal]
+        assert 'b' not in users
+    finally:
+        first.stop()
+        second.stop()
+
+
+def test_adopts_journal_left_by_exited_process(tmp_path):
+    db_path = str(tmp_path / 'db.sqlite3')
+    journal_path = str(tmp_path / 'toggles.journal')
+    create_db(db_path)
+    # 已退出进程遗留的槽位日志
+    with open(journal_path + '.3', 'w', encoding='utf-8') as journal:
+        journal.write(json.dumps({'seq': 1, 'table': 'likes', 'emotion_id': 7, 'user_id': 'x', 'state': True, 'at': 1.0, 'base': False}) + '\n')
+
+    buffer = WriteBehindBuffer(journal_path, sqlite_flusher(db_path), interval_ms=60000)
+    buffer.start()
+    try:
+        assert buffer.slot_path == journal_path + '.0'
+        assert rows(db_path) == [(7, 'x')]
+        assert not os.path.exists(journal_path + '.3')
+    finally:
+        buffer.stop()
@@ -0,0 +1,210 @@
+# 热门情绪排行
+# 热度 = Σ 权重 × e^(-λ·(now - 事件时间))，事件包括发布、点赞、收藏和评论
+# 所有分数按同一速率衰减，排序不随时间变化，因此只需在事件到达时增量更新：
+# 内部保存相对基准时间t0放大后的分数 权重 × e^(λ·(事件时间 - t0))，读取时统一乘以 e^(-λ·(now - t0))
+import bisect
+import math
+import threading
+import time
+
+from heatmap import parse_timestamp
+
+# 默认事件权重
+DEFAULT_WEIGHTS = {
+    'post': 1.0,
+    'like': 2.0,
+    'collection': 3.0,
+    'comment': 4.0
+}
+
+# 放大指数超过该值时重新以当前时间为基准归一化，避免浮点溢出
+RENORMALIZE_EXPONENT = 30.0
+
+
+class TrendingIndex:
+    """增量维护的时间衰减热度排行"""
+
+    def __init__(self, half_life_hours=12, horizon_seconds=7 * 86400, weights=None):
+        self.decay = math.log(2) / (half_life_hours * 3600)
+        # 只保留该时间范围内发布的情绪
+        self.horizon = horizon_seconds
+        self.weights = dict(DEFAULT_WEIGHTS, **(weights or {}))
+        self._t0 = time.time()
+        # 情绪ID -> 放大后的分数
+        self._scores = {}
+        # 按(放大后的分数, 情绪ID)升序排列
+        self._order = []
+        # 情绪ID -> 返回数据（含互动计数）
+        self._payloads = {}
+        # (情绪ID, 事件类型, 事件键) -> 该事件贡献的放大后分数，取消点赞/收藏时精确扣除
+        self._contributions = {}
+        self._lock = threading.RLock()
+        self._loaded = False
+        self._load_lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._scores)
+
+    def ensure_loaded(self, loader):
+        """首次使用时加载保留范围内的情绪和互动事件，loader(since)返回(情绪列表, 事件列表)"""
+        if self._loaded:
+            return
+        with self._load_lock:
+            if self._loaded:
+                return
+            emotions, events = loader(time.time() - self.horizon)
+            for emotion in emotions:
+                self.add(emotion)
+            for kind, emotion_id, key, created_at in events:
+                self.engage(emotion_id, kind, key, created_at)
+            self._loaded = True
+
+    def rebuild(self, loader):
+        """用loader重新加载后整体替换（期间查询仍使用旧数据），尚未加载时不处理
+        其他进程写入的点赞、收藏和评论只能通过重建反映到本进程的排行"""
+        if not self._loaded:
+            return
+        fresh = TrendingIndex(horizon_seconds=self.horizon, weights=self.weights)
+        fresh.decay = self.decay
+        fresh.ensure_loaded(loader)
+        with self._lock:
+            self._t0 = fresh._t0
+            self._scores = fresh._scores
+            self._order = fresh._order
+            self._payloads = fresh._payloads
+            self._contributions = fresh._contributions
+
+    # ==================== 写入 ====================
+
+    def add(self, emotion):
+        """加入或更新一条公开情绪，已存在时保留其热度"""
+        created_at = parse_timestamp(emotion['created_at'])
+        if created_at < time.time() - self.horizon:
+            return
+        with self._lock:
+            previous = self._payloads.get(emotion['id'])
+            self._payloads[emotion['id']] = {
+                'id': emotion['id'],
+                'user_id': emotion.get('user_id'),
+                'emotion_type': emotion['emotion_type'],
+                'content': emotion.get('content', ''),
+                'custom_emoji': emotion.get('custom_emoji'),
+                'intensity': emotion.get('intensity', 5),
+                'latitude': emotion.get('latitude'),
+                'longitude': emotion.get('longitude'),
+                'created_at': emotion['created_at'],
+                'timestamp': created_at,
+                'likes_count': previous['likes_count'] if previous else 0,
+                'collections_count': previous['collections_count'] if previous else 0,
+                'comments_count': previous['comments_count'] if previous else 0
+            }
+            if previous is None:
+                self._set_score(emotion['id'], 0.0)
+                self.engage(emotion['id'], 'post', emotion['id'], created_at)
+
+    def remove(self, emotion_id):
+        """移除一条情绪及其全部互动记录"""
+        with self._lock:
+            if self._payloads.pop(emotion_id, None) is None:
+                return
+            score = self._scores.pop(emotion_id)
+            self._order.pop(bisect.bisect_left(self._order, (score, emotion_id)))
+            for contribution_key in [k for k in self._contributions if k[0] == emotion_id]:
+                del self._contributions[contribution_key]
+
+    def engage(self, emotion_id, kind, key, at=None):
+        """记录一次互动（发布/点赞/收藏/评论），key用于去重和撤销"""
+        at = parse_timestamp(at) if at is not None else time.time()
+        with self._lock:
+            payload = self._payloads.get(emotion_id)
+            contribution_key = (emotion_id, kind, key)
+            if payload is None or contribution_key in self._contributions:
+                return
+            self._maybe_renormalize()
+            amount = self.weights[kind] * math.exp(self.decay * (at - self._t0))
+            self._contributions[contribution_key] = amount
+            self._set_score(emotion_id, self._scores[emotion_id] + amount)
+            if kind != 'post':
+                payload[f'{kind}s_count'] += 1
+
+    def disengage(self, emotion_id, kind, key):
+        """撤销一次互动（取消点赞/收藏）"""
+        with self._lock:
+            amount = self._contributions.pop((emotion_id, kind, key), None)
+            if amount is None:
+                return
+            self._set_score(emotion_id, max(self._scores[emotion_id] - amount, 0.0))
+            payload = self._payloads[emotion_id]
+            payload[f'{kind}s_count'] = max(payload[f'{kind}s_count'] - 1, 0)
+
+    def _set_score(self, emotion_id, score):
+        """更新分数并保持排序（二分定位）"""
+        previous = self._scores.get(emotion_id)
+        if previous is not None:
+            self._order.pop(bisect.bisect_left(self._order, (previous, emotion_id)))
+        self._scores[emotion_id] = score
+        bisect.insort(self._order, (score, emotion_id))
+
+    def _maybe_renormalize(self, now=None):
+        """放大指数过大时以当前时间为新基准缩放全部分数，同时清理超出保留范围的情绪"""
+        now = now if now is not None else time.time()
+        if self.decay * (now - self._t0) < RENORMALIZE_EXPONENT:
+            return
+        factor = math.exp(-self.decay * (now - self._t0))
+        self._t0 = now
+        # 统一缩放不改变相对顺序，可直接原地替换
+        self._order = [(score * factor, emotion_id) for score, emotion_id in self._order]
+        self._scores = {emotion_id: score for score, emotion_id in self._order}
+        self._contributions = {key: amount * factor for key, amount in self._contributions.items()}
+        self.prune(now)
+
+    def prune(self, now=None):
+        """移除超出保留范围的情绪"""
+        cutoff = (now if now is not None else time.time()) - self.horizon
+        with self._lock:
+            expired = [emotion_id for emotion_id, payload in self._payloads.items() if payload['timestamp'] < cutoff]
+            if not expired:
+                return
+            expired_ids = set(expired)
+            for emotion_id in expired:
+                del self._payloads[emotion_id]
+                del self._scores[emotion_id]
+            self._order = [item for item in self._order if item[1] not in expired_ids]
+            self._contributions = {
+                key: amount for key, amount in self._contributions.items() if key[0] not in expired_ids
+            }
+
+    # ==================== 查询 ====================
+
+    def top(self, k=20, bbox=None, since=None):
+        """按热度从高到低返回前k条，可按范围(west, south, east, north)和发布时间过滤"""
+        now = time.time()
+        results = []
+        with self._lock:
+            self._maybe_renormalize(now)
+            scale = math.exp(-self.decay * (now - self._t0))
+            for score, emotion_id in reversed(self._order):
+                payload = self._payloads[emotion_id]
+                if since is not None and payload['timestamp'] < since:
+                    continue
+                if bbox is not None and not _in_bbox(payload, bbox):
+                    continue
+                item = {key: value for key, value in payload.items() if key != 'timestamp'}
+                item['score'] = round(score * scale, 4)
+                results.append(item)
+                if len(results) >= k:
+                    break
+        return results
+
+
+def _in_bbox(payload, bbox):
+    """判断情绪是否位于范围内（支持跨180度经线）"""
+    lat, lng = payload.get('latitude'), payload.get('longitude')
+    if lat is None or lng is None:
+        return False
+    west, south, east, north = bbox
+    if not south <= lat <= north:
+        return False
+    if west <= east:
+        return west <= lng <= east
+    return lng >= west or lng <= east
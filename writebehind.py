@@ -0,0 +1,297 @@
+# 点赞/收藏写回缓冲（write-behind）
+# 切换操作先追加到fsync过的日志文件并更新内存中的预测状态，立即返回；
+# 后台线程定期把同一(表, 情绪, 用户)的多次切换合并为最终状态，批量插入和删除。
+# 批量写入是幂等的（插入忽略重复、删除不存在的行无影响），崩溃后重放检查点之后的日志即可恢复。
+# 每个进程独占一个日志槽位（journal_path.N，以文件锁保证），启动时接管已退出进程遗留的日志。
+import fcntl
+import glob
+import json
+import os
+import threading
+import time
+
+from cache import TTLCache
+
+
+def read_journal(path):
+    """读取日志，返回(最后一个检查点之后各键的最终切换, 最大序号)"""
+    if not os.path.exists(path):
+        return {}, 0
+    operations = []
+    checkpoint = 0
+    with open(path, encoding='utf-8') as journal:
+        for line in journal:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                # 崩溃时可能留下写了一半的最后一行，该操作尚未向客户端确认，直接丢弃
+                continue
+            if 'checkpoint' in entry:
+                checkpoint = max(checkpoint, entry['checkpoint'])
+            else:
+                operations.append(entry)
+    max_seq = checkpoint
+    pending = {}
+    for entry in operations:
+        max_seq = max(max_seq, entry['seq'])
+        if entry['seq'] > checkpoint:
+            key = (entry['table'], entry['emotion_id'], entry['user_id'])
+            # 同一键的多次切换保留第一次切换前数据库中的原状态
+            base = pending[key][3] if key in pending else entry['base']
+            pending[key] = (entry['state'], entry['at'], entry['seq'], base)
+    return pending, max_seq
+
+
+class WriteBehindBuffer:
+    """点赞/收藏切换的日志缓冲和批量刷写"""
+
+    def __init__(self, journal_path, flusher, interval_ms=500, state_ttl=60, compact_bytes=1 << 20):
+        self.journal_path = journal_path
+        # flusher(table, inserts, deletes)：inserts和deletes为[(情绪ID, 用户ID, 时间)]列表
+        self.flusher = flusher
+        self.interval = interval_ms / 1000
+        self.compact_bytes = compact_bytes
+        # (表, 情绪ID, 用户ID) -> (目标状态, 时间, 序号, 数据库中的原状态)，尚未写入数据库的最终状态
+        self._pending = {}
+        # 正在写入数据库的一批，写入完成前仍参与状态预测
+        self._flushing = {}
+        # 预测状态：(表, 情绪ID, 用户ID) -> 是否存在；(表, 情绪ID) -> 数量
+        self._members = TTLCache(ttl=state_ttl, max_size=65536)
+        self._counts = TTLCache(ttl=state_ttl, max_size=16384)
+        self._seq = 0
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        # 本进程独占的日志文件及其锁文件
+        self.slot_path = None
+        self._slot_lock = None
+        self._journal = None
+        self._thread = None
+        self._stop = threading.Event()
+
+    # ==================== 启动与恢复 ====================
+
+    def start(self):
+        """占用一个日志槽位，重放其中未刷写的切换，接管已退出进程的日志并启动后台刷写线程"""
+        directory = os.path.dirname(self.journal_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._claim_slot()
+        self.replay()
+        self._journal = open(self.slot_path, 'a', encoding='utf-8')
+        self.adopt_orphans()
+        self.flush()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    @staticmethod
+    def _try_lock(path):
+        """以非阻塞方式独占锁文件，成功返回打开的锁文件，已被其他进程占用时返回None"""
+        lock_file = open(path + '.lock', 'a')
+        try:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return None
+        return lock_file
+
+    def _claim_slot(self):
+        """占用编号最小的空闲槽位（进程退出时文件锁自动释放）"""
+        index = 0
+        while True:
+            path = f'{self.journal_path}.{index}'
+            lock_file = self._try_lock(path)
+            if lock_file is not None:
+                self.slot_path = path
+                self._slot_lock = lock_file
+                return
+            index += 1
+
+    def replay(self):
+        """读取本槽位日志中最后一个检查点之后的切换，恢复到待写入队列"""
+        pending, max_seq = read_journal(self.slot_path)
+        with self._lock:
+            self._pending.update(pending)
+            self._seq = max(self._seq, max_seq)
+            return len(self._pending)
+
+    def adopt_orphans(self):
+        """接管没有进程持有的其他槽位日志，把未刷写的切换转写到本槽位日志后删除"""
+        prefix = self.journal_path + '.'
+        adopted = 0
+        for path in glob.glob(glob.escape(prefix) + '*'):
+            if path == self.slot_path or not path[len(prefix):].isdigit() or not os.path.isfile(path):
+                continue
+            lock_file = self._try_lock(path)
+            if lock_file is None:
+                continue
+            try:
+                pending, _ = read_journal(path)
+                with self._lock:
+                    for key, (state, at, _, base) in sorted(pending.items(), key=lambda item: item[1][1]):
+                        current = self._pending.get(key)
+                        if current is not None and current[1] >= at:
+                            continue
+                        self._seq += 1
+                        self._append({
+                            'seq': self._seq,
+                            'table': key[0],
+                            'emotion_id': key[1],
+                            'user_id': key[2],
+                            'state': state,
+                            'at': at,
+                            'base': current[3] if current else base
+                        })
+                        self._pending[key] = (state, at, self._seq, current[3] if current else base)
+                        adopted += 1
+                # 已写入本槽位日志（fsync）后才删除原日志
+                os.remove(path)
+            finally:
+                lock_file.close()
+        return adopted
+
+    def stop(self):
+        """停止后台线程并刷写剩余切换"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.flush()
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
+        if self._slot_lock is not None:
+            self._slot_lock.close()
+            self._slot_lock = None
+
+    # ==================== 切换 ====================
+
+    def toggle(self, table, emotion_id, user_id, loader):
+        """切换(情绪, 用户)在table中的状态，返回(切换后是否存在, 预测数量)
+        loader(table, emotion_id, user_id)在缺少预测状态时返回数据库中的(是否存在, 数量)"""
+        member_key = (table, emotion_id, user_id)
+        count_key = (table, emotion_id)
+        if self._members.get(member_key) is None or self._counts.get(count_key) is None:
+            exists, count = loader(table, emotion_id, user_id)
+            with self._lock:
+                # 数据库结果不包含尚未刷写的切换，叠加后作为预测基准
+                pending = self._pending_state(member_key)
+                if pending is not None:
+                    exists = pending
+                if self._counts.get(count_key) is None:
+                    self._counts.set(count_key, max(count + self._pending_delta(count_key), 0))
+                if self._members.get(member_key) is None:
+                    self._members.set(member_key, exists)
+
+        with self._lock:
+            previous = bool(self._members.get(member_key))
+            exists = not previous
+            count = self._counts.get(count_key) or 0
+            count = max(count + (1 if exists else -1), 0)
+            # 数据库中的原状态：已有待写入切换时沿用其原状态，正在写入时为写入后的状态，否则为切换前的状态
+            if member_key in self._pending:
+                base = self._pending[member_key][3]
+            elif member_key in self._flushing:
+                base = self._flushing[member_key][0]
+            else:
+                base = previous
+            self._seq += 1
+            at = time.time()
+            self._append({
+                'seq': self._seq,
+                'table': table,
+                'emotion_id': emotion_id,
+                'user_id': user_id,
+                'state': exists,
+                'at': at,
+                'base': base
+            })
+            self._pending[member_key] = (exists, at, self._seq, base)
+            self._members.set(member_key, exists)
+            self._counts.set(count_key, count)
+        return exists, count
+
+    def pending_state(self, table, emotion_id, user_id):
+        """返回尚未写入数据库的目标状态，没有待写入切换时返回None"""
+        with self._lock:
+            return self._pending_state((table, emotion_id, user_id))
+
+    def pending_delta(self, table, emotion_id):
+        """尚未写入数据库的切换对数量的影响（目标状态相对数据库中原状态的变化）"""
+        with self._lock:
+            return self._pending_delta((table, emotion_id))
+
+    def _pending_state(self, member_key):
+        item = self._pending.get(member_key) or self._flushing.get(member_key)
+        return item[0] if item else None
+
+    def _pending_delta(self, count_key):
+        # 正在写入的一批相对数据库原状态，待写入的一批相对正在写入后的状态，两者相加即总变化
+        delta = 0
+        for batch in (self._flushing, self._pending):
+            for (table, emotion_id, _), (state, _, _, base) in batch.items():
+                if (table, emotion_id) == count_key and state != base:
+                    delta += 1 if state else -1
+        return delta
+
+    def _append(self, entry):
+        """追加一行日志并fsync，返回后即保证崩溃可恢复"""
+        self._journal.write(json.dumps(entry, separators=(',', ':')) + '\n')
+        self._journal.flush()
+        os.fsync(self._journal.fileno())
+
+    # ==================== 刷写 ====================
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"批量写入点赞/收藏失败: {e}")
+
+    def flush(self):
+        """把待写入的切换合并为批量插入和删除，成功后记录检查点"""
+        with self._flush_lock:
+            with self._lock:
+                if not self._pending:
+                    return 0
+                batch, self._pending = self._pending, {}
+                self._flushing = batch
+                checkpoint = max(seq for _, _, seq, _ in batch.values())
+
+            try:
+                grouped = {}
+                for (table, emotion_id, user_id), (state, at, _, _) in batch.items():
+                    inserts, deletes = grouped.setdefault(table, ([], []))
+                    (inserts if state else deletes).append((emotion_id, user_id, at))
+                for table, (inserts, deletes) in grouped.items():
+                    self.flusher(table, inserts, deletes)
+            except Exception:
+                # 写入失败时放回队列，期间产生的新切换优先，但数据库中的原状态仍是这一批写入前的状态
+                with self._lock:
+                    for key, item in batch.items():
+                        newer = self._pending.get(key)
+                        if newer is None:
+                            self._pending[key] = item
+                        else:
+                            self._pending[key] = newer[:3] + (item[3],)
+                    self._flushing = {}
+                raise
+
+            with self._lock:
+                self._flushing = {}
+                if self._journal is not None:
+                    self._append({'checkpoint': checkpoint})
+                    self._maybe_compact()
+            return len(batch)
+
+    def _maybe_compact(self):
+        """日志过大且没有待写入切换时清空日志（只保留检查点）"""
+        if self._pending or self._journal.tell() < self.compact_bytes:
+            return
+        self._journal.close()
+        temp_path = self.slot_path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as journal:
+            journal.write(json.dumps({'checkpoint': self._seq}) + '\n')
+            journal.flush()
+            os.fsync(journal.fileno())
+        os.replace(temp_path, self.slot_path)
+        self._journal = open(self.slot_path, 'a', encoding='utf-8')